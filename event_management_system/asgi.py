@@ -11,6 +11,9 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from events.assets import ASGIAssets
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_management_system.settings')
 
-application = get_asgi_application()
+# Static files and media are answered before Django sees the request
+application = ASGIAssets(get_asgi_application())
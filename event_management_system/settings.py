@@ -1,7 +1,7 @@
 
 import dj_database_url
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -34,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'events.metrics.MetricsMiddleware',
+    'events.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,7 +49,7 @@ ROOT_URLCONF = 'event_management_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'events.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,6 +82,23 @@ DATABASES = {
     )
 }
 
+# Read replicas, as comma separated database URLs. Reads of the events and
+# users views go to a random replica; writes, and a user's reads for
+# REPLICA_PIN_SECONDS after they wrote, go to the primary. See events.routers
+DATABASE_REPLICAS = []
+for number, url in enumerate(config('DATABASE_REPLICA_URLS', default='', cast=Csv()), start=1):
+    DATABASE_REPLICAS.append(f'replica{number}')
+    DATABASES[f'replica{number}'] = {**dj_database_url.parse(url, conn_max_age=600), 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['events.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# Permission checks are served from the cache, see users.roles
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+]
+# Upper bound on how long a role or permission change can go unnoticed
+RBAC_CACHE_TIMEOUT = config('RBAC_CACHE_TIMEOUT', default=300, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -118,6 +137,16 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS=[
     BASE_DIR/'static'
 ]
+# collectstatic target, served by events.assets from wsgi.py / asgi.py
+STATIC_ROOT = BASE_DIR/'staticfiles'
+# Production sets STATICFILES_BACKEND=events.assets.CompressedManifestStaticFilesStorage
+# for content-hashed names and precompressed .gz / .br copies
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': config('STATICFILES_BACKEND', default='django.contrib.staticfiles.storage.StaticFilesStorage'),
+    },
+}
 
 # AUTH_USER_MODEL = 'users.CustomUser'
 MEDIA_URL= '/media/'
@@ -136,4 +165,43 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 
 
 
-FRONTEND_URL = config("FRONTEND_URL", default="https://events-management-system-uoyt.onrender.com")
\ No newline at end of file
+FRONTEND_URL = config("FRONTEND_URL", default="https://events-management-system-uoyt.onrender.com")
+# Cache used for public pages, event card fragments, calendar feeds and
+# permission sets, e.g. django.core.cache.backends.redis.RedisCache with
+# CACHE_LOCATION=redis://127.0.0.1:6379, or
+# django.core.cache.backends.filebased.FileBasedCache with
+# CACHE_LOCATION=/var/tmp/events-cache
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='events-cache'),
+    }
+}
+EVENTS_CACHE_ALIAS = 'default'
+# Invalidation works by bumping version counters in the cache (see
+# events.cache and users.roles), so every worker process and management
+# command must see the same cache: Redis, Memcached, or FileBasedCache when
+# they all run on one host. LocMemCache is private to each process, so with
+# it pages, fragments, feeds and permission sets are not cached at all.
+# Set CACHE_SHARED=True only where a single process does everything.
+CACHE_SHARED = config(
+    'CACHE_SHARED', default=not CACHES['default']['BACKEND'].endswith('.LocMemCache'), cast=bool,
+)
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Number of events per page on keyset paginated listings
+EVENTS_PAGE_SIZE = config('EVENTS_PAGE_SIZE', default=12, cast=int)
+
+# The archive_events command moves events that started more than this many
+# days ago, with their RSVPs, out of the hot tables. See events.archive
+ARCHIVE_AFTER_DAYS = config('ARCHIVE_AFTER_DAYS', default=365, cast=int)
+
+# How long before an event the send_event_reminders command emails its participants
+REMINDER_LEAD_HOURS = config('REMINDER_LEAD_HOURS', default=24, cast=int)
+
+# Prometheus metrics at /metrics. With several worker processes, point
+# METRICS_DIR at a directory they share so the endpoint reports all of them.
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=int)
+# Lets a scraper authenticate with "Authorization: Bearer <token>"
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
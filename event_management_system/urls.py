@@ -4,12 +4,13 @@ from django.urls import path,include
 
 from django.conf import settings
 from django.conf.urls.static import static
-from events.views import home
+from events.views import home, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('events/',include('events.urls')),
     path('users/',include('users.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('', home, name='home'),
 ]
 if settings.DEBUG:
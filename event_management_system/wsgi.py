@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from events.assets import WSGIAssets
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_management_system.settings')
 
-application = get_wsgi_application()
+# Static files and media are answered before Django sees the request
+application = WSGIAssets(get_wsgi_application())
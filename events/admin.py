@@ -1,7 +1,70 @@
-from django.contrib import admin
-from events.models import Event,Category
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from events.forms import EventImportUploadForm
+from events.importer import guess_format, import_file
+from events.models import ArchivedEvent,Event,Category,OutboundEmail,WaitlistEntry
 # Register your models here.
 
 
-admin.site.register(Event)
-admin.site.register(Category)
\ No newline at end of file
+@admin.register(Event)
+class EventAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/events/event/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='events_event_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Upload a CSV/JSON/NDJSON file and bulk-create its events (see manage.py import_events)."""
+        if not self.has_add_permission(request):
+            return redirect('admin:events_event_changelist')
+        form = EventImportUploadForm()
+        result = None
+        if request.method == 'POST':
+            form = EventImportUploadForm(request.POST, request.FILES)
+            if form.is_valid():
+                upload = form.cleaned_data['file']
+                try:
+                    result = import_file(upload.file, guess_format(upload.name), dry_run=form.cleaned_data['dry_run'])
+                except ValueError as e:
+                    messages.error(request, f"Could not read {upload.name}: {e}")
+                else:
+                    level = messages.WARNING if result.errors else messages.SUCCESS
+                    summary = f"{result.valid} valid row(s), {len(result.errors)} rejected (dry run)" if form.cleaned_data['dry_run'] else str(result)
+                    messages.add_message(request, level, f"{upload.name}: {summary}.")
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import events',
+            'form': form,
+            'result': result,
+            # The report is capped; the command line prints every rejected row
+            'errors': result.errors[:200] if result else [],
+        }
+        return TemplateResponse(request, 'admin/events/event/import.html', context)
+
+
+admin.site.register(Category)
+admin.site.register(WaitlistEntry)
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+
+
+@admin.register(ArchivedEvent)
+class ArchivedEventAdmin(admin.ModelAdmin):
+    """Written only by manage.py archive_events."""
+    list_display = ['name', 'starts_at', 'category', 'rsvp_count', 'archived_at']
+    date_hierarchy = 'starts_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,229 @@
+"""
+Read-only JSON API for events and categories.
+
+Every endpoint answers conditional requests, and works out its validators
+before the view body runs, so a client polling unchanged data gets a 304
+without the page being fetched or serialized:
+
+* the detail endpoints send an ETag and Last-Modified built from the
+  row's ``updated_at`` (one primary key lookup);
+* the list endpoints send an ETag built from one aggregate over the
+  filtered rows: how many there are and the newest ``updated_at`` among
+  them and their categories. Every writer, signals or not, in any process,
+  moves one of those, so the validator can't go stale the way a counter
+  kept in a per-process cache would. Their Last-Modified is informational
+  only: a delete doesn't move it, so 304s are decided by the ETag.
+"""
+import hashlib
+from functools import wraps
+
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+
+from .images import FORMATS, srcset
+from .models import Category, Event
+from .pagination import KeysetPaginator
+from .views import filter_events
+
+
+def _etag(request, *parts):
+    raw = '|'.join(map(str, (request.get_full_path(),) + parts))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def per_request(compute):
+    """Run ``compute`` once per request; condition() asks for the ETag and Last-Modified separately."""
+    attr = f'_api{compute.__name__}'
+
+    @wraps(compute)
+    def wrapper(request, **kwargs):
+        if not hasattr(request, attr):
+            setattr(request, attr, compute(request, **kwargs))
+        return getattr(request, attr)
+    return wrapper
+
+
+def _latest(*timestamps):
+    timestamps = [value for value in timestamps if value is not None]
+    return max(timestamps) if timestamps else None
+
+
+def category_json(category):
+    data = {
+        'id': category.id,
+        'name': category.name,
+        'description': category.description,
+        'updated_at': category.updated_at.isoformat(),
+        'url': reverse('api-category-detail', args=[category.id]),
+    }
+    if hasattr(category, 'event_count'):
+        data['event_count'] = category.event_count
+    return data
+
+
+def asset_images(event):
+    """The resized copies of the asset, empty until the derivative worker has run."""
+    if not srcset(event, 'jpeg'):
+        return []
+    return [
+        {
+            'size': entry['name'],
+            'width': entry['width'],
+            'height': entry['height'],
+            **{fmt: default_storage.url(entry[fmt]) for fmt in FORMATS},
+        }
+        for entry in event.asset_derivatives['sizes']
+    ]
+
+
+def event_json(event):
+    return {
+        'id': event.id,
+        'name': event.name,
+        'description': event.description,
+        'location': event.location,
+        'latitude': event.latitude,
+        'longitude': event.longitude,
+        'date': event.date.isoformat(),
+        'time': event.time.isoformat(),
+        'starts_at': event.starts_at.isoformat(),
+        'category': {'id': event.category_id, 'name': event.category.name},
+        'capacity': event.capacity,
+        'rsvp_count': event.rsvp_count,
+        'seats_left': event.seats_left,
+        'asset': event.asset.url if event.asset else None,
+        'images': asset_images(event),
+        'updated_at': event.updated_at.isoformat(),
+        'url': reverse('api-event-detail', args=[event.id]),
+    }
+
+
+def _page_link(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def _set_last_modified(response, *timestamps):
+    latest = _latest(*timestamps)
+    if latest is not None:
+        response['Last-Modified'] = http_date(latest.timestamp())
+    return response
+
+
+# Event list
+@per_request
+def _event_list_state(request):
+    queryset, _ordering = filter_events(request.GET)
+    return queryset.order_by().aggregate(
+        count=Count('id'), updated=Max('updated_at'), category_updated=Max('category__updated_at'),
+    )
+
+
+def event_list_etag(request):
+    state = _event_list_state(request)
+    parts = [state['count'], state['updated'], state['category_updated']]
+    if request.GET.get('days'):
+        # "The next N days" moves on with the clock, not only with the data
+        parts.append(timezone.now().replace(second=0, microsecond=0).isoformat())
+    return _etag(request, *parts)
+
+
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=event_list_etag)
+def event_list(request):
+    queryset, ordering = filter_events(request.GET)
+    page = KeysetPaginator(ordering).paginate(queryset, request.GET.get('cursor'))
+    response = JsonResponse({
+        'results': [event_json(event) for event in page],
+        'next': _page_link(request, page.next_cursor),
+        'previous': _page_link(request, page.previous_cursor),
+    })
+    state = _event_list_state(request)
+    return _set_last_modified(response, state['updated'], state['category_updated'])
+
+
+# Event detail
+@per_request
+def _event_state(request, id):
+    return Event.objects.filter(pk=id).values('updated_at', 'category__updated_at').first()
+
+
+def event_detail_etag(request, id):
+    state = _event_state(request, id=id)
+    return state and _etag(request, state['updated_at'], state['category__updated_at'])
+
+
+def event_detail_last_modified(request, id):
+    state = _event_state(request, id=id)
+    return state and _latest(state['updated_at'], state['category__updated_at'])
+
+
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=event_detail_etag, last_modified_func=event_detail_last_modified)
+def event_detail(request, id):
+    event = get_object_or_404(Event.objects.select_related('category'), id=id)
+    return JsonResponse(event_json(event))
+
+
+# Categories
+@per_request
+def _category_list_state(request):
+    # event_count changes whenever an event is added, removed or moved to another category
+    return {
+        **Category.objects.aggregate(count=Count('id'), updated=Max('updated_at')),
+        **Event.objects.aggregate(events=Count('id'), events_updated=Max('updated_at')),
+    }
+
+
+def category_list_etag(request):
+    state = _category_list_state(request)
+    return _etag(request, state['count'], state['updated'], state['events'], state['events_updated'])
+
+
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=category_list_etag)
+def category_list(request):
+    categories = Category.objects.annotate(event_count=Count('events')).order_by('name', 'id')
+    response = JsonResponse({'results': [category_json(category) for category in categories]})
+    state = _category_list_state(request)
+    return _set_last_modified(response, state['updated'], state['events_updated'])
+
+
+@per_request
+def _category_state(request, id):
+    return Category.objects.filter(pk=id).annotate(
+        event_count=Count('events'), events_updated=Max('events__updated_at')
+    ).values('updated_at', 'event_count', 'events_updated').first()
+
+
+def category_detail_etag(request, id):
+    state = _category_state(request, id=id)
+    return state and _etag(request, state['updated_at'], state['event_count'], state['events_updated'])
+
+
+def category_detail_last_modified(request, id):
+    state = _category_state(request, id=id)
+    return state and _latest(state['updated_at'], state['events_updated'])
+
+
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=category_detail_etag, last_modified_func=category_detail_last_modified)
+def category_detail(request, id):
+    category = get_object_or_404(Category.objects.annotate(event_count=Count('events')), id=id)
+    data = category_json(category)
+    data['events'] = f"{reverse('api-event-list')}?category={category.id}"
+    return JsonResponse(data)
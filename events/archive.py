@@ -0,0 +1,91 @@
+"""
+Hot/cold split for past events.
+
+archive_events() moves events that started before a cutoff, with their
+RSVPs, from events_event and its participants table into ArchivedEvent /
+ArchivedRSVP, one batch of events per transaction, so the hot tables and
+their indexes only hold recent and upcoming events.
+
+The move skips the Event delete signals on purpose: an archived event is
+still a (past) event for the dashboard counters, and its image files stay
+where they are. The event detail page, the organizer dashboard and "My
+events" read the archive as well, so archived events keep their URLs.
+"""
+import datetime
+from functools import partial
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cache, ical
+from .models import RSVP, ArchivedEvent, ArchivedRSVP, Event, Reminder, WaitlistEntry, start_of_day
+
+# Copied column for column; the geohash is only needed for "near me" searches of hot events
+EVENT_FIELDS = (
+    'id', 'name', 'description', 'date', 'time', 'location', 'category_id', 'starts_at', 'asset',
+    'asset_derivatives', 'rsvp_count', 'capacity', 'updated_at', 'latitude', 'longitude',
+)
+RSVP_BATCH_SIZE = 2000
+
+
+def cutoff(days):
+    """Events starting before this are archived: midnight ``days`` days ago."""
+    if days < ical.PAST_DAYS:
+        # The calendar feeds still show the last PAST_DAYS days from the hot tables
+        raise ValueError(f"Events must stay hot for at least {ical.PAST_DAYS} days.")
+    return start_of_day(timezone.localdate() - datetime.timedelta(days=days))
+
+
+def archive_batch(before, batch_size):
+    """Move up to ``batch_size`` of the oldest events starting before ``before``. Returns (events, rsvps) moved."""
+    with transaction.atomic():
+        # Locked, so an RSVP can't slip into the participants table between the copy and the delete
+        ids = list(
+            Event.objects.select_for_update().filter(starts_at__lt=before)
+            .order_by('starts_at', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0, 0
+        now = timezone.now()
+        ArchivedEvent.objects.bulk_create([
+            ArchivedEvent(**row, archived_at=now) for row in Event.objects.filter(pk__in=ids).values(*EVENT_FIELDS)
+        ])
+
+        moved = 0
+        rows = RSVP.objects.filter(event_id__in=ids).order_by().values_list('id', 'event_id', 'user_id')
+        batch = []
+        for rsvp_id, event_id, user_id in rows.iterator(chunk_size=RSVP_BATCH_SIZE):
+            batch.append(ArchivedRSVP(id=rsvp_id, event_id=event_id, user_id=user_id))
+            if len(batch) == RSVP_BATCH_SIZE:
+                ArchivedRSVP.objects.bulk_create(batch)
+                moved, batch = moved + len(batch), []
+        ArchivedRSVP.objects.bulk_create(batch)
+        moved += len(batch)
+
+        # No m2m_changed / delete signals: the counters still include these rows
+        RSVP.objects.filter(event_id__in=ids).delete()
+        WaitlistEntry.objects.filter(event_id__in=ids).delete()
+        Reminder.objects.filter(event_id__in=ids).delete()
+        # Nothing references the events any more; a plain DELETE skips Event's delete signals too
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(Event._meta.db_table)} '
+                f'WHERE id IN ({", ".join(["%s"] * len(ids))})',
+                ids,
+            )
+
+        transaction.on_commit(partial(
+            cache.bump, cache.EVENTS, cache.CATEGORIES, ical.FEEDS, *map(cache.event_version, ids)
+        ))
+    return len(ids), moved
+
+
+def archive_events(before, batch_size=500):
+    """Archive every event starting before ``before``, ``batch_size`` events per transaction."""
+    total_events = total_rsvps = 0
+    while True:
+        events, rsvps = archive_batch(before, batch_size)
+        if not events:
+            return total_events, total_rsvps
+        total_events += events
+        total_rsvps += rsvps
@@ -0,0 +1,291 @@
+"""
+Production delivery of static files and media uploads.
+
+``collectstatic`` with CompressedManifestStaticFilesStorage writes every
+file under a content-hashed name (via the staticfiles.json manifest) and
+puts a gzip (and, with the Brotli package installed, a brotli) copy of the
+compressible ones next to it.
+
+WSGIAssets / ASGIAssets wrap the Django application in wsgi.py / asgi.py
+and answer STATIC_URL and MEDIA_URL requests straight from disk, before
+any middleware or view runs:
+
+* the precompressed copy that the client's Accept-Encoding prefers,
+  with ``Vary: Accept-Encoding``;
+* ``Cache-Control: immutable`` for a year on hashed names, and a short
+  max-age plus ETag / Last-Modified revalidation for everything else;
+* single byte ranges (206 / 416) and If-Range, for media players;
+* 404 / 405 for missing files and other methods, never a Django view.
+"""
+import asyncio
+import gzip
+import json
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot'}
+# Smaller files gain less from compression than the Vary / Content-Encoding headers cost
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = 'public, max-age=31536000, immutable'
+STATIC_MAX_AGE = 60
+MEDIA_MAX_AGE = 60 * 60
+CHUNK_SIZE = 64 * 1024
+# Content-Encoding: file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names plus .gz / .br copies of every compressible hashed file."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            # Some files (e.g. already minified SVG sprites) don't shrink
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+
+
+class _Response:
+    def __init__(self, status, headers, path=None, offset=0, length=0):
+        self.status = status
+        self.headers = headers
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def chunks(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+def _url_prefix(url):
+    # Only site-relative URLs are ours to serve; a CDN URL is someone else's
+    if not url or '://' in url or url.startswith('//'):
+        return None
+    return '/' + url.strip('/') + '/'
+
+
+def _accepted(accept_encoding):
+    accepted = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = re.search(r'q=([0-9.]+)', params)
+        if coding and not (quality and float(quality.group(1)) == 0):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _byte_range(header, size):
+    """(start, end) inclusive for a single ``bytes=`` range, 'unsatisfiable', or None to send everything."""
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None  # malformed, or several ranges: a full response is always allowed
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+class _Assets:
+    def __init__(self, application):
+        self.application = application
+        self.static_prefix = _url_prefix(settings.STATIC_URL)
+        self.media_prefix = _url_prefix(settings.MEDIA_URL)
+        self.media_root = str(settings.MEDIA_ROOT) if settings.MEDIA_ROOT else None
+        self.static_files, self.immutable = self.scan_static()
+
+    def scan_static(self):
+        """Map of URL path -> file under STATIC_ROOT, and the hashed names listed in the manifest."""
+        root = settings.STATIC_ROOT
+        if not root or not os.path.isdir(root):
+            return None, set()  # not collected: leave /static/ to Django (runserver serves it with DEBUG)
+        files = {}
+        for directory, _dirs, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                files[os.path.relpath(path, root).replace(os.sep, '/')] = path
+        immutable = set()
+        manifest = os.path.join(root, ManifestStaticFilesStorage.manifest_name)
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                immutable.update(json.load(f).get('paths', {}).values())
+        return files, immutable
+
+    def find(self, path):
+        """(file path, cache control, lookup for precompressed copies) or None if ``path`` is not an asset URL."""
+        if self.static_files is not None and self.static_prefix and path.startswith(self.static_prefix):
+            name = path[len(self.static_prefix):]
+            cache_control = IMMUTABLE if name in self.immutable else f'public, max-age={STATIC_MAX_AGE}'
+            return self.static_files.get(name), cache_control, lambda suffix: self.static_files.get(name + suffix)
+        if self.media_root and self.media_prefix and path.startswith(self.media_prefix):
+            try:
+                file_path = safe_join(self.media_root, path[len(self.media_prefix):])
+            except SuspiciousFileOperation:
+                file_path = None
+            if file_path and not os.path.isfile(file_path):
+                file_path = None
+            return file_path, f'public, max-age={MEDIA_MAX_AGE}', lambda suffix: None
+        return None
+
+    def serve(self, method, path, header):
+        """A _Response for an asset URL, or None to pass the request on to Django."""
+        found = self.find(path)
+        if found is None:
+            return None
+        file_path, cache_control, variant = found
+        if file_path is None:
+            return _Response(404, [('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', '0')])
+        if method not in ('GET', 'HEAD'):
+            return _Response(405, [('Allow', 'GET, HEAD'), ('Content-Length', '0')])
+
+        content_type, _ = mimetypes.guess_type(file_path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        headers = [('Content-Type', content_type), ('Cache-Control', cache_control), ('Accept-Ranges', 'bytes')]
+
+        # Ranges are over the identity encoding, which is also what a client resuming a download expects
+        encoding = None
+        variants = [(coding, variant(suffix)) for coding, suffix in ENCODINGS]
+        if any(found_path for _coding, found_path in variants):
+            headers.append(('Vary', 'Accept-Encoding'))
+            if not header('range'):
+                accepted = _accepted(header('accept-encoding'))
+                for coding, found_path in variants:
+                    if found_path and coding in accepted:
+                        encoding, file_path = coding, found_path
+                        headers.append(('Content-Encoding', coding))
+                        break
+
+        stat = os.stat(file_path)
+        size = stat.st_size
+        etag = f'"{int(stat.st_mtime):x}-{size:x}{"-" + encoding if encoding else ""}"'
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+        headers += [('ETag', etag), ('Last-Modified', last_modified)]
+
+        if self.not_modified(header, etag, stat.st_mtime):
+            return _Response(304, headers)
+
+        start, end = 0, size - 1
+        status = 200
+        byte_range = header('range')
+        if byte_range and encoding is None and self.range_applies(header('if-range'), etag, last_modified):
+            byte_range = _byte_range(byte_range, size)
+            if byte_range == 'unsatisfiable':
+                return _Response(416, headers + [('Content-Range', f'bytes */{size}'), ('Content-Length', '0')])
+            if byte_range is not None:
+                start, end = byte_range
+                status = 206
+                headers.append(('Content-Range', f'bytes {start}-{end}/{size}'))
+        length = max(end - start + 1, 0)
+        headers.append(('Content-Length', str(length)))
+        return _Response(status, headers, None if method == 'HEAD' else file_path, start, length)
+
+    @staticmethod
+    def not_modified(header, etag, mtime):
+        if_none_match = header('if-none-match')
+        if if_none_match:
+            return if_none_match.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        if_modified_since = header('if-modified-since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    @staticmethod
+    def range_applies(if_range, etag, last_modified):
+        return not if_range or if_range.strip() in (etag, last_modified)
+
+
+REASONS = {200: 'OK', 206: 'Partial Content', 304: 'Not Modified', 404: 'Not Found', 405: 'Method Not Allowed', 416: 'Range Not Satisfiable'}
+
+
+class WSGIAssets(_Assets):
+    """``application = WSGIAssets(get_wsgi_application())``"""
+
+    def __call__(self, environ, start_response):
+        response = self.serve(
+            environ['REQUEST_METHOD'], environ.get('PATH_INFO', ''),
+            lambda name: environ.get('HTTP_' + name.upper().replace('-', '_'), ''),
+        )
+        if response is None:
+            return self.application(environ, start_response)
+        start_response(f'{response.status} {REASONS[response.status]}', response.headers)
+        if response.path is None:
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper and response.status == 200:
+            # Lets the server use sendfile()
+            return file_wrapper(open(response.path, 'rb'), CHUNK_SIZE)
+        return response.chunks()
+
+
+class ASGIAssets(_Assets):
+    """``application = ASGIAssets(get_asgi_application())``"""
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.application(scope, receive, send)
+        headers = {}
+        for name, value in scope['headers']:
+            headers[name.decode('latin-1')] = value.decode('latin-1')
+        response = self.serve(scope['method'], scope['path'], lambda name: headers.get(name, ''))
+        if response is None:
+            return await self.application(scope, receive, send)
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers],
+        })
+        if response.path is None:
+            return await send({'type': 'http.response.body', 'body': b''})
+        chunks = response.chunks()
+        while True:
+            # File reads happen off the event loop
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
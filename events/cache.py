@@ -0,0 +1,196 @@
+"""
+Version-keyed caching for the public event pages.
+
+Every cache key embeds the current value of one or more version counters
+("events", "categories", "event:<id>"). The signal handlers in
+events.signals bump those counters after a change commits, which makes
+every key built from the old value unreachable; nothing has to be deleted
+and stale entries simply expire.
+
+Versions are values of the clock in nanoseconds. A bump sets every
+counter it touches to the current time in one set_many call instead of
+incrementing them one by one, so an event with thousands of attendees
+still costs one round trip. A version key that gets evicted comes back
+with a value no old entry was ever stored under.
+
+A bump only reaches the processes that read the same cache, so nothing is
+cached unless settings.CACHE_SHARED says the backend is shared.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.safestring import mark_safe
+
+from .routers import from_primary
+
+EVENTS = 'events'
+CATEGORIES = 'categories'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.EVENTS_CACHE_ALIAS]
+
+
+def enabled():
+    """
+    Whether anything is cached. A bump has to reach every process, so a
+    process-local backend (settings.CACHE_SHARED off) would serve other
+    workers' stale entries until they time out; everything is computed
+    fresh instead.
+    """
+    return settings.CACHE_SHARED
+
+
+def event_version(event_id):
+    return f'event:{event_id}'
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def versions(*names):
+    cache = get_cache()
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*names):
+    """Invalidate everything cached under the given versions once the current transaction commits."""
+    def apply():
+        # A new clock value differs from any earlier one, so no read-modify-write is needed
+        now = time.time_ns()
+        get_cache().set_many({_version_key(name): now for name in names}, timeout=None)
+    if names:
+        transaction.on_commit(apply)
+
+
+def record(name, hit):
+    with _stats_lock:
+        _stats[(name, 'hit' if hit else 'miss')] += 1
+
+
+def cache_stats():
+    """Per-process hit/miss counts, {name: {'hit': n, 'miss': n, 'ratio': r}}."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    stats = {}
+    for (name, outcome), count in snapshot.items():
+        stats.setdefault(name, {'hit': 0, 'miss': 0})[outcome] = count
+    for counts in stats.values():
+        total = counts['hit'] + counts['miss']
+        counts['ratio'] = round(counts['hit'] / total, 3) if total else 0.0
+    return stats
+
+
+def _key(prefix, name, version_values, extra=''):
+    digest = hashlib.md5(extra.encode()).hexdigest() if extra else ''
+    return f"{prefix}:{name}:{'.'.join(map(str, version_values))}:{digest}"
+
+
+def _lookup_page(name, version_names, request):
+    """(cache key, the stored response or None)."""
+    key = _key('page', name, versions(*version_names), request.get_full_path())
+    stored = get_cache().get(key)
+    record(name, stored is not None)
+    if stored is None:
+        return key, None
+    status, headers, content = stored
+    response = HttpResponse(content, status=status)
+    for header, value in headers:
+        response[header] = value
+    return key, response
+
+
+def _store_page(key, response):
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    # Never share a response that sets cookies (e.g. a CSRF token)
+    if response.status_code == 200 and not response.streaming and not response.cookies:
+        # Content-Type, Cache-Control, Vary etc. come back with the body
+        stored = (response.status_code, list(response.items()), response.content)
+        get_cache().set(key, stored, settings.PAGE_CACHE_TIMEOUT)
+
+
+def cached_public_page(name, depends_on):
+    """
+    Cache a view's response (status, headers and body) for anonymous GET requests.
+
+    ``depends_on(**kwargs)`` returns the version names the page is built
+    from. Logged-in users always get a fresh render since the navbar and
+    RSVP controls are personal. Works for both sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method != 'GET' or not enabled() or (await request.auser()).is_authenticated:
+                    return await view(request, *args, **kwargs)
+                key, cached = await sync_to_async(_lookup_page)(name, depends_on(**kwargs), request)
+                if cached is not None:
+                    return cached
+                with from_primary():
+                    response = await view(request, *args, **kwargs)
+                await sync_to_async(_store_page)(key, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or not enabled() or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            key, cached = _lookup_page(name, depends_on(**kwargs), request)
+            if cached is not None:
+                return cached
+            with from_primary():
+                response = view(request, *args, **kwargs)
+            _store_page(key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_value(prefix, name, version_names, compute, timeout):
+    """Return ``compute()`` from the cache, keyed on the given versions; hits are counted under ``prefix``."""
+    if not enabled():
+        return compute()
+    cache = get_cache()
+    key = _key(prefix, name, versions(*version_names))
+    value = cache.get(key)
+    record(prefix, value is not None)
+    if value is None:
+        with from_primary():
+            value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def cached_fragment(name, version_names, render):
+    """Return ``render()`` from the cache, keyed on the given versions."""
+    if not enabled():
+        return mark_safe(render())
+    cache = get_cache()
+    key = _key('fragment', name, versions(*version_names))
+    html = cache.get(key)
+    record(f'fragment:{name.split(":")[0]}', html is not None)
+    if html is None:
+        with from_primary():
+            html = render()
+        cache.set(key, html, settings.PAGE_CACHE_TIMEOUT)
+    return mark_safe(html)
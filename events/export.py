@@ -0,0 +1,118 @@
+"""
+Streaming CSV / NDJSON exports of events and RSVP rosters.
+
+Rows are read with ``values_list().iterator(chunk_size=...)`` and written
+out one block at a time, so memory use does not grow with the size of the
+export and the first bytes go out as soon as the first block is read.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from events.models import RSVP
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+EVENT_COLUMNS = (
+    ('id', 'id'),
+    ('name', 'name'),
+    ('description', 'description'),
+    ('category', 'category__name'),
+    ('date', 'date'),
+    ('time', 'time'),
+    ('location', 'location'),
+    ('capacity', 'capacity'),
+    ('rsvp_count', 'rsvp_count'),
+)
+
+ROSTER_COLUMNS = (
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('first_name', 'user__first_name'),
+    ('last_name', 'user__last_name'),
+    ('email', 'user__email'),
+)
+
+
+def _rows(queryset, columns):
+    return queryset.values_list(*[lookup for _name, lookup in columns]).iterator(chunk_size=CHUNK_SIZE)
+
+
+def event_rows(queryset):
+    """(header, rows) for an events export, in start order."""
+    queryset = queryset.order_by('starts_at', 'id')
+    return [name for name, _lookup in EVENT_COLUMNS], _rows(queryset, EVENT_COLUMNS)
+
+
+def roster_rows(event):
+    """(header, rows) for the participants of ``event``, in RSVP order."""
+    queryset = RSVP.objects.filter(event_id=event.pk).order_by('id')
+    return [name for name, _lookup in ROSTER_COLUMNS], _rows(queryset, ROSTER_COLUMNS)
+
+
+def _blocks(rows):
+    while True:
+        block = list(islice(rows, CHUNK_SIZE))
+        if not block:
+            return
+        yield block
+
+
+def as_csv(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for block in _blocks(rows):
+        writer.writerows(block)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def as_ndjson(header, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for block in _blocks(rows):
+        yield ''.join(encoder.encode(dict(zip(header, row))) + '\n' for row in block)
+
+
+def render(fmt, header, rows):
+    """Iterator of text blocks for ``header``/``rows`` in the given format."""
+    return as_csv(header, rows) if fmt == 'csv' else as_ndjson(header, rows)
+
+
+async def _aiter(iterator):
+    # Each block is produced on the same worker thread the ORM uses, so the
+    # database cursor stays on one connection.
+    next_block = sync_to_async(next, thread_sensitive=True)
+    while True:
+        block = await next_block(iterator, None)
+        if block is None:
+            return
+        yield block
+
+
+def stream_response(request, blocks, fmt, filename):
+    """
+    Wrap ``blocks`` in a StreamingHttpResponse.
+
+    Under ASGI a plain iterator would be drained into a list before the first
+    byte is sent, so it is handed over as an async iterator instead.
+    """
+    if isinstance(request, ASGIRequest):
+        blocks = _aiter(blocks)
+    response = StreamingHttpResponse(blocks, content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
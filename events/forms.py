@@ -7,7 +7,7 @@ from events.models import Event, Category
 class EventForm(forms.ModelForm):
     class Meta:
         model = Event
-        fields = ['name', 'description', 'date', 'time', 'location', 'category','asset']
+        fields = ['name', 'description', 'date', 'time', 'location', 'category', 'capacity', 'asset']
         widgets = {
             'name': forms.TextInput(attrs={'placeholder': 'Enter event name', 'class': 'w-full border rounded px-3 py-2'}),
             'description': forms.Textarea(attrs={'placeholder': 'Enter event description', 'class': 'w-full border rounded px-3 py-2', 'rows': 3}),
@@ -15,9 +15,21 @@ class EventForm(forms.ModelForm):
             'time': forms.TimeInput(attrs={'type': 'time', 'class': 'w-full border rounded px-3 py-2'}),
             'location': forms.TextInput(attrs={'placeholder': 'Enter location', 'class': 'w-full border rounded px-3 py-2'}),
             'category': forms.Select(attrs={'class': 'w-full border rounded px-3 py-2'}),
+            'capacity': forms.NumberInput(attrs={'placeholder': 'Unlimited', 'class': 'w-full border rounded px-3 py-2'}),
         }
 
 
+class EventImportForm(EventForm):
+    """EventForm's field rules for one imported row; the category is resolved by name separately."""
+    class Meta(EventForm.Meta):
+        fields = ['name', 'description', 'date', 'time', 'location', 'capacity']
+
+
+class EventImportUploadForm(forms.Form):
+    file = forms.FileField(help_text='CSV with a header row, a JSON array, or NDJSON (one object per line).')
+    dry_run = forms.BooleanField(required=False, label='Only validate')
+
+
 class RSVPForm(forms.Form):
     event = forms.ModelChoiceField(
         queryset=Event.objects.all(),
@@ -30,7 +42,7 @@ class RSVPForm(forms.Form):
 
     def clean_event(self):
         event = self.cleaned_data['event']
-        if self.user in event.participants.all():
+        if self.user is not None and event.has_participant(self.user):
             raise forms.ValidationError("You have already RSVP'd to this event.")
         return event
 
@@ -43,3 +55,28 @@ class CategoryForm(forms.ModelForm):
             'name': forms.TextInput(attrs={'placeholder': 'Enter category name', 'class': 'w-full border rounded px-3 py-2'}),
             'description': forms.Textarea(attrs={'placeholder': 'Enter description', 'class': 'w-full border rounded px-3 py-2', 'rows': 3}),
         }
+
+
+class BulkRSVPForm(forms.Form):
+    attendees = forms.CharField(
+        required=False,
+        label='Usernames or emails',
+        help_text='One per line.',
+        widget=forms.Textarea(attrs={'class': 'w-full border rounded px-3 py-2', 'rows': 8}),
+    )
+    attendee_file = forms.FileField(
+        required=False,
+        label='Or upload a file',
+        help_text='Plain text or CSV, username or email in the first column.',
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        lines = cleaned_data.get('attendees', '').splitlines()
+        upload = cleaned_data.get('attendee_file')
+        if upload:
+            lines += upload.read().decode('utf-8-sig', errors='replace').splitlines()
+        if not any(line.strip() for line in lines):
+            raise forms.ValidationError("Enter at least one username or email.")
+        cleaned_data['lines'] = lines
+        return cleaned_data
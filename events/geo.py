@@ -0,0 +1,233 @@
+"""
+"Events near me" without a spatial database.
+
+Event.latitude / longitude are filled in offline by the geocode_events
+command from a local gazetteer file, and Event.save() stores the point's
+geohash next to them. A geohash is a base32 string in which every extra
+character narrows the cell down, so all points inside a cell share its
+hash as a prefix, and points in the same cell sort next to each other in
+an ordinary B-tree index.
+
+A radius or bounding-box search therefore:
+
+1. covers the box with a handful of geohash cells (``cells_for_box``);
+2. turns each cell into a range scan, ``cell <= geohash < next cell``, on
+   the (geohash, starts_at) index -- a plain range works on SQLite and
+   PostgreSQL alike, where a ``LIKE 'prefix%'`` would depend on collation;
+3. drops the candidates in the corners of the cells that are further away
+   than the radius, using the exact great-circle distance, computed in the
+   same query on those candidate rows only.
+"""
+import csv
+import math
+import unicodedata
+
+from django.db.models import Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# ~37 mm x 19 mm, far finer than a gazetteer place
+PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+# Range scans per query; a box rarely needs more than 2 x 2 cells at the coarsest fitting precision
+MAX_CELLS = 9
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 500
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            interval[0] = middle
+        else:
+            value *= 2
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a cell of ``precision`` characters."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def next_prefix(cell):
+    """The first geohash after every hash that starts with ``cell``, or None past the last cell."""
+    cell = cell.rstrip(BASE32[-1])
+    if not cell:
+        return None
+    return cell[:-1] + BASE32[BASE32.index(cell[-1]) + 1]
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def box_around(latitude, longitude, radius_km):
+    """(south, west, north, east) of the smallest lat/lon box holding the circle."""
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(latitude - d_lat, -90.0), min(latitude + d_lat, 90.0)
+    if south == -90.0 or north == 90.0:
+        return south, -180.0, north, 180.0  # the circle covers a pole
+    d_lon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(latitude))))
+    if d_lon >= 180.0:
+        return south, -180.0, north, 180.0
+    return south, longitude - d_lon, north, longitude + d_lon
+
+
+def _split_antimeridian(south, west, north, east):
+    if west < -180.0:
+        return [(south, west + 360.0, north, 180.0), (south, -180.0, north, east)]
+    if east > 180.0:
+        return [(south, west, north, 180.0), (south, -180.0, north, east - 360.0)]
+    if west > east:  # a box given across the antimeridian
+        return [(south, west, north, 180.0), (south, -180.0, north, east)]
+    return [(south, west, north, east)]
+
+
+def _grid(value, origin, step, cells):
+    # Cell index, with the top edge folded into the last cell
+    return min(int((value - origin) // step), cells - 1)
+
+
+def cells_for_box(south, west, north, east, max_cells=MAX_CELLS):
+    """The longest geohash prefixes that cover the box in at most ``max_cells`` cells."""
+    boxes = _split_antimeridian(south, west, north, east)
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows, columns = round(180.0 / height), round(360.0 / width)
+        spans = []
+        for box_south, box_west, box_north, box_east in boxes:
+            spans.append((
+                range(_grid(box_south, -90.0, height, rows), _grid(box_north, -90.0, height, rows) + 1),
+                range(_grid(box_west, -180.0, width, columns), _grid(box_east, -180.0, width, columns) + 1),
+            ))
+        if sum(len(lats) * len(lons) for lats, lons in spans) > max_cells:
+            continue
+        cells = set()
+        for lats, lons in spans:
+            for row in lats:
+                for column in lons:
+                    # The centre of each grid cell encodes to that cell
+                    cells.add(encode(-90.0 + (row + 0.5) * height, -180.0 + (column + 0.5) * width, precision))
+        return sorted(cells)
+    return ['']  # the whole world
+
+
+def cells_filter(cells):
+    """Q for ``geohash`` starting with any of ``cells``, as index range scans."""
+    condition = Q()
+    for cell in cells:
+        upper = next_prefix(cell)
+        condition |= Q(geohash__gte=cell, geohash__lt=upper) if upper else Q(geohash__gte=cell)
+    return condition & Q(geohash__gt='')
+
+
+def _in_box_filter(south, west, north, east):
+    condition = Q(latitude__gte=south, latitude__lte=north)
+    if west > east:  # across the antimeridian
+        return condition & (Q(longitude__gte=west) | Q(longitude__lte=east))
+    return condition & Q(longitude__gte=west, longitude__lte=east)
+
+
+def in_box(queryset, south, west, north, east):
+    """Events of ``queryset`` in the box: geohash range scans, then the exact edges, all in one query."""
+    return queryset.filter(cells_filter(cells_for_box(south, west, north, east)), _in_box_filter(south, west, north, east))
+
+
+def distance_expression(latitude, longitude):
+    """Haversine distance in km from the point to (Event.latitude, Event.longitude), as SQL."""
+    phi1, lambda1 = math.radians(latitude), math.radians(longitude)
+    half_d_phi = (Radians('latitude') - Value(phi1)) / 2
+    half_d_lambda = (Radians('longitude') - Value(lambda1)) / 2
+    a = Power(Sin(half_d_phi), 2) + Value(math.cos(phi1)) * Cos(Radians('latitude')) * Power(Sin(half_d_lambda), 2)
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Least(Value(1.0), Sqrt(a)))
+
+
+def within(queryset, latitude, longitude, radius_km):
+    """
+    Events of ``queryset`` within ``radius_km`` of the point, annotated with
+    ``distance_km``. The geohash ranges pick the candidates from the index and
+    the bounding box and exact distance are checked on those rows only, all
+    in the same query, so it stays one statement however many events match.
+    """
+    box = box_around(latitude, longitude, radius_km)
+    around = Q()
+    for part in _split_antimeridian(*box):
+        around |= _in_box_filter(*part)
+    return (
+        queryset.filter(cells_filter(cells_for_box(*box)), around)
+        .annotate(distance_km=distance_expression(latitude, longitude))
+        .filter(distance_km__lte=radius_km)
+    )
+
+
+# Gazetteer
+
+def normalize(name):
+    """Lower case, accents and punctuation dropped: how places are matched against Event.location."""
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in name.lower()).split())
+
+
+def load_gazetteer(path):
+    """
+    {normalized name: (latitude, longitude)} from a local gazetteer file.
+
+    Either a CSV with ``name``, ``latitude`` and ``longitude`` columns (and
+    optionally ``alternate_names``, comma separated), or a tab-separated
+    GeoNames dump such as cities15000.txt. Where two places share a name the
+    most populous one (the first one, for a CSV) wins.
+    """
+    places, population = {}, {}
+
+    def add(name, latitude, longitude, size=0):
+        key = normalize(name)
+        if key and (key not in places or size > population[key]):
+            places[key], population[key] = (latitude, longitude), size
+
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.txt'):
+            for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                # geonameid, name, asciiname, alternatenames, latitude, longitude, ... population (14)
+                latitude, longitude = float(row[4]), float(row[5])
+                size = int(row[14] or 0) if len(row) > 14 else 0
+                for name in [row[1], row[2], *row[3].split(',')]:
+                    add(name, latitude, longitude, size)
+        else:
+            for row in csv.DictReader(f):
+                latitude, longitude = float(row['latitude']), float(row['longitude'])
+                for name in [row['name'], *(row.get('alternate_names') or '').split(',')]:
+                    add(name, latitude, longitude)
+    return places
+
+
+def geocode(location, places):
+    """
+    (latitude, longitude) of a free-text location, or None.
+
+    Tries the whole text, then its comma-separated parts from the most
+    specific one, so "Town Hall, Springfield" finds Springfield.
+    """
+    parts = [normalize(part) for part in location.split(',')]
+    for candidate in [normalize(location), *parts]:
+        if candidate in places:
+            return places[candidate]
+    return None
@@ -0,0 +1,178 @@
+"""
+iCalendar (.ics) feeds: all events, the events of one category, and the
+events one user has RSVP'd to.
+
+A feed is built with a single query and stored in the events cache as one
+blob (body, ETag, Last-Modified) under its own version counter (see
+events.cache). The handlers in events.signals bump only the versions of
+the feeds a change touches, so the next poll of that feed rebuilds it and
+every other feed stays as it is. Polling an unchanged feed costs two cache
+reads and no queries, and a client sending back the ETag gets a 304.
+"""
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.core import signing
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_safe
+
+from . import cache
+from .models import Category, Event, start_of_day
+
+# Bumped by bulk writers (imports, seeding) that skip the signals; covers every feed
+FEEDS = 'ical'
+ALL_EVENTS = 'ical:all'
+# Feeds start this many days back, so recent events don't vanish from calendars at once
+PAST_DAYS = 30
+# Also how stale the PAST_DAYS window may get
+FEED_TIMEOUT = 24 * 60 * 60
+TOKEN_SALT = 'events.ical'
+
+
+def category_feed(category_id):
+    return f'ical:category:{category_id}'
+
+
+def user_feed(user_id):
+    return f'ical:user:{user_id}'
+
+
+def invalidate_event(event, user_ids=(), old_category_id=None):
+    """Rebuild the feeds showing ``event``: all events, its category (old and new) and its attendees'."""
+    names = [ALL_EVENTS, category_feed(event.category_id), *map(user_feed, user_ids)]
+    if old_category_id and old_category_id != event.category_id:
+        names.append(category_feed(old_category_id))
+    cache.bump(*names)
+
+
+def invalidate_users(user_ids):
+    cache.bump(*map(user_feed, user_ids))
+
+
+# Private feed URLs: calendar clients can't log in, so the user id is signed instead
+
+def user_token(user):
+    return signing.Signer(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def user_from_token(token):
+    try:
+        return int(signing.Signer(salt=TOKEN_SALT).unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+# Rendering
+
+def _escape(text):
+    return (
+        str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    # Content lines are at most 75 octets; continuation lines start with a space
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1  # don't split a UTF-8 sequence
+        parts.append(encoded[start:end].decode())
+        start, limit = end, 74
+    return '\r\n '.join(parts)
+
+
+def _utc(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def render(title, rows):
+    """The calendar text for ``rows`` of (id, name, description, location, starts_at, updated_at)."""
+    host = settings.FRONTEND_URL.rstrip('/')
+    domain = host.split('://')[-1]
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Events//Event Feeds//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_escape(title)}',
+    ]
+    for event_id, name, description, location, starts_at, updated_at in rows:
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:event-{event_id}@{domain}',
+            f'DTSTAMP:{_utc(updated_at)}',
+            f'DTSTART:{_utc(starts_at)}',
+            f'SUMMARY:{_escape(name)}',
+            f'DESCRIPTION:{_escape(description)}',
+            f'LOCATION:{_escape(location)}',
+            f"URL:{host}{reverse('event_detail', args=[event_id])}",
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ''.join(_fold(line) + '\r\n' for line in lines)
+
+
+def build(title, queryset):
+    since = start_of_day(timezone.localdate() - datetime.timedelta(days=PAST_DAYS))
+    rows = (
+        queryset.filter(starts_at__gte=since).order_by('starts_at', 'id')
+        .values_list('id', 'name', 'description', 'location', 'starts_at', 'updated_at')
+    )
+    body = render(title, rows.iterator())
+    return {
+        'body': body,
+        'etag': hashlib.sha1(body.encode()).hexdigest(),
+        'last_modified': timezone.now().timestamp(),
+    }
+
+
+def get_feed(name, title, queryset):
+    """The stored feed ``name``; rebuilt from ``queryset`` once its version has moved on."""
+    return cache.cached_value('ical', name, [FEEDS, name], lambda: build(title(), queryset), FEED_TIMEOUT)
+
+
+# Views
+
+def _respond(request, feed):
+    etag = quote_etag(feed['etag'])
+    response = get_conditional_response(request, etag=etag, last_modified=int(feed['last_modified']))
+    if response is None:
+        response = HttpResponse(feed['body'], content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(feed['last_modified'])
+    return response
+
+
+@require_safe
+@cache_control(no_cache=True)
+def all_events(request):
+    return _respond(request, get_feed(ALL_EVENTS, lambda: 'All events', Event.objects.all()))
+
+
+@require_safe
+@cache_control(no_cache=True)
+def category_events(request, id):
+    title = lambda: get_object_or_404(Category, id=id).name
+    return _respond(request, get_feed(category_feed(id), title, Event.objects.filter(category_id=id)))
+
+
+@require_safe
+@cache_control(private=True, no_cache=True)
+def user_events(request, token):
+    user_id = user_from_token(token)
+    if user_id is None:
+        raise Http404("Unknown calendar.")
+    queryset = Event.objects.filter(participants=user_id)
+    return _respond(request, get_feed(user_feed(user_id), lambda: 'My events', queryset))
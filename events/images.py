@@ -0,0 +1,171 @@
+"""
+Resized WebP and JPEG derivatives of ``Event.asset``.
+
+Saving an event with a new asset only marks it pending
+(``asset_derivatives`` is set to NULL by events.signals). The
+``build_image_derivatives`` worker picks pending events up, renders every
+size in both formats and records the results on the event:
+
+    {'source': 'event_asset/a.jpg',
+     'sizes': [{'name': 'thumb', 'width': 320, 'height': 213,
+                'webp': 'event_asset/derived/a-320w-1f2e3d4c5b6a.webp',
+                'jpeg': 'event_asset/derived/a-320w-9a8b7c6d5e4f.jpg'}, ...]}
+
+File names carry a hash of their content, so they can be served with a far
+future expiry and never need purging from a CDN.
+"""
+import hashlib
+import io
+import os
+import time
+import uuid
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from events import cache
+from events.models import Event
+
+# name -> target width in pixels, smallest first
+SIZES = {
+    'thumb': 320,
+    'card': 640,
+    'hero': 1600,
+}
+FORMATS = {
+    # format: (Pillow format, extension, save options)
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DERIVED_DIR = 'event_asset/derived'
+# Seconds a claimed batch stays with one worker before another may take it over
+LEASE_SECONDS = 10 * 60
+
+
+def _flatten(image):
+    """JPEG has no alpha channel, so transparent areas go white."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, fmt):
+    pil_format, _ext, options = FORMATS[fmt]
+    if fmt == 'jpeg' or image.mode not in ('RGB', 'RGBA'):
+        image = _flatten(image)
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _store(stem, width, fmt, data, storage):
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    name = f'{DERIVED_DIR}/{stem}-{width}w-{digest}.{FORMATS[fmt][1]}'
+    # Same name means same bytes, so an existing file can be reused as is
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(data))
+    return name
+
+
+def render_derivatives(asset, storage=default_storage):
+    """Write every size/format of ``asset`` to storage and return the sizes list."""
+    with asset.open('rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    stem = os.path.splitext(os.path.basename(asset.name))[0]
+    sizes = []
+    for name, target in SIZES.items():
+        # Never upscale; sizes that would collapse onto the original width are skipped
+        width = min(target, image.width)
+        if sizes and sizes[-1]['width'] == width:
+            continue
+        resized = image.copy()
+        resized.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+        entry = {'name': name, 'width': resized.width, 'height': resized.height}
+        for fmt in FORMATS:
+            entry[fmt] = _store(stem, resized.width, fmt, _encode(resized, fmt), storage)
+        sizes.append(entry)
+    return sizes
+
+
+def delete_derivatives(derivatives, storage=default_storage):
+    for entry in (derivatives or {}).get('sizes', []):
+        for fmt in FORMATS:
+            if entry.get(fmt):
+                storage.delete(entry[fmt])
+
+
+def claim_pending(batch_size=20):
+    """
+    Claim one batch of pending events for this worker and return them.
+
+    The rows are locked (SKIP LOCKED, so several workers can run side by
+    side) only for as long as it takes to mark them with a claim token and a
+    lease; a worker that dies mid-batch leaves claims that others pick up
+    again once the lease has run out.
+    """
+    now = time.time()
+    claim = {'sizes': [], 'claim': uuid.uuid4().hex, 'lease_until': now + LEASE_SECONDS}
+    with transaction.atomic():
+        batch = list(
+            Event.objects.select_for_update(skip_locked=True)
+            .filter(Q(asset_derivatives__isnull=True) | Q(asset_derivatives__lease_until__lt=now))
+            .exclude(asset='').exclude(asset__isnull=True)
+            .only('id', 'asset')
+            .order_by('id')[:batch_size]
+        )
+        # A queryset update: updated_at and the cached pages stay as they are
+        Event.objects.filter(pk__in=[event.pk for event in batch]).update(asset_derivatives=claim)
+    return batch, claim['claim']
+
+
+def build_pending(batch_size=20):
+    """
+    Render derivatives for one batch of pending events. Returns (built, failed).
+
+    Rendering happens after the claim has committed, with no locks held, so
+    RSVPs and edits to those events never wait for Pillow. The result is only
+    written if the asset is unchanged and the claim is still this worker's.
+    """
+    built = failed = 0
+    batch, token = claim_pending(batch_size)
+    for event in batch:
+        try:
+            derivatives = {'source': event.asset.name, 'sizes': render_derivatives(event.asset)}
+            ok = True
+        except Exception as e:
+            # Unreadable or missing files are recorded, not retried forever
+            derivatives = {'source': event.asset.name, 'sizes': [], 'error': str(e)}
+            ok = False
+        written = Event.objects.filter(pk=event.pk, asset=event.asset.name, asset_derivatives__claim=token).update(
+            asset_derivatives=derivatives, updated_at=timezone.now()
+        )
+        if not written:
+            # A new upload, or a worker that took over an expired lease. The files stay:
+            # names are content hashes, so that worker may be using the very same ones.
+            continue
+        if ok:
+            built += 1
+        else:
+            failed += 1
+        cache.bump(cache.EVENTS, cache.event_version(event.pk))
+    return built, failed
+
+
+def srcset(event, fmt):
+    """``srcset`` value for the event's derivatives in ``fmt``, or '' while they are pending."""
+    derivatives = event.asset_derivatives
+    if not event.asset or not derivatives or derivatives.get('source') != event.asset.name:
+        return ''
+    return ', '.join(
+        f"{default_storage.url(entry[fmt])} {entry['width']}w" for entry in derivatives['sizes'] if entry.get(fmt)
+    )
@@ -0,0 +1,181 @@
+"""
+Bulk import of events from CSV, JSON or NDJSON.
+
+Rows are read lazily and handled in batches. Every row is validated with
+EventForm's field rules, categories are resolved by name from an in-memory
+map (loaded once, missing ones created on first use), and the valid rows
+of a batch are inserted with a single bulk_create in their own
+transaction. Invalid rows are reported and skipped; they never abort the
+rest of the file. The columns match what ``export_events`` writes, so an
+export can be fed straight back in.
+
+bulk_create skips Event.save() and the post_save handlers, so starts_at,
+the dashboard counters and the page cache are taken care of here.
+"""
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from events import cache, ical, stats
+from events.forms import EventImportForm
+from events.models import Category, Event
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'json', 'ndjson')
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.valid = 0
+        self.new_categories = []
+        self.errors = []  # (row number, message)
+
+    def __str__(self):
+        return (
+            f"{self.created} created, {len(self.errors)} rejected, "
+            f"{len(self.new_categories)} new categor{'y' if len(self.new_categories) == 1 else 'ies'}"
+        )
+
+
+def guess_format(filename):
+    ext = os.path.splitext(filename)[1].lower().lstrip('.')
+    return {'jsonl': 'ndjson'}.get(ext, ext) if ext in FORMATS + ('jsonl',) else 'csv'
+
+
+class InvalidRecord:
+    """Stands in for a record that couldn't be parsed, so it is reported like any invalid row."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def read_rows(stream, fmt):
+    """Yield one dict per record of a text stream (or an InvalidRecord for an unreadable NDJSON line)."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'json':
+        records = json.load(stream)
+        if not isinstance(records, list):
+            raise ValueError("A JSON import must be an array of objects.")
+        yield from records
+    else:
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield InvalidRecord(f"invalid JSON: {e}")
+
+
+class CategoryResolver:
+    """
+    Category name -> id, case-insensitive, backed by one query. Unknown
+    names are created, or with ``dry_run`` only recorded as to be created.
+    """
+
+    def __init__(self, create=True, dry_run=False):
+        self.create = create
+        self.dry_run = dry_run
+        self.created = []
+        self.reload()
+
+    def reload(self):
+        self.ids = {}
+        for category_id, name in Category.objects.order_by('id').values_list('id', 'name'):
+            self.ids.setdefault(name.strip().lower(), category_id)
+        self.created = [name for name in self.created if name.lower() in self.ids]
+
+    def resolve(self, name):
+        name = name.strip()
+        key = name.lower()
+        if key not in self.ids and self.create:
+            if self.dry_run:
+                self.ids[key] = 0
+            else:
+                # Goes through save() so the category counters and cache stay right
+                self.ids[key] = Category.objects.create(name=name, description='').id
+            self.created.append(name)
+        return self.ids.get(key)
+
+
+def validate_row(row, categories, fields=EventImportForm.base_fields):
+    """
+    Return (Event, None) for a valid row or (None, message).
+
+    The form's fields are reused for every row instead of building a form
+    per row, which spends most of its time deep-copying those fields.
+    """
+    if isinstance(row, InvalidRecord):
+        return None, row.message
+    if not isinstance(row, dict):
+        return None, "not an object"
+    data = {key: '' if value is None else value for key, value in row.items()}
+    cleaned, errors = {}, []
+    for name, field in fields.items():
+        try:
+            cleaned[name] = field.clean(field.widget.value_from_datadict(data, {}, name))
+        except ValidationError as e:
+            errors.append(f"{name}: {' '.join(e.messages)}")
+    category = str(data.get('category', '')).strip()
+    if not category:
+        errors.append("category: This field is required.")
+    if errors:
+        return None, '; '.join(errors)
+
+    category_id = categories.resolve(category)
+    if category_id is None:
+        return None, f"category: {category!r} does not exist."
+    event = Event(category_id=category_id, **cleaned)
+    event.compute_starts_at()
+    return event, None
+
+
+def import_events(rows, batch_size=BATCH_SIZE, dry_run=False, create_categories=True):
+    """Validate and insert ``rows`` (dicts) batch by batch. Returns an ImportResult."""
+    result = ImportResult()
+    categories = CategoryResolver(create=create_categories, dry_run=dry_run)
+    numbered = enumerate(rows, start=1)
+
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+        events, first_row = [], batch[0][0]
+        try:
+            with transaction.atomic():
+                for number, row in batch:
+                    event, error = validate_row(row, categories)
+                    if error:
+                        result.errors.append((number, error))
+                    else:
+                        events.append(event)
+                if not dry_run and events:
+                    Event.objects.bulk_create(events)
+                    stats.bump_events([event.date for event in events])
+        except DatabaseError as e:
+            # The whole batch rolled back, including categories created for it
+            result.errors.append((first_row, f"rows {first_row}-{batch[-1][0]} not imported: {e}"))
+            categories.reload()
+            continue
+        result.valid += len(events)
+        if not dry_run:
+            result.created += len(events)
+
+    result.new_categories = categories.created
+    if result.created:
+        # Category pages count events
+        cache.bump(cache.EVENTS, cache.CATEGORIES, ical.FEEDS)
+    return result
+
+
+def import_file(stream, fmt, **kwargs):
+    """import_events() over a text stream, or a binary one which is decoded as UTF-8."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    return import_events(read_rows(stream, fmt), **kwargs)
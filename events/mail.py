@@ -0,0 +1,123 @@
+"""
+Outbox based mail delivery.
+
+Code on the request path calls ``queue_mail`` which only inserts rows;
+``deliver_pending`` (run by ``manage.py send_queued_mail``) claims them in
+batches and sends each batch over one reused backend connection, retrying
+failures with exponential backoff.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from events import metrics
+from events.models import OutboundEmail
+
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 60 * 60
+# How long a claimed batch stays with one worker; well above the time a batch takes to send
+SEND_LEASE_SECONDS = 10 * 60
+
+
+def queue_mail(subject, message, recipient_list, from_email=None):
+    """Drop-in for send_mail() that writes to the outbox instead of talking to SMTP."""
+    from_email = from_email or settings.EMAIL_HOST_USER
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(subject=subject, body=message, from_email=from_email, recipient=recipient)
+        for recipient in recipient_list
+        if recipient
+    ])
+
+
+def rsvp_confirmation(user, event):
+    """Unsaved outbox row confirming one RSVP; callers bulk_create these."""
+    return OutboundEmail(
+        subject='RSVP Confirmation',
+        body=f'Thank you {user.first_name or user.username} for RSVPing to "{event.name}"!',
+        from_email=settings.EMAIL_HOST_USER,
+        recipient=user.email,
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def claim_due(batch_size=100, now=None):
+    """
+    Claim one batch of due outbox rows for this worker and return them.
+
+    The rows are locked (SKIP LOCKED, so several workers can drain the outbox
+    side by side) only while they are marked SENDING with a lease of
+    SEND_LEASE_SECONDS in next_attempt_at. A worker that dies mid-batch
+    leaves rows whose lease runs out and that the next worker sends again.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[OutboundEmail.PENDING, OutboundEmail.SENDING], next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        lease = now + timedelta(seconds=SEND_LEASE_SECONDS)
+        OutboundEmail.objects.filter(id__in=[outgoing.id for outgoing in batch]).update(
+            status=OutboundEmail.SENDING, next_attempt_at=lease
+        )
+    for outgoing in batch:
+        outgoing.status, outgoing.next_attempt_at = OutboundEmail.SENDING, lease
+    return batch
+
+
+def deliver_pending(batch_size=100, max_attempts=5, connection=None):
+    """
+    Send one batch of due outbox rows. Returns (sent, failed) counts.
+
+    The batch is claimed first (see claim_due) and sent after that has
+    committed, so a slow mail server never keeps a transaction or row locks
+    open, and every row is marked sent as soon as it has gone out.
+    """
+    now = timezone.now()
+    batch = claim_due(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    sent_ids = []
+    failed = 0
+    connection = connection or get_connection()
+    try:
+        with connection:
+            for outgoing in batch:
+                message = EmailMessage(
+                    subject=outgoing.subject,
+                    body=outgoing.body,
+                    from_email=outgoing.from_email,
+                    to=[outgoing.recipient],
+                    connection=connection,
+                )
+                started = time.perf_counter()
+                try:
+                    connection.send_messages([message])
+                except Exception as e:
+                    metrics.observe('events_email_send_seconds', time.perf_counter() - started, outcome='failed')
+                    failed += 1
+                    outgoing.attempts += 1
+                    outgoing.last_error = str(e)
+                    if outgoing.attempts >= max_attempts:
+                        outgoing.status = OutboundEmail.FAILED
+                    else:
+                        outgoing.status = OutboundEmail.PENDING
+                        outgoing.next_attempt_at = now + retry_delay(outgoing.attempts)
+                    outgoing.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+                else:
+                    metrics.observe('events_email_send_seconds', time.perf_counter() - started, outcome='sent')
+                    sent_ids.append(outgoing.id)
+    finally:
+        # Also when the connection itself failed: what did go out must not go out again
+        OutboundEmail.objects.filter(id__in=sent_ids).update(
+            status=OutboundEmail.SENT, sent_at=timezone.now(), last_error=''
+        )
+    return len(sent_ids), failed
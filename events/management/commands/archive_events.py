@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from events.archive import archive_events, cutoff
+
+
+class Command(BaseCommand):
+    help = "Move past events and their RSVPs out of the hot tables into the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+            help="Archive events that started more than this many days ago (default: ARCHIVE_AFTER_DAYS).",
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help="Events moved per transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            before = cutoff(options['days'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        events, rsvps = archive_events(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {events} event(s) starting before {before:%Y-%m-%d} and {rsvps} RSVP(s)."))
@@ -0,0 +1,117 @@
+import http.client
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ['/', '/events/events/', '/events/categories/']
+
+SERVERS = {
+    'asgi': '{python} -m uvicorn event_management_system.asgi:application --host 127.0.0.1 --port {port} --workers {workers} --no-access-log',
+    'wsgi': '{python} -m gunicorn event_management_system.wsgi:application --bind 127.0.0.1:{port} --workers {workers} --threads 4',
+}
+
+
+class Command(BaseCommand):
+    help = "Compare requests per second of the same pages under uvicorn (ASGI) and gunicorn (WSGI)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS)
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per server, spread over all paths.")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--workers', type=int, default=1, help="Server worker processes.")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--only', choices=sorted(SERVERS), help="Benchmark a single server.")
+        parser.add_argument('--asgi-cmd', default=SERVERS['asgi'], help="Command template for the ASGI server.")
+        parser.add_argument('--wsgi-cmd', default=SERVERS['wsgi'], help="Command template for the WSGI server.")
+
+    def handle(self, *args, **options):
+        names = [options['only']] if options['only'] else ['wsgi', 'asgi']
+        for name in names:
+            template = options[f'{name}_cmd']
+            command = shlex.split(template.format(python=sys.executable, port=options['port'], workers=options['workers']))
+            module = command[2] if command[1:2] == ['-m'] else command[0]
+            if command[1:2] == ['-m'] and subprocess.run(command[:2] + [module, '--version'], capture_output=True).returncode:
+                raise CommandError(f"{module} is not installed (pip install {module}).")
+            if command[1:2] != ['-m'] and not shutil.which(command[0]):
+                raise CommandError(f"{command[0]} not found.")
+
+            # A file, not a pipe: nobody reads a pipe during the load, and a full one would stall the server
+            with tempfile.TemporaryFile() as log:
+                server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=log)
+                try:
+                    self.wait_until_ready(server, log, options['port'], options['paths'][0])
+                    self.run_load(name, options)
+                finally:
+                    server.terminate()
+                    server.wait(timeout=10)
+
+    def wait_until_ready(self, server, log, port, path, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                log.seek(0)
+                raise CommandError(f"Server exited early:\n{log.read().decode(errors='replace')}")
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+                conn.request('GET', path)
+                conn.getresponse().read()
+                conn.close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"Server did not answer on port {port} within {timeout}s.")
+
+    def run_load(self, name, options):
+        paths = options['paths']
+        total, concurrency = options['requests'], options['concurrency']
+        latencies, errors = [], []
+        lock = threading.Lock()
+        counter = iter(range(total))
+
+        def worker():
+            # One keep-alive connection per client thread, like a browser
+            conn = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=30)
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                start = time.perf_counter()
+                try:
+                    conn.request('GET', paths[i % len(paths)])
+                    response = conn.getresponse()
+                    response.read()
+                    ok = response.status == 200
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=30)
+                    ok = False
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if not ok:
+                        errors.append(i)
+            conn.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        self.stdout.write(
+            f"{name}: {total / wall:.1f} req/s, p50 {p50:.1f} ms, p95 {p95:.1f} ms, "
+            f"{len(errors)} error(s) over {total} requests at concurrency {concurrency}"
+        )
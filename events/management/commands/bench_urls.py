@@ -0,0 +1,178 @@
+import json
+import platform
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.urls.resolvers import RoutePattern
+from django.utils import timezone
+
+from events.models import Category, Event
+
+# Only URLs from these URLconfs are measured
+APPS = ('events', 'users')
+# These change data (or the session) even on GET
+SKIP = {'logout', 'rsvp-event', 'cancel-rsvp'}
+
+
+def percentile(sorted_values, pct):
+    index = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[index]
+
+
+def walk(patterns, prefix=''):
+    """(route, pattern) for every URL under ``patterns``, with the include prefixes joined in."""
+    for entry in patterns:
+        if isinstance(entry, URLResolver):
+            yield from walk(entry.url_patterns, prefix + str(entry.pattern))
+        elif isinstance(entry, URLPattern):
+            yield prefix + str(entry.pattern), entry
+
+
+class Command(BaseCommand):
+    help = (
+        "Time GET requests to every URL of the events and users apps and count their queries. "
+        "Run it once per database (e.g. with DATABASE_URL pointing at SQLite, then Postgres) and compare the JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per URL.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per URL first (fills caches).")
+        parser.add_argument('--user', help="Username to log in as; defaults to the first superuser. Use '' for anonymous.")
+        parser.add_argument('--filter', default='', help="Only URLs containing this text.")
+        parser.add_argument('-o', '--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--compare', help="A previous JSON result to print the differences against.")
+
+    def handle(self, *args, **options):
+        # A broken page is reported with its 500 status instead of stopping the run
+        client = Client(raise_request_exception=False)
+        user = self.pick_user(options['user'])
+        if user is not None:
+            client.force_login(user)
+
+        event = Event.objects.order_by('pk').first()
+        category = Category.objects.order_by('pk').first()
+        samples = {
+            'id': event and event.pk,
+            'event_id': event and event.pk,
+            'user_id': user.pk if user else User.objects.values_list('pk', flat=True).first(),
+        }
+        # Category URLs take the same "id" parameter as event URLs
+        category_id = category and category.pk
+
+        results, skipped = {}, []
+        for path, name in self.urls(samples, category_id, options['filter']):
+            if path is None:
+                skipped.append(name)
+                continue
+            results[path] = self.measure(client, path, name, options['requests'], options['warmup'])
+            row = results[path]
+            self.stdout.write(
+                f"{path:<45} {row['status']}  p50 {row['p50_ms']:7.2f} ms  p95 {row['p95_ms']:7.2f} ms  "
+                f"p99 {row['p99_ms']:7.2f} ms  {row['queries']:3d} queries"
+            )
+        for name in skipped:
+            self.stdout.write(f"skipped {name}")
+
+        report = {
+            'run_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'database_version': '.'.join(map(str, connection.get_database_version())),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'user': user.username if user else None,
+            'requests_per_url': options['requests'],
+            'events': Event.objects.count(),
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        if options['compare']:
+            self.compare(report, options['compare'])
+
+    def pick_user(self, username):
+        if username == '':
+            return None
+        if username is None:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+            if user is None:
+                raise CommandError("No superuser to log in as; create one or pass --user.")
+            return user
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {username!r}.")
+
+    def urls(self, samples, category_id, text_filter):
+        """(path, name) for every URL; path is None when it is skipped or its arguments can't be filled in."""
+        for route, pattern in walk(get_resolver().url_patterns):
+            # Regex routes are the DEBUG media/static handlers
+            if not route.startswith(tuple(f'{app}/' for app in APPS)) or not isinstance(pattern.pattern, RoutePattern):
+                continue
+            name = pattern.name or route
+            if name in SKIP:
+                yield None, name
+                continue
+            kwargs = {}
+            for key, converter in pattern.pattern.converters.items():
+                value = category_id if key == 'id' and route.split('/')[1] == 'categories' else samples.get(key)
+                if value is None or converter.regex != '[0-9]+':
+                    kwargs = None
+                    break
+                kwargs[key] = value
+            if kwargs is None:
+                yield None, name
+                continue
+            path = '/' + route
+            for key, value in kwargs.items():
+                path = path.replace(f'<int:{key}>', str(value))
+            if text_filter not in path:
+                continue
+            yield path, name
+
+    def measure(self, client, path, name, count, warmup):
+        for _ in range(warmup):
+            client.get(path)
+        timings, query_counts = [], []
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)  # exports: time the whole body
+                timings.append((time.perf_counter() - started) * 1000)
+            query_counts.append(len(queries))
+        timings.sort()
+        return {
+            'name': name,
+            'status': response.status_code,
+            'queries': round(statistics.median(query_counts)),
+            'max_queries': max(query_counts),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'max_ms': round(timings[-1], 3),
+        }
+
+    def compare(self, report, baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        self.stdout.write(f"\nAgainst {baseline_path} ({baseline['database']}, {baseline['run_at']}):")
+        for path, row in report['results'].items():
+            before = baseline['results'].get(path)
+            if before is None:
+                continue
+            change = (row['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+            self.stdout.write(
+                f"{path:<45} p50 {before['p50_ms']:7.2f} -> {row['p50_ms']:7.2f} ms ({change:+.0f}%)  "
+                f"queries {before['queries']} -> {row['queries']}"
+            )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.images import build_pending
+
+
+class Command(BaseCommand):
+    help = "Render the thumbnail, card and hero sizes of newly uploaded event images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new uploads instead of exiting when none are left.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep between polls with --loop.")
+
+    def handle(self, *args, **options):
+        total_built = total_failed = 0
+        while True:
+            built, failed = build_pending(options['batch_size'])
+            total_built += built
+            total_failed += failed
+
+            if built or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Built derivatives for {total_built} event(s), {total_failed} failure(s)."))
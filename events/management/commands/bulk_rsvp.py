@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import Event
+from events.rsvp import bulk_rsvp, parse_identifiers
+
+
+class Command(BaseCommand):
+    help = "RSVP a list of users (usernames or emails, one per line) to an event."
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('file', nargs='?', help="Text/CSV file with the guest list; reads stdin when omitted.")
+        parser.add_argument('--no-email', action='store_true', help="Do not queue confirmation emails.")
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+
+        if options['file']:
+            with open(options['file'], encoding='utf-8-sig') as f:
+                identifiers = parse_identifiers(f)
+        else:
+            identifiers = parse_identifiers(sys.stdin)
+
+        result = bulk_rsvp(event, identifiers, notify=not options['no_email'])
+        for value in result.unknown:
+            self.stderr.write(f"Not found: {value}")
+        self.stdout.write(self.style.SUCCESS(f"{event.name}: {result}."))
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events import export
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Stream all events, or one event's participant roster, as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+        parser.add_argument('--roster', type=int, metavar='EVENT_ID', help="Export the participants of this event instead.")
+        parser.add_argument('-o', '--output', help="File to write to; stdout when omitted.")
+
+    def handle(self, *args, **options):
+        if options['roster'] is not None:
+            try:
+                event = Event.objects.get(pk=options['roster'])
+            except Event.DoesNotExist:
+                raise CommandError(f"Event {options['roster']} does not exist.")
+            header, rows = export.roster_rows(event)
+        else:
+            header, rows = export.event_rows(Event.objects.all())
+
+        blocks = export.render(options['format'], header, rows)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                f.writelines(blocks)
+        else:
+            # Not self.stdout: it would append a newline after every block
+            sys.stdout.writelines(blocks)
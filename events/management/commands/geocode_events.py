@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from events import cache, geo
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Fill in Event.latitude/longitude by looking each location up in a local gazetteer file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('gazetteer', help="CSV with name,latitude,longitude columns, or a GeoNames .txt dump.")
+        parser.add_argument('--all', action='store_true', help="Geocode events that already have coordinates too.")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            places = geo.load_gazetteer(options['gazetteer'])
+        except (OSError, KeyError, IndexError, ValueError) as exc:
+            raise CommandError(f"Can't read gazetteer {options['gazetteer']}: {exc}")
+        self.stdout.write(f"Loaded {len(places)} place name(s).")
+
+        events = Event.objects.order_by('id').only('id', 'location')
+        if not options['all']:
+            events = events.filter(latitude__isnull=True)
+
+        # Many events share a venue
+        lookups = {}
+        located = unknown = 0
+        last_id = 0
+        while True:
+            batch = list(events.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            now = timezone.now()
+            changed = []
+            for event in batch:
+                if event.location not in lookups:
+                    lookups[event.location] = geo.geocode(event.location, places)
+                point = lookups[event.location]
+                if point is None:
+                    unknown += 1
+                    continue
+                event.latitude, event.longitude = point
+                event.compute_geohash()
+                event.updated_at = now
+                changed.append(event)
+            # bulk_update skips save(), hence compute_geohash() above
+            if changed:
+                with transaction.atomic():
+                    Event.objects.bulk_update(changed, ['latitude', 'longitude', 'geohash', 'updated_at'])
+                    transaction.on_commit(lambda: cache.bump(cache.EVENTS))
+            located += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"Geocoded {located} event(s); {unknown} event(s) at places not in the gazetteer."))
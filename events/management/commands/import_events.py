@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.importer import BATCH_SIZE, FORMATS, guess_format, import_file
+
+
+class Command(BaseCommand):
+    help = "Create events in bulk from a CSV, JSON or NDJSON file. Invalid rows are reported and skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('file')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension, else csv.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per transaction / bulk_create.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only; nothing is written.")
+        parser.add_argument('--no-create-categories', action='store_true', help="Reject rows whose category does not exist.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['file'])
+        try:
+            with open(options['file'], encoding='utf-8-sig', newline='') as f:
+                result = import_file(
+                    f, fmt,
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                    create_categories=not options['no_create_categories'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {options['file']}: {e}")
+
+        for number, message in result.errors:
+            self.stderr.write(f"Row {number}: {message}")
+        if options['dry_run']:
+            self.stdout.write(f"Dry run: {result.valid} valid row(s), {len(result.errors)} rejected, "
+                              f"{len(result.new_categories)} new categories.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Imported events: {result}."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from events.stats import fold, rebuild, rollover
+
+
+class Command(BaseCommand):
+    help = "Verify the dashboard stats row against the live aggregates and rebuild it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rollover-only', action='store_true',
+            help="Only fold in the pending deltas and move past-dated events from upcoming to past (the cheap daily job).",
+        )
+
+    def handle(self, *args, **options):
+        if options['rollover_only']:
+            fold()
+            stats = rollover()
+            self.stdout.write(self.style.SUCCESS(
+                f"Rolled over to {stats.as_of}: {stats.upcoming_events} upcoming, {stats.past_events} past."
+            ))
+            return
+
+        rollover()  # compare like with like: the stored split for today
+        stats, drift = rebuild()
+        for name, (stored, actual) in drift.items():
+            self.stdout.write(self.style.WARNING(f"{name}: stored {stored}, actual {actual}"))
+        if drift:
+            self.stdout.write(self.style.SUCCESS("Dashboard stats rebuilt."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Dashboard stats match the live aggregates."))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from events import cache
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Recompute Event.rsvp_count from the participants table and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report events whose counter is off.")
+
+    def handle(self, *args, **options):
+        through = Event.participants.through
+        actual = Subquery(
+            through.objects.filter(event_id=OuterRef('pk'))
+            .values('event_id')
+            .annotate(total=Count('*'))
+            .values('total')
+        )
+        drifted = Event.objects.annotate(actual=Coalesce(actual, 0)).exclude(rsvp_count=F('actual'))
+
+        if options['dry_run']:
+            for event_id, stored, real in drifted.values_list('id', 'rsvp_count', 'actual').iterator():
+                self.stdout.write(f"Event {event_id}: stored {stored}, actual {real}")
+            self.stdout.write(f"{drifted.count()} event(s) out of sync.")
+            return
+
+        # One UPDATE over the drifted rows only
+        fixed = Event.objects.filter(pk__in=drifted.values('pk')).update(
+            rsvp_count=Coalesce(actual, 0), updated_at=timezone.now()
+        )
+        if fixed:
+            cache.bump(cache.EVENTS)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} event(s)."))
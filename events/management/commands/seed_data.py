@@ -0,0 +1,193 @@
+import datetime
+import random
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from faker import Faker
+
+from events import cache, ical, stats
+from events.models import RSVP, Category, Event
+
+# Faker is slow per call, so each kind of value is drawn from a pool built up front
+POOL_SIZE = 5000
+# Two parameters per row, under SQLite's default limit of 999 per statement
+RSVP_ROWS_PER_STATEMENT = 450
+
+
+class Command(BaseCommand):
+    help = "Fill the database with realistic looking users, categories, events and RSVPs using bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--events', type=int, default=10000)
+        parser.add_argument('--rsvps', type=int, default=100000, help="Total RSVPs, spread unevenly over the events.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for repeatable data sets.")
+        parser.add_argument('--password', default='password', help="Password of every seeded user.")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.fake = Faker()
+        Faker.seed(options['seed'])
+        self.batch_size = options['batch_size']
+        if options['rsvps'] and not (options['users'] and options['events']):
+            raise CommandError("RSVPs need at least one user and one event.")
+
+        started = time.monotonic()
+        user_ids = self.step('users', self.seed_users, options['users'], options['password'])
+        category_ids = self.step('categories', self.seed_categories, options['categories'])
+        event_ids = self.step('events', self.seed_events, options['events'], category_ids)
+        self.step('RSVPs', self.seed_rsvps, options['rsvps'], event_ids, user_ids)
+        self.step('counters', self.refresh_counters, event_ids)
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.monotonic() - started:.1f}s."))
+
+    def step(self, label, func, *args):
+        started = time.monotonic()
+        result = func(*args)
+        count = len(result) if isinstance(result, (list, range)) else result
+        self.stdout.write(f"  {label}: {count} in {time.monotonic() - started:.1f}s")
+        return result
+
+    def pool(self, make):
+        return [make() for _ in range(POOL_SIZE)]
+
+    def insert(self, model, objects):
+        """bulk_create a generator of objects in batches, each in its own transaction."""
+        batch, total = [], 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                total += self.flush(model, batch)
+                batch = []
+        return total + self.flush(model, batch)
+
+    def flush(self, model, batch):
+        if batch:
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+        return len(batch)
+
+    def new_ids(self, model, since_id):
+        return list(model.objects.filter(pk__gt=since_id).order_by('pk').values_list('pk', flat=True))
+
+    def last_id(self, model):
+        return model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    def seed_users(self, count, password):
+        if not count:
+            return []
+        # Hashing once is what makes 100k users take seconds instead of hours
+        password = make_password(password)
+        first_names, last_names = self.pool(self.fake.first_name), self.pool(self.fake.last_name)
+        since, run = self.last_id(User), self.random.randrange(16 ** 6)
+        joined = timezone.now()
+
+        def users():
+            for i in range(count):
+                first, last = self.random.choice(first_names), self.random.choice(last_names)
+                username = f'{first.lower()}.{last.lower()}.{run:06x}{i}'
+                yield User(
+                    username=username[:150], email=f'{username}@example.com'[:254], first_name=first,
+                    last_name=last, password=password, is_active=True, date_joined=joined,
+                )
+
+        self.insert(User, users())
+        user_ids = self.new_ids(User, since)
+        # bulk_create skips users.signals.assign_role
+        group, _ = Group.objects.get_or_create(name='User')
+        membership = User.groups.through
+        self.insert(membership, (membership(user_id=user_id, group_id=group.id) for user_id in user_ids))
+        return user_ids
+
+    def seed_categories(self, count):
+        since = self.last_id(Category)
+        names = {self.fake.unique.word().title() for _ in range(count)}
+        self.insert(Category, (Category(name=name, description=self.fake.sentence()) for name in names))
+        category_ids = self.new_ids(Category, since) or list(Category.objects.values_list('pk', flat=True))
+        return category_ids
+
+    def seed_events(self, count, category_ids):
+        if not count:
+            return []
+        if not category_ids:
+            raise CommandError("Events need at least one category.")
+        titles = self.pool(lambda: self.fake.catch_phrase())
+        descriptions = self.pool(lambda: self.fake.paragraph(nb_sentences=3))
+        locations = self.pool(self.fake.city)
+        today, since = timezone.localdate(), self.last_id(Event)
+
+        def events():
+            for _ in range(count):
+                event = Event(
+                    name=self.random.choice(titles),
+                    description=self.random.choice(descriptions),
+                    date=today + datetime.timedelta(days=self.random.randint(-365, 365)),
+                    time=datetime.time(self.random.randint(8, 21), self.random.choice((0, 15, 30, 45))),
+                    location=self.random.choice(locations),
+                    category_id=self.random.choice(category_ids),
+                )
+                event.compute_starts_at()  # bulk_create skips save()
+                yield event
+
+        self.insert(Event, events())
+        return self.new_ids(Event, since)
+
+    def seed_rsvps(self, count, event_ids, user_ids):
+        """Spread ``count`` RSVPs over the events with a long tail: a few popular events, many quiet ones."""
+        if not count:
+            return 0
+        mean = max(count / len(event_ids), 1)
+
+        def rsvps():
+            remaining = count
+            while remaining > 0:
+                for event_id in event_ids:
+                    size = min(int(self.random.expovariate(1 / mean)) + 1, remaining, len(user_ids))
+                    for user_id in self.random.sample(user_ids, size):
+                        yield event_id, user_id
+                    remaining -= size
+                    if remaining <= 0:
+                        return
+
+        pairs, batch = rsvps(), True
+        while batch:
+            batch = list(islice(pairs, self.batch_size))
+            self.insert_rsvps(batch)
+        return RSVP.objects.filter(event_id__gte=event_ids[0]).count()
+
+    def insert_rsvps(self, pairs):
+        """
+        Plain multi-row INSERTs for the two-column RSVP table. At millions of
+        rows, building model instances for bulk_create costs several times
+        more than the inserts themselves.
+        """
+        ops = connection.ops
+        table, columns = RSVP._meta.db_table, ('event_id', 'user_id')
+        # A second pass over an event can pick users it already has; those rows are skipped
+        prefix = f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {ops.quote_name(table)} ({', '.join(map(ops.quote_name, columns))}) VALUES "
+        suffix = ops.on_conflict_suffix_sql(RSVP._meta.fields, OnConflict.IGNORE, None, None)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(pairs), RSVP_ROWS_PER_STATEMENT):
+                rows = pairs[start:start + RSVP_ROWS_PER_STATEMENT]
+                cursor.execute(
+                    prefix + ', '.join(['(%s, %s)'] * len(rows)) + f' {suffix}',
+                    [value for row in rows for value in row],
+                )
+
+    def refresh_counters(self, event_ids):
+        # rsvp_count, the dashboard counters and the page cache skip bulk inserts
+        if event_ids:
+            actual = RSVP.objects.filter(event_id=OuterRef('pk')).values('event_id').annotate(total=Count('*')).values('total')
+            Event.objects.filter(pk__gte=event_ids[0]).update(rsvp_count=Coalesce(Subquery(actual), 0))
+        stats.rebuild()
+        cache.bump(cache.EVENTS, cache.CATEGORIES, ical.FEEDS)
+        return len(event_ids)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.mail import deliver_pending
+from events.reminders import queue_due_reminders
+
+
+class Command(BaseCommand):
+    help = "Queue reminder emails for events starting soon; safe to rerun, nobody is reminded twice of the same start time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=None, help="Lead time (default: REMINDER_LEAD_HOURS).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Reminders queued per transaction.")
+        parser.add_argument('--deliver', action='store_true', help="Also drain the outbox, like send_queued_mail.")
+        parser.add_argument('--loop', action='store_true', help="Keep checking for due events instead of exiting.")
+        parser.add_argument('--interval', type=float, default=300.0, help="Seconds to sleep between checks with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            events, emails = queue_due_reminders(options['hours'], options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Queued {emails} reminder(s) for {events} event(s)."))
+            if options['deliver']:
+                sent = failed = 0
+                while True:
+                    batch_sent, batch_failed = deliver_pending(options['batch_size'])
+                    if not (batch_sent or batch_failed):
+                        break
+                    sent, failed = sent + batch_sent, failed + batch_failed
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} message(s), {failed} failure(s)."))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.mail import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver mail waiting in the outbox over a single reused connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=5, help="Give up on a message after this many failures.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting when it is empty.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep between polls with --loop.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            try:
+                sent, failed = deliver_pending(options['batch_size'], options['max_attempts'])
+            except Exception as e:
+                # e.g. the SMTP server refused the connection; the batch is retried once its lease runs out
+                self.stderr.write(f"Mail batch failed: {e}")
+                sent = failed = 0
+                if not options['loop']:
+                    raise
+            total_sent += sent
+            total_failed += failed
+
+            if sent or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Sent {total_sent} message(s), {total_failed} failure(s)."))
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into every SQLite replica. A stand-in for replication when "
+        "trying the replica router locally; --loop with an --interval imitates replication lag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep copying instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between copies with --loop.")
+
+    def handle(self, *args, **options):
+        aliases = ['default', *settings.DATABASE_REPLICAS]
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured; set DATABASE_REPLICA_URLS.")
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError("Only SQLite databases can be copied; real replicas are kept in sync by the server.")
+
+        while True:
+            primary = connections['default']
+            primary.ensure_connection()
+            for alias in settings.DATABASE_REPLICAS:
+                replica = connections[alias]
+                replica.ensure_connection()
+                primary.connection.backup(replica.connection)
+            self.stdout.write(f"Copied the primary into {', '.join(settings.DATABASE_REPLICAS)}.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
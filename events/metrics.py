@@ -0,0 +1,299 @@
+"""
+Request, SQL, template and email metrics in the Prometheus text format.
+
+MetricsMiddleware times every request and labels it with the URL name.
+The number and total time of the SQL queries it ran are collected by an
+execute wrapper that is installed on every database connection when the
+connection is opened. Template render time is measured by the
+TimedDjangoTemplates backend, and email delivery time by events.mail.
+
+Everything is aggregated in this process. Prometheus scrapes one process
+at a time, so with several workers set METRICS_DIR to a directory all of
+them can write to. Each process then saves its own snapshot there every
+METRICS_FLUSH_INTERVAL seconds, and /metrics adds up all the snapshots.
+A process removes its snapshot when it exits, and snapshots left behind by
+processes that died without cleaning up are skipped and deleted.
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+HISTOGRAMS = {
+    # name: (help, label names, buckets)
+    'events_request_duration_seconds': ("Request latency by URL name.", ('view', 'method', 'status'), SECONDS_BUCKETS),
+    'events_request_queries': ("SQL queries per request by URL name.", ('view',), COUNT_BUCKETS),
+    'events_request_sql_seconds': ("Time spent in SQL per request by URL name.", ('view',), SECONDS_BUCKETS),
+    'events_template_render_seconds': ("Template render time by template name.", ('template',), SECONDS_BUCKETS),
+    'events_email_send_seconds': ("Time to send one message through the email backend.", ('outcome',), SECONDS_BUCKETS),
+}
+
+# The request being measured in this context; follows the request across sync_to_async
+_current = contextvars.ContextVar('events_metrics_request', default=None)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, label values) -> [bucket counts, sum, count]
+_last_flush = 0.0
+
+
+def observe(name, value, **labels):
+    """Record ``value`` in histogram ``name``."""
+    _help, label_names, buckets = HISTOGRAMS[name]
+    key = (name, tuple(str(labels[label]) for label in label_names))
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [[0] * len(buckets), 0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+    maybe_flush()
+
+
+class Timer:
+    """``with Timer('events_template_render_seconds', template=name):``"""
+
+    def __init__(self, name, **labels):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+
+# SQL
+
+class _RequestStats:
+    __slots__ = ('queries', 'sql_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+# Templates
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with Timer('events_template_render_seconds', template=self.origin.template_name):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing every top-level render."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+# Middleware
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    # Unmatched paths share one label so 404 scans can't blow up the series count
+    return (match.view_name or match.route) if match else '<unresolved>'
+
+
+class MetricsMiddleware:
+    """Per-URL-name latency, SQL count and SQL time. Works for sync and async requests."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, stats, token, started)
+
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, stats, token, started)
+
+    def _start(self):
+        stats = _RequestStats()
+        return stats, _current.set(stats), time.perf_counter()
+
+    def _finish(self, request, response, stats, token, started):
+        elapsed = time.perf_counter() - started
+        _current.reset(token)
+        view = _view_name(request)
+        observe(
+            'events_request_duration_seconds', elapsed,
+            view=view, method=request.method, status=response.status_code if response is not None else 500,
+        )
+        observe('events_request_queries', stats.queries, view=view)
+        observe('events_request_sql_seconds', stats.sql_seconds, view=view)
+
+
+# Aggregation across processes
+
+def snapshot():
+    with _lock:
+        return [[name, list(labels), [list(series[0]), series[1], series[2]]] for (name, labels), series in _histograms.items()]
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', '')
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR (one file per process, replaced atomically)."""
+    global _last_flush
+    directory = _metrics_dir()
+    if not directory:
+        return
+    _last_flush = time.monotonic()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(f'{path}.tmp', path)
+
+
+def maybe_flush():
+    if _metrics_dir() and time.monotonic() - _last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+        flush()
+
+
+def _remove_snapshot():
+    directory = _metrics_dir()
+    if directory:
+        try:
+            os.remove(os.path.join(directory, f'{os.getpid()}.json'))
+        except FileNotFoundError:
+            pass
+
+
+atexit.register(_remove_snapshot)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+
+def collect():
+    """All series, summed over the snapshots in METRICS_DIR, or this process's alone without one."""
+    directory = _metrics_dir()
+    if not directory:
+        return snapshot()
+    flush()
+    merged = {}
+    for filename in os.listdir(directory):
+        pid = filename[:-len('.json')]
+        if not filename.endswith('.json') or not pid.isdigit():
+            continue
+        path = os.path.join(directory, filename)
+        if not _alive(int(pid)):
+            try:
+                os.remove(path)  # the worker died without cleaning up; its counters are gone with it
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                series_list = json.load(f)
+        except (OSError, ValueError):
+            continue  # being replaced right now
+        for name, labels, (buckets, total, count) in series_list:
+            if name not in HISTOGRAMS:
+                continue
+            key = (name, tuple(labels))
+            if key not in merged:
+                merged[key] = [[0] * len(buckets), 0.0, 0]
+            target = merged[key]
+            target[0] = [a + b for a, b in zip(target[0], buckets)]
+            target[1] += total
+            target[2] += count
+    return [[name, list(labels), series] for (name, labels), series in merged.items()]
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in pairs) + '}'
+
+
+def render_prometheus():
+    """The collected metrics in the Prometheus text exposition format (version 0.0.4)."""
+    by_name = defaultdict(list)
+    for name, labels, series in collect():
+        by_name[name].append((labels, series))
+
+    lines = []
+    for name, (help_text, label_names, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, (counts, total, count) in sorted(by_name.get(name, [])):
+            pairs = list(zip(label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(pairs + [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(pairs + [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_format_labels(pairs)} {total}')
+            lines.append(f'{name}_count{_format_labels(pairs)} {count}')
+    return '\n'.join(lines) + '\n'
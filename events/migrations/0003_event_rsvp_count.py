@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_rsvp_count(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    through = Event.participants.through
+    actual = through.objects.filter(event_id=OuterRef('pk')).values('event_id').annotate(total=Count('*')).values('total')
+    Event.objects.update(rsvp_count=Coalesce(Subquery(actual), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_event_start_order_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='rsvp_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rsvp_count, migrations.RunPython.noop),
+    ]
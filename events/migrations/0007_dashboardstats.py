@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:00
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+def populate_stats(apps, schema_editor):
+    Category = apps.get_model('events', 'Category')
+    DashboardStats = apps.get_model('events', 'DashboardStats')
+    Event = apps.get_model('events', 'Event')
+    today = timezone.now().date()
+    counts = Event.objects.aggregate(
+        total_events=Count('id'),
+        upcoming_events=Count('id', filter=Q(date__gte=today)),
+        past_events=Count('id', filter=Q(date__lt=today)),
+    )
+    DashboardStats.objects.create(
+        pk=1,
+        as_of=today,
+        total_categories=Category.objects.count(),
+        total_rsvps=Event.participants.through.objects.count(),
+        **counts,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_capacity_waitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_events', models.IntegerField(default=0)),
+                ('upcoming_events', models.IntegerField(default=0)),
+                ('past_events', models.IntegerField(default=0)),
+                ('total_categories', models.IntegerField(default=0)),
+                ('total_rsvps', models.IntegerField(default=0)),
+                ('as_of', models.DateField()),
+            ],
+            options={
+                'verbose_name_plural': 'dashboard stats',
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_starts_at(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    batch = []
+    for event in Event.objects.only('id', 'date', 'time').iterator(chunk_size=2000):
+        event.starts_at = timezone.make_aware(datetime.datetime.combine(event.date, event.time))
+        batch.append(event)
+        if len(batch) == 2000:
+            Event.objects.bulk_update(batch, ['starts_at'])
+            batch = []
+    Event.objects.bulk_update(batch, ['starts_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_dashboardstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Combined, indexed start timestamp
+        migrations.AddField(
+            model_name='event',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_starts_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='event',
+            name='starts_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_start_order_idx',
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['starts_at', 'id'], name='event_starts_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['category', 'starts_at'], name='event_category_start_idx'),
+        ),
+        # Adopt the auto-created participants table as an explicit through
+        # model. The table already exists, so only the state changes.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RSVP',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='events.event')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'events_event_participants',
+                        'unique_together': {('event', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='event',
+                    name='participants',
+                    field=models.ManyToManyField(blank=True, related_name='rsvped_events', through='events.RSVP', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        # The (user, event) index replaces the single-column user index
+        migrations.AddIndex(
+            model_name='rsvp',
+            index=models.Index(fields=['user', 'event'], name='rsvp_user_event_idx'),
+        ),
+        migrations.AlterField(
+            model_name='rsvp',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='asset_derivatives',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
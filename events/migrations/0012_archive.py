@@ -0,0 +1,64 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:40
+
+import django.db.models.deletion
+import events.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_event_geo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEvent',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('location', models.CharField(max_length=255)),
+                ('starts_at', models.DateTimeField()),
+                ('asset', models.ImageField(blank=True, null=True, upload_to='event_asset/')),
+                ('asset_derivatives', models.JSONField(blank=True, null=True)),
+                ('rsvp_count', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_events', to='events.category')),
+            ],
+            bases=(events.models.EventDisplay, models.Model),
+        ),
+        migrations.CreateModel(
+            name='ArchivedRSVP',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='events.archivedevent')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedevent',
+            name='participants',
+            field=models.ManyToManyField(blank=True, related_name='archived_rsvped_events', through='events.ArchivedRSVP', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrsvp',
+            index=models.Index(fields=['user', 'event'], name='archived_rsvp_user_event_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedrsvp',
+            unique_together={('event', 'user')},
+        ),
+        migrations.AddIndex(
+            model_name='archivedevent',
+            index=models.Index(fields=['starts_at', 'id'], name='archived_starts_at_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='reminded_rsvp_id',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
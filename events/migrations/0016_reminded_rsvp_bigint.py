@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0015_archive_bigint_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='reminded_rsvp_id',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_sent_reminders(apps, schema_editor):
+    # Everyone up to an event's old mark has had the reminder for its current start time
+    Event = apps.get_model('events', 'Event')
+    Reminder = apps.get_model('events', 'Reminder')
+    through = Event.participants.through
+    for event_id, starts_at, mark in Event.objects.filter(reminded_rsvp_id__gt=0).values_list(
+        'id', 'starts_at', 'reminded_rsvp_id',
+    ).iterator():
+        user_ids = through.objects.filter(event_id=event_id, id__lte=mark).values_list('user_id', flat=True)
+        Reminder.objects.bulk_create(
+            [Reminder(event_id=event_id, user_id=user_id, starts_at=starts_at) for user_id in user_ids.iterator()],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0016_reminded_rsvp_bigint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField()),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='events.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'user', 'starts_at'), name='unique_reminder')],
+            },
+        ),
+        migrations.RunPython(record_sent_reminders, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='event',
+            name='reminded_rsvp_id',
+        ),
+    ]
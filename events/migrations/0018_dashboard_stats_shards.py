@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0017_reminders_per_rsvp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStatsShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_events', models.IntegerField(default=0)),
+                ('upcoming_events', models.IntegerField(default=0)),
+                ('past_events', models.IntegerField(default=0)),
+                ('total_categories', models.IntegerField(default=0)),
+                ('total_rsvps', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
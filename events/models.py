@@ -1,28 +1,308 @@
+import datetime
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from . import geo
+
+
+def start_of_day(day):
+    """Aware datetime for midnight at the start of ``day`` in the current time zone."""
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
 class Category(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
     
 
-class Event(models.Model):
+class EventDisplay:
+    """What the templates ask of an event, live or archived."""
+    is_archived = False
+
+    @property
+    def is_upcoming(self):
+        return self.starts_at >= start_of_day(timezone.localdate())
+
+    @property
+    def seats_left(self):
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.rsvp_count, 0)
+
+    @property
+    def is_full(self):
+        return self.capacity is not None and self.rsvp_count >= self.capacity
+
+
+class Event(EventDisplay, models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     date = models.DateField()
     time = models.TimeField()
     location = models.CharField(max_length=255)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='events')
-    participants = models.ManyToManyField(User, related_name='rsvped_events', blank=True)
+    # Combined date + time, indexed for range queries; filled in by save()
+    starts_at = models.DateTimeField(editable=False)
+    participants = models.ManyToManyField(User, through='RSVP', related_name='rsvped_events', blank=True)
     asset = models.ImageField(upload_to='event_asset/',blank=True,null=True) 
+    # Resized copies of asset, built off-request by events.images; NULL while pending
+    asset_derivatives = models.JSONField(blank=True, null=True, editable=False)
+    # Denormalized participants count, kept in sync by events.signals
+    rsvp_count = models.PositiveIntegerField(default=0, editable=False)
+    # Maximum number of participants; leave empty for unlimited
+    capacity = models.PositiveIntegerField(blank=True, null=True)
+    # Also touched by the queryset updates that change rsvp_count
+    updated_at = models.DateTimeField(auto_now=True)
+    # Filled in from location by the geocode_events command; empty when the place isn't known
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    # Geohash of (latitude, longitude), see events.geo; filled in by save()
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Backs the (starts_at, id) keyset pagination and date range filters
+            models.Index(fields=['starts_at', 'id'], name='event_starts_at_idx'),
+            # "Upcoming events in category X"
+            models.Index(fields=['category', 'starts_at'], name='event_category_start_idx'),
+            # "Near me, in the next N days": range scans over geohash cells
+            models.Index(fields=['geohash', 'starts_at'], name='event_geohash_start_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
-    @property
-    def is_upcoming(self):
-        return self.date >= timezone.now().date()
+    def compute_starts_at(self):
+        self.starts_at = timezone.make_aware(datetime.datetime.combine(self.date, self.time))
+        return self.starts_at
+
+    def compute_geohash(self):
+        located = self.latitude is not None and self.longitude is not None
+        self.geohash = geo.encode(self.latitude, self.longitude) if located else ''
+        return self.geohash
+
+    def save(self, *args, **kwargs):
+        self.compute_starts_at()
+        self.compute_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            update_fields = {*update_fields, 'updated_at'}
+            if {'date', 'time'} & update_fields:
+                update_fields.add('starts_at')
+            if 'asset' in update_fields:
+                update_fields.add('asset_derivatives')
+            if 'location' in update_fields:
+                update_fields |= {'latitude', 'longitude'}  # see events.signals.remember_event_date
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+    def _participant_rsvps(self, user):
+        # One probe of the (event, user) unique index, instead of loading every participant
+        return RSVP.objects.filter(event_id=self.pk, user_id=user.pk)
+
+    def has_participant(self, user):
+        return user.is_authenticated and self._participant_rsvps(user).exists()
+
+    async def ahas_participant(self, user):
+        return user.is_authenticated and await self._participant_rsvps(user).aexists()
+
+
+class RSVP(models.Model):
+    """Through table of Event.participants (the table Django created for the plain m2m)."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    # Lookups by user are served by rsvp_user_event_idx
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        db_table = 'events_event_participants'
+        unique_together = [('event', 'user')]
+        indexes = [
+            # "My upcoming RSVPs": all events of one user, joined to events by id
+            models.Index(fields=['user', 'event'], name='rsvp_user_event_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} -> {self.event}"
+
+
+class ArchivedEvent(EventDisplay, models.Model):
+    """
+    A past event moved out of events_event by events.archive, with its id
+    kept so links and cursors still work. Read-only from the app's side.
+    """
+    is_archived = True
+
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=200)
+    description = models.TextField()
+    date = models.DateField()
+    time = models.TimeField()
+    location = models.CharField(max_length=255)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='archived_events')
+    starts_at = models.DateTimeField()
+    participants = models.ManyToManyField(User, through='ArchivedRSVP', related_name='archived_rsvped_events', blank=True)
+    asset = models.ImageField(upload_to='event_asset/', blank=True, null=True)
+    asset_derivatives = models.JSONField(blank=True, null=True)
+    rsvp_count = models.PositiveIntegerField(default=0)
+    capacity = models.PositiveIntegerField(blank=True, null=True)
+    updated_at = models.DateTimeField()
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['starts_at', 'id'], name='archived_starts_at_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def _participant_rsvps(self, user):
+        return ArchivedRSVP.objects.filter(event_id=self.pk, user_id=user.pk)
+
+    def has_participant(self, user):
+        return user.is_authenticated and self._participant_rsvps(user).exists()
+
+    async def ahas_participant(self, user):
+        return user.is_authenticated and await self._participant_rsvps(user).aexists()
+
+
+class ArchivedRSVP(models.Model):
+    """An RSVP of an archived event, id kept for the roster order."""
+    id = models.BigIntegerField(primary_key=True)
+    event = models.ForeignKey(ArchivedEvent, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        unique_together = [('event', 'user')]
+        indexes = [
+            models.Index(fields=['user', 'event'], name='archived_rsvp_user_event_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} -> {self.event}"
+
+
+class WaitlistEntry(models.Model):
+    """A user waiting for a seat at a full event, promoted in arrival order."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='waitlist')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlisted_events')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'user'], name='unique_waitlist_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'created_at', 'id'], name='waitlist_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} waiting for {self.event}"
+
+
+class Reminder(models.Model):
+    """
+    A reminder email queued for one participant, see events.reminders.
+    Keyed on the start time it announced, so a moved event is announced
+    again but cancelling and RSVP'ing again is not.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='reminders')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    starts_at = models.DateTimeField()
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'user', 'starts_at'], name='unique_reminder'),
+        ]
+
+    def __str__(self):
+        return f"Reminder for {self.user} of {self.event}"
+
+
+
+class DashboardStats(models.Model):
+    """
+    Single-row table holding the organizer dashboard counters.
+
+    Updated incrementally by events.signals; ``as_of`` is the day the
+    upcoming/past split was computed for and is rolled forward by
+    events.stats.rollover(). Deltas that don't depend on ``as_of`` land in
+    DashboardStatsShard rows first and are folded in later.
+    """
+    total_events = models.IntegerField(default=0)
+    upcoming_events = models.IntegerField(default=0)
+    past_events = models.IntegerField(default=0)
+    total_categories = models.IntegerField(default=0)
+    total_rsvps = models.IntegerField(default=0)
+    as_of = models.DateField()
+
+    class Meta:
+        verbose_name_plural = 'dashboard stats'
+
+    def __str__(self):
+        return f"Dashboard stats as of {self.as_of}"
+
+
+class DashboardStatsShard(models.Model):
+    """
+    Pending deltas for DashboardStats. Each worker thread adds to its own
+    row, so RSVPs don't all queue on one row lock; events.stats.fold()
+    moves the sums into DashboardStats.
+    """
+    total_events = models.IntegerField(default=0)
+    upcoming_events = models.IntegerField(default=0)
+    past_events = models.IntegerField(default=0)
+    total_categories = models.IntegerField(default=0)
+    total_rsvps = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Dashboard stats shard {self.pk}"
+
+
+class OutboundEmail(models.Model):
+    """
+    Transactional outbox for mail. Rows are written in the same transaction
+    as the change that triggers them and delivered later by the
+    send_queued_mail command, so requests never wait on SMTP.
+    """
+    PENDING = 'pending'
+    # Claimed by a worker until next_attempt_at, see events.mail.claim_due
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The worker only ever asks for due pending rows
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient}"
@@ -0,0 +1,151 @@
+import base64
+import json
+from functools import cmp_to_key
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of a keyset paginated queryset plus the cursors around it."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a fixed, unique ordering.
+
+    Instead of OFFSET, every page is fetched with a WHERE clause that starts
+    right after (or before) the boundary row, so page N costs the same as
+    page 1 as long as the ordering columns are indexed.
+    """
+
+    def __init__(self, ordering, per_page=None):
+        # Fields may carry a '-' prefix for descending order, as in order_by()
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+        self.per_page = per_page or getattr(settings, 'EVENTS_PAGE_SIZE', 12)
+
+    # Cursor helpers
+    def encode(self, obj, direction):
+        values = [str(getattr(obj, field)) for field in self.fields]
+        raw = json.dumps([direction] + values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode(self, cursor, model):
+        """Return (direction, values) or None if the cursor is not valid."""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, *raw_values = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in ('n', 'p') or len(raw_values) != len(self.ordering):
+                return None
+            values = [self._to_python(model, field, value) for field, value in zip(self.fields, raw_values)]
+        except (ValueError, TypeError, ValidationError):
+            return None
+        return direction, values
+
+    @staticmethod
+    def _to_python(model, field, value):
+        try:
+            return model._meta.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            # Annotations such as a search rank are numeric
+            return float(value)
+
+    def _boundary(self, values, after):
+        # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        for i, (field, ordered) in enumerate(zip(self.fields, self.ordering)):
+            op = 'gt' if after != ordered.startswith('-') else 'lt'
+            step = Q(**{f'{field}__{op}': values[i]})
+            for prev_field, prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_field: prev_value})
+            condition |= step
+        return condition
+
+    def _reversed(self):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+
+    def _page_queryset(self, queryset, cursor):
+        decoded = self.decode(cursor, queryset.model) if cursor else None
+        forward = decoded is None or decoded[0] == 'n'
+
+        if decoded is None:
+            queryset = queryset.order_by(*self.ordering)
+        elif forward:
+            queryset = queryset.filter(self._boundary(decoded[1], after=True)).order_by(*self.ordering)
+        else:
+            queryset = queryset.filter(self._boundary(decoded[1], after=False)).order_by(*self._reversed())
+
+        # Fetch one extra row to know whether there is another page.
+        return queryset[:self.per_page + 1], decoded is not None, forward
+
+    def _compare(self, a, b):
+        for field, ordered in zip(self.fields, self.ordering):
+            x, y = getattr(a, field), getattr(b, field)
+            if x != y:
+                result = -1 if x < y else 1
+                return -result if ordered.startswith('-') else result
+        return 0
+
+    def _merge(self, rows, forward):
+        # Each queryset gave its own first per_page + 1 rows; the merged first per_page + 1 are among them
+        rows.sort(key=cmp_to_key(self._compare), reverse=not forward)
+        return rows[:self.per_page + 1]
+
+    def _make_page(self, rows, has_cursor, forward):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or not forward:
+                next_cursor = self.encode(rows[-1], 'n')
+            if has_cursor and (forward or has_more):
+                previous_cursor = self.encode(rows[0], 'p')
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def paginate(self, queryset, cursor=None):
+        queryset, has_cursor, forward = self._page_queryset(queryset, cursor)
+        return self._make_page(list(queryset), has_cursor, forward)
+
+    async def apaginate(self, queryset, cursor=None):
+        queryset, has_cursor, forward = self._page_queryset(queryset, cursor)
+        return self._make_page([obj async for obj in queryset], has_cursor, forward)
+
+    def paginate_many(self, querysets, cursor=None):
+        """
+        One page over several querysets with the same ordering fields and no
+        rows in common, such as a table and its archive, as if they were one.
+        """
+        rows = []
+        for queryset in querysets:
+            queryset, has_cursor, forward = self._page_queryset(queryset, cursor)
+            rows += list(queryset)
+        return self._make_page(self._merge(rows, forward), has_cursor, forward)
+
+    async def apaginate_many(self, querysets, cursor=None):
+        rows = []
+        for queryset in querysets:
+            queryset, has_cursor, forward = self._page_queryset(queryset, cursor)
+            rows += [obj async for obj in queryset]
+        return self._make_page(self._merge(rows, forward), has_cursor, forward)
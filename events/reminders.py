@@ -0,0 +1,97 @@
+"""
+Reminder emails a few hours before each event.
+
+``queue_due_reminders`` (run by ``manage.py send_event_reminders``) finds
+the events starting within the lead time with one range query on
+event_starts_at_idx, renders the reminder text once per event, and queues
+a reminder for every participant who hasn't had one, ``batch_size`` per
+transaction. Each queued email is recorded as a Reminder row for (event,
+user, start time) in the same transaction, so
+
+* a rerun, or a run after a crash part way through an event, queues only
+  the missing ones, including RSVPs whose transaction committed late;
+* cancelling and RSVP'ing again doesn't bring a second reminder;
+* moving the event to a new start time announces it again.
+
+Delivery is the outbox's job (events.mail): bounded batches over one
+reused connection, with retries.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import RSVP, Event, OutboundEmail, Reminder
+
+TEMPLATE = 'events/event_reminder.txt'
+
+
+def unreminded(event_id, starts_at):
+    """RSVPs of the event with no reminder queued for ``starts_at`` yet."""
+    queued = Reminder.objects.filter(event_id=OuterRef('event_id'), user_id=OuterRef('user_id'), starts_at=starts_at)
+    return RSVP.objects.filter(~Exists(queued), event_id=event_id)
+
+
+def due_events(now, hours):
+    """Events starting in the next ``hours`` with RSVPs not yet reminded, soonest first."""
+    # starts_at is the event's, two queries out
+    pending = unreminded(OuterRef('pk'), OuterRef(OuterRef('starts_at')))
+    return Event.objects.filter(
+        Exists(pending), starts_at__gt=now, starts_at__lte=now + timedelta(hours=hours),
+    ).order_by('starts_at', 'id').only('id', 'name', 'location', 'date', 'time', 'starts_at')
+
+
+def reminder_text(event):
+    """(subject, body) shared by every participant; the body is completed with their name."""
+    url = settings.FRONTEND_URL.rstrip('/') + reverse('event_detail', args=[event.id])
+    body = render_to_string(TEMPLATE, {'event': event, 'url': url})
+    return f'Reminder: {event.name}', body
+
+
+def queue_event_reminders(event, batch_size=500):
+    """Queue the missing reminders of one event. Returns how many emails were queued."""
+    subject, body = reminder_text(event)
+    queued = last_id = 0
+    while True:
+        with transaction.atomic():
+            # One run per event at a time: a concurrent run waits here, then finds these rows taken.
+            # An event that has moved or gone meanwhile is left to the next run.
+            locked = Event.objects.select_for_update().filter(pk=event.pk, starts_at=event.starts_at)
+            if not list(locked.values_list('pk', flat=True)):
+                return queued
+            rows = list(
+                unreminded(event.pk, event.starts_at).filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'user_id', 'user__email', 'user__first_name', 'user__username')[:batch_size]
+            )
+            Reminder.objects.bulk_create([
+                Reminder(event_id=event.pk, user_id=user_id, starts_at=event.starts_at)
+                for _id, user_id, _email, _first_name, _username in rows
+            ])
+            emails = OutboundEmail.objects.bulk_create([
+                OutboundEmail(
+                    subject=subject,
+                    body=f'Hi {first_name or username},\n\n{body}',
+                    from_email=settings.EMAIL_HOST_USER,
+                    recipient=email,
+                )
+                for _id, _user_id, email, first_name, username in rows if email
+            ])
+        queued += len(emails)
+        if len(rows) < batch_size:
+            return queued
+        # Within a run the scan moves on; an RSVP committed behind it is picked up by the next run
+        last_id = rows[-1][0]
+
+
+def queue_due_reminders(hours=None, batch_size=500, now=None):
+    """Queue reminders for every event starting within ``hours`` (REMINDER_LEAD_HOURS). Returns (events, emails)."""
+    hours = settings.REMINDER_LEAD_HOURS if hours is None else hours
+    events = emails = 0
+    for event in due_events(now or timezone.now(), hours):
+        events += 1
+        emails += queue_event_reminders(event, batch_size)
+    return events, emails
@@ -0,0 +1,137 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+ReplicaRouter sends the reads of the events and users views to a random
+replica from settings.DATABASE_REPLICAS. Everything else goes to the
+primary ("default"): writes, every query of an unsafe request (POST etc.),
+the admin, and code running outside a request, such as management
+commands and workers, which often read back what they just wrote.
+
+Replicas lag behind the primary. Once a request has written anything,
+ReplicaMiddleware sets a short-lived cookie, and the same browser's reads
+stay on the primary for REPLICA_PIN_SECONDS, so a user sees their own RSVP
+or edit straight away.
+
+Whatever is about to be stored in a shared cache is read inside
+``from_primary()``: an entry filled from a lagging replica right after a
+version bump would keep the old data under the new version until the next
+bump, for every visitor.
+"""
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PIN_COOKIE = 'primary_pin'
+# Apps whose views may read from a replica, and whose models are replicated reads
+REPLICA_APPS = ('events', 'users')
+REPLICA_MODELS = ('events', 'auth')
+
+
+class _Routing:
+    __slots__ = ('use_replicas', 'pinned', 'wrote')
+
+    def __init__(self, use_replicas, pinned):
+        self.use_replicas = use_replicas
+        self.pinned = pinned
+        self.wrote = False
+
+
+_routing = contextvars.ContextVar('events_db_routing', default=None)
+
+
+@contextmanager
+def routing(use_replicas=True, pinned=False):
+    """Route this block's reads the way a request to an events or users view is routed."""
+    state = _Routing(use_replicas, pinned)
+    token = _routing.set(state)
+    try:
+        yield state
+    finally:
+        _routing.reset(token)
+
+
+@contextmanager
+def from_primary():
+    """Send this block's reads to the primary, e.g. while building a value to cache."""
+    state = _routing.get()
+    if state is None or state.pinned:
+        yield
+        return
+    state.pinned = True
+    try:
+        yield
+    finally:
+        state.pinned = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        state = _routing.get()
+        if not replicas or state is None or not state.use_replicas or model._meta.app_label not in REPLICA_MODELS:
+            return None
+        if state.pinned or state.wrote:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """Marks which requests may read from replicas, and pins a user to the primary after a write."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing(use_replicas=False, pinned=self._pinned(request)) as state:
+            request._db_routing = state
+            response = self.get_response(request)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        with routing(use_replicas=False, pinned=self._pinned(request)) as state:
+            request._db_routing = state
+            response = await self.get_response(request)
+        return self._finish(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Only now is it known which app the view belongs to
+        if view_func.__module__.split('.')[0] in REPLICA_APPS:
+            request._db_routing.use_replicas = True
+
+    def _pinned(self, request):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return True
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _finish(self, response, state):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,196 @@
+"""
+RSVP bookkeeping: seat allocation for capacity-limited events, the
+waitlist, and bulk ingestion of guest lists.
+
+Seats are claimed with a single conditional UPDATE on the event row
+(``rsvp_count < capacity``). The UPDATE both checks availability and
+locks the row until the transaction ends, so concurrent RSVPs for the same
+event queue up behind each other instead of overselling. The counter
+itself is still bumped by the m2m_changed handler in events.signals.
+
+Adding thousands of users through ``event.participants.add()`` fires
+``m2m_changed`` per call and resolves every user separately. ``bulk_rsvp``
+resolves the whole list in a handful of queries, inserts the through rows
+with one ``bulk_create`` per chunk and queues all confirmations in a single
+batched pass.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from events import cache, ical, stats
+from events.mail import rsvp_confirmation
+from events.models import Event, OutboundEmail, WaitlistEntry
+
+# Keeps IN (...) lists well under SQLite's bound parameter limit
+CHUNK_SIZE = 900
+
+
+RSVP_CONFIRMED = 'confirmed'
+RSVP_WAITLISTED = 'waitlisted'
+RSVP_EXISTS = 'exists'
+
+
+class BulkRSVPResult:
+    def __init__(self):
+        self.added = []
+        self.waitlisted = []
+        self.already_attending = 0
+        self.unknown = []
+
+    def __str__(self):
+        return (
+            f"{len(self.added)} added, {len(self.waitlisted)} waitlisted, "
+            f"{self.already_attending} already attending, {len(self.unknown)} not found"
+        )
+
+
+def _lock_event(event_id, need_seat):
+    """
+    Lock the event row for the rest of the transaction.
+
+    With ``need_seat`` the lock is only taken when a seat is free, and the
+    return value says whether one was. Setting rsvp_count to itself keeps the
+    UPDATE a no-op apart from the lock.
+    """
+    queryset = Event.objects.filter(pk=event_id)
+    if need_seat:
+        queryset = queryset.filter(Q(capacity__isnull=True) | Q(rsvp_count__lt=F('capacity')))
+    return queryset.update(rsvp_count=F('rsvp_count')) == 1
+
+
+def reserve_seat(event, user):
+    """RSVP ``user`` to ``event`` if a seat is free, otherwise put them on the waitlist."""
+    with transaction.atomic():
+        has_seat = _lock_event(event.pk, need_seat=True)
+        if event.has_participant(user):
+            return RSVP_EXISTS
+        if not has_seat:
+            WaitlistEntry.objects.get_or_create(event=event, user=user)
+            return RSVP_WAITLISTED
+        event.participants.add(user)
+        WaitlistEntry.objects.filter(event=event, user=user).delete()
+    return RSVP_CONFIRMED
+
+
+def release_seat(event, user):
+    """Cancel an RSVP (or leave the waitlist) and hand the freed seat to the next in line."""
+    with transaction.atomic():
+        _lock_event(event.pk, need_seat=False)
+        if not event.has_participant(user):
+            return WaitlistEntry.objects.filter(event=event, user=user).delete()[0] > 0
+        event.participants.remove(user)
+        promote_waitlist(event)
+    return True
+
+
+def promote_waitlist(event):
+    """Move waitlisted users into free seats, oldest entry first. Returns the promoted users."""
+    promoted = []
+    with transaction.atomic():
+        _lock_event(event.pk, need_seat=False)
+        event.refresh_from_db(fields=['rsvp_count', 'capacity'])
+        while event.capacity is None or event.rsvp_count < event.capacity:
+            entry = event.waitlist.select_related('user').order_by('created_at', 'id').first()
+            if entry is None:
+                break
+            entry.delete()
+            # m2m_changed bumps event.rsvp_count, in the database and on this instance
+            event.participants.add(entry.user)
+            promoted.append(entry.user)
+    return promoted
+
+
+def parse_identifiers(lines):
+    """Usernames or emails, one per line (extra CSV columns ignored), de-duplicated in order."""
+    seen = {}
+    for line in lines:
+        value = line.split(',')[0].strip()
+        if value and not value.startswith('#'):
+            seen.setdefault(value, None)
+    return list(seen)
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def resolve_users(identifiers):
+    """Map usernames/emails to users, in the order they are first named. Returns (users, unknown identifiers)."""
+    users = {}
+    found = set()
+    for chunk in _chunks(identifiers):
+        matches = User.objects.filter(Q(username__in=chunk) | Q(email__in=chunk))
+        for user in matches.only('id', 'username', 'email', 'first_name'):
+            users[user.id] = user
+            found.update((user.username, user.email))
+    unknown = [value for value in identifiers if value not in found]
+
+    # The database returns them in its own order; seats go by position in the list
+    positions = {}
+    for position, value in enumerate(identifiers):
+        positions.setdefault(value, position)
+    last = len(identifiers)
+    ordered = sorted(
+        users.values(),
+        key=lambda user: min(positions.get(user.username, last), positions.get(user.email, last)),
+    )
+    return ordered, unknown
+
+
+def bulk_rsvp(event, identifiers, notify=True):
+    """
+    RSVP every user named in ``identifiers`` to ``event``.
+
+    Users who are already attending are skipped, and only the newly added
+    ones get a confirmation email. Once a capacity-limited event is full the
+    rest of the list goes to the waitlist, in file order. ``Event.rsvp_count``
+    is recomputed once at the end since bulk_create bypasses the
+    m2m_changed signal.
+    """
+    result = BulkRSVPResult()
+    users, result.unknown = resolve_users(identifiers)
+    through = Event.participants.through
+
+    with transaction.atomic():
+        _lock_event(event.pk, need_seat=False)
+        event.refresh_from_db(fields=['rsvp_count', 'capacity'])
+        seats = None if event.capacity is None else max(event.capacity - event.rsvp_count, 0)
+
+        for chunk in _chunks(users):
+            ids = [user.id for user in chunk]
+            attending = set(
+                through.objects.filter(event_id=event.id, user_id__in=ids).values_list('user_id', flat=True)
+            )
+            new = [user for user in chunk if user.id not in attending]
+            result.already_attending += len(attending)
+            if seats is not None:
+                new, overflow = new[:seats], new[seats:]
+                seats -= len(new)
+                WaitlistEntry.objects.bulk_create(
+                    [WaitlistEntry(event_id=event.id, user_id=user.id) for user in overflow], ignore_conflicts=True
+                )
+                result.waitlisted.extend(overflow)
+            # ignore_conflicts covers a concurrent RSVP landing between the check and the insert
+            through.objects.bulk_create(
+                [through(event_id=event.id, user_id=user.id) for user in new], ignore_conflicts=True
+            )
+            WaitlistEntry.objects.filter(event_id=event.id, user_id__in=[user.id for user in new]).delete()
+            result.added.extend(new)
+
+        actual = through.objects.filter(event_id=OuterRef('pk')).values('event_id').annotate(total=Count('*')).values('total')
+        Event.objects.filter(pk=event.pk).update(
+            rsvp_count=Coalesce(Subquery(actual), 0), updated_at=timezone.now()
+        )
+        stats.bump(total_rsvps=len(result.added))
+        cache.bump(cache.EVENTS, cache.event_version(event.id))
+        ical.invalidate_users([user.id for user in result.added])
+
+        if notify:
+            OutboundEmail.objects.bulk_create(
+                [rsvp_confirmation(user, event) for user in result.added if user.email], batch_size=CHUNK_SIZE
+            )
+    return result
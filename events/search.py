@@ -0,0 +1,153 @@
+"""
+Full-text search over events.
+
+On Postgres the events table carries a generated ``search_vector`` tsvector
+column with a GIN index; on SQLite an FTS5 external-content table shadows the
+name, location and description columns and is kept in sync by triggers. Both
+are maintained by the database itself, so saves, deletes, bulk inserts and
+queryset updates never leave the index stale. Any other backend falls back to
+plain ``icontains`` matching.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'events_event_fts'
+
+# Weights used for ranking: a hit in the name counts more than one in the description
+NAME_WEIGHT, LOCATION_WEIGHT, DESCRIPTION_WEIGHT = 10.0, 5.0, 1.0
+
+POSTGRES_SETUP = [
+    """
+    ALTER TABLE events_event ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(location, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS event_search_vector_idx ON events_event USING GIN (search_vector)",
+]
+
+POSTGRES_TEARDOWN = [
+    "DROP INDEX IF EXISTS event_search_vector_idx",
+    "ALTER TABLE events_event DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_SETUP = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, location, description,
+        content='events_event', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON events_event BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, location, description)
+        VALUES (new.id, new.name, new.location, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON events_event BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, location, description)
+        VALUES ('delete', old.id, old.name, old.location, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, location, description ON events_event BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, location, description)
+        VALUES ('delete', old.id, old.name, old.location, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, location, description)
+        VALUES (new.id, new.name, new.location, new.description);
+    END
+    """,
+]
+
+SQLITE_TEARDOWN = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def install_search_index(connection):
+    """
+    Create the search column/table for this backend if it is missing.
+
+    Safe to call repeatedly. SQLite drops triggers whenever a migration
+    rebuilds the events table, so when any trigger had to be recreated the
+    FTS index is rebuilt from the table contents.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in POSTGRES_SETUP:
+                cursor.execute(statement)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_%'],
+            )
+            intact = cursor.fetchone()[0] == 3
+            for statement in SQLITE_SETUP:
+                cursor.execute(statement)
+            if not intact:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_search_index(connection):
+    statements = {'postgresql': POSTGRES_TEARDOWN, 'sqlite': SQLITE_TEARDOWN}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:16]
+
+
+def search_events(queryset, query):
+    """
+    Filter an Event queryset down to rows matching ``query``.
+
+    Each word is matched as a prefix, so results show up while the user is
+    still typing. The queryset is annotated with ``search_rank`` (higher is
+    more relevant); ordering is left to the caller.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.filter(
+            RawSQL("events_event.search_vector @@ to_tsquery('english', %s)", [tsquery], output_field=BooleanField())
+        ).annotate(
+            # float8 so the rank survives a round trip through a pagination cursor unchanged
+            search_rank=RawSQL(
+                "ts_rank(events_event.search_vector, to_tsquery('english', %s))::float8", [tsquery],
+                output_field=FloatField(),
+            ),
+        )
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # The IN subquery hits the FTS index once; bm25 is then only computed for matching rows.
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}, %s, %s, %s) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = events_event.id",
+                [NAME_WEIGHT, LOCATION_WEIGHT, DESCRIPTION_WEIGHT, match],
+                output_field=FloatField(),
+            ),
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(location__icontains=term) | Q(description__icontains=term)
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
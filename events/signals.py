@@ -1,26 +1,238 @@
-from django.db.models.signals import m2m_changed
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Event
+from . import cache, ical, images, stats
+from .models import RSVP, ArchivedEvent, Category, Event, OutboundEmail
+from .mail import rsvp_confirmation
+from .search import FTS_TABLE, install_search_index
 
 @receiver(m2m_changed, sender=Event.participants.through)
-def send_rsvp_confirmation_email(sender, instance, action, pk_set, **kwargs):
+def send_rsvp_confirmation_email(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Queues a confirmation email for each new RSVP.
+    Triggered when Users are added to Event.participants (or Events to user.rsvped_events).
+    """
+    if action != 'post_add' or not pk_set:
+        return
+
+    if reverse:
+        pairs = [(instance, event) for event in Event.objects.filter(pk__in=pk_set).only('name')]
+    else:
+        pairs = [(user, instance) for user in User.objects.filter(pk__in=pk_set).only('username', 'first_name', 'email')]
+
+    OutboundEmail.objects.bulk_create([rsvp_confirmation(user, event) for user, event in pairs if user.email])
+
+
+@receiver(m2m_changed, sender=Event.participants.through)
+def update_rsvp_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeps Event.rsvp_count in step with the participants table.
+
+    Forward changes (event.participants.add/remove/clear) touch one event;
+    reverse changes (user.rsvped_events.add/remove/clear) touch every event in
+    pk_set. Django already drops existing rows from pk_set on post_add, but
+    passes remove() ids through unfiltered, so pre_remove narrows them down to
+    the rows that really exist.
+    """
+    if action == 'pre_clear':
+        # The rows are gone by post_clear, so remember which ones are about to go.
+        if reverse:
+            instance._rsvp_cleared = list(instance.rsvped_events.values_list('id', flat=True))
+        else:
+            instance._rsvp_cleared = sender.objects.filter(event_id=instance.pk).count()
+        return
+
+    if action == 'pre_remove':
+        if reverse:
+            existing = sender.objects.filter(user_id=instance.pk, event_id__in=pk_set)
+            instance._rsvp_removed = set(existing.values_list('event_id', flat=True))
+        else:
+            existing = sender.objects.filter(event_id=instance.pk, user_id__in=pk_set)
+            instance._rsvp_removed = set(existing.values_list('user_id', flat=True))
+        return
+
+    if action == 'post_remove':
+        pk_set = getattr(instance, '_rsvp_removed', pk_set)
+
+    if action == 'post_clear':
+        if reverse:
+            cleared = getattr(instance, '_rsvp_cleared', [])
+            Event.objects.filter(pk__in=cleared).update(rsvp_count=F('rsvp_count') - 1, updated_at=timezone.now())
+            stats.bump(total_rsvps=-len(cleared))
+        else:
+            Event.objects.filter(pk=instance.pk).update(rsvp_count=0, updated_at=timezone.now())
+            instance.rsvp_count = 0
+            stats.bump(total_rsvps=-getattr(instance, '_rsvp_cleared', 0))
+        return
+
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    if reverse:
+        delta = 1 if action == 'post_add' else -1
+        Event.objects.filter(pk__in=pk_set).update(rsvp_count=F('rsvp_count') + delta, updated_at=timezone.now())
+    else:
+        delta = len(pk_set) if action == 'post_add' else -len(pk_set)
+        Event.objects.filter(pk=instance.pk).update(rsvp_count=F('rsvp_count') + delta, updated_at=timezone.now())
+        instance.rsvp_count = max(instance.rsvp_count + delta, 0)
+    stats.bump(total_rsvps=len(pk_set) if action == 'post_add' else -len(pk_set))
+
+
+@receiver(pre_delete, sender=User)
+def release_rsvps_of_deleted_user(sender, instance, **kwargs):
+    """Deleting a user cascades over the participants table without firing m2m_changed."""
+    event_ids = list(Event.objects.filter(participants=instance).values_list('id', flat=True))
+    Event.objects.filter(pk__in=event_ids).update(rsvp_count=F('rsvp_count') - 1, updated_at=timezone.now())
+    archived_ids = list(ArchivedEvent.objects.filter(participants=instance).values_list('id', flat=True))
+    ArchivedEvent.objects.filter(pk__in=archived_ids).update(rsvp_count=F('rsvp_count') - 1)
+    stats.bump(total_rsvps=-len(event_ids) - len(archived_ids))
+    cache.bump(cache.EVENTS, *map(cache.event_version, event_ids + archived_ids))
+
+
+@receiver(pre_save, sender=Event)
+def remember_event_date(sender, instance, **kwargs):
     """
-    Sends a confirmation email to each user who RSVP'd to an event.
-    Triggered when a User is added to Event.participants (RSVP).
+    Keep the stored date around so post_save can tell if the event moved
+    between upcoming and past, reset the image derivatives when the asset
+    changes, and the coordinates when the location does.
     """
-    if action == 'post_add':
-        for user_id in pk_set:
-            try:
-                user = User.objects.get(pk=user_id)
-                send_mail(
-                    subject='RSVP Confirmation',
-                    message=f'Thank you {user.first_name or user.username} for RSVPing to "{instance.name}"!',
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=[user.email],
-                    fail_silently=True,
-                )
-            except User.DoesNotExist:
-                pass
+    if kwargs.get('raw'):
+        return
+    old = None
+    if instance.pk:
+        old = Event.objects.filter(pk=instance.pk).values(
+            'date', 'category_id', 'asset', 'asset_derivatives', 'location', 'latitude', 'longitude',
+        ).first()
+        instance._stats_old_date = old and old['date']
+        instance._ical_old_category = old and old['category_id']
+
+    # A new place, unless it came with its own coordinates: geocode_events looks it up again
+    if old and old['location'] != instance.location and (
+        (old['latitude'], old['longitude']) == (instance.latitude, instance.longitude)
+    ):
+        instance.latitude = instance.longitude = None
+        instance.compute_geohash()
+
+    # A new upload queues the image derivative worker; the old copies go once this commits
+    if (old and old['asset']) != (instance.asset.name or None):
+        instance.asset_derivatives = None
+        if old and old['asset_derivatives']:
+            transaction.on_commit(partial(images.delete_derivatives, old['asset_derivatives']))
+    elif old:
+        # Don't let a stale instance overwrite what the worker has built since it was loaded
+        instance.asset_derivatives = old['asset_derivatives']
+
+
+@receiver(post_save, sender=Event)
+def count_saved_event(sender, instance, created, **kwargs):
+    old_date = getattr(instance, '_stats_old_date', None)
+    if created:
+        stats.bump_event(instance.date, 1)
+    elif old_date is not None and old_date != instance.date:
+        stats.bump_event(old_date, -1)
+        stats.bump_event(instance.date, 1)
+    instance._stats_old_date = instance.date
+
+
+@receiver(post_delete, sender=Event)
+def count_deleted_event(sender, instance, **kwargs):
+    # The event's RSVPs were cascaded away along with it
+    stats.bump_event(instance.date, -1)
+    stats.bump(total_rsvps=-instance.rsvp_count)
+
+
+@receiver(post_delete, sender=ArchivedEvent)
+def count_deleted_archived_event(sender, instance, **kwargs):
+    # Only reached by deleting its category; archiving itself skips the Event signals
+    stats.bump_event(instance.date, -1)
+    stats.bump(total_rsvps=-instance.rsvp_count)
+
+
+@receiver(post_save, sender=Category)
+def count_saved_category(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(total_categories=1)
+
+
+@receiver(post_delete, sender=Category)
+def count_deleted_category(sender, instance, **kwargs):
+    stats.bump(total_categories=-1)
+
+
+# Cache invalidation for the public pages, see events.cache
+
+@receiver([post_save, post_delete], sender=Event)
+def invalidate_event_pages(sender, instance, **kwargs):
+    # Category pages count events, so they go stale too
+    cache.bump(cache.EVENTS, cache.CATEGORIES, cache.event_version(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    # Event cards show the category name
+    cache.bump(cache.CATEGORIES, cache.EVENTS)
+
+
+@receiver(m2m_changed, sender=Event.participants.through)
+def invalidate_rsvp_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        event_ids = [instance.pk]
+    elif action == 'post_clear':
+        event_ids = getattr(instance, '_rsvp_cleared', [])
+    else:
+        event_ids = pk_set or []
+    cache.bump(cache.EVENTS, *map(cache.event_version, event_ids))
+
+
+# Calendar feeds, see events.ical
+
+@receiver(pre_delete, sender=Event)
+def remember_event_attendees(sender, instance, **kwargs):
+    # The RSVPs are cascaded away before post_delete
+    instance._ical_users = list(RSVP.objects.filter(event_id=instance.pk).values_list('user_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Event)
+def invalidate_event_feeds(sender, instance, created=False, **kwargs):
+    if kwargs.get('raw'):
+        return
+    user_ids = getattr(instance, '_ical_users', None)
+    if user_ids is None:
+        user_ids = [] if created else RSVP.objects.filter(event_id=instance.pk).values_list('user_id', flat=True)
+    ical.invalidate_event(instance, user_ids, getattr(instance, '_ical_old_category', None))
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_feed(sender, instance, **kwargs):
+    # The calendar is named after the category
+    cache.bump(ical.category_feed(instance.pk))
+
+
+@receiver(m2m_changed, sender=Event.participants.through)
+def invalidate_rsvp_feeds(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            ical.invalidate_users([instance.pk])
+    elif action == 'pre_clear':
+        instance._ical_cleared = list(sender.objects.filter(event_id=instance.pk).values_list('user_id', flat=True))
+    elif action == 'post_clear':
+        ical.invalidate_users(getattr(instance, '_ical_cleared', []))
+    elif action in ('post_add', 'post_remove'):
+        ical.invalidate_users(pk_set)
+
+
+@receiver(post_migrate)
+def ensure_search_index(sender, using, **kwargs):
+    """SQLite drops the FTS triggers when a migration rebuilds events_event; put them back."""
+    if sender.name != 'events':
+        return
+    connection = connections[using]
+    if FTS_TABLE in connection.introspection.table_names():
+        install_search_index(connection)
@@ -0,0 +1,171 @@
+"""
+Incrementally maintained dashboard counters.
+
+The organizer dashboard header used to run several aggregates over the
+events, categories and participants tables on every hit. Instead one
+DashboardStats row is kept up to date by the signal handlers in
+events.signals and read back with the pending deltas. Counters are moved
+with F() expressions so concurrent writers never lose updates.
+
+Every RSVP moves total_rsvps inside its own transaction, so if they all
+updated the one stats row they would queue on its lock until commit.
+bump() writes to one of STATS_SHARDS DashboardStatsShard rows instead,
+picked once per thread so a transaction only ever locks one of them.
+get_stats() adds the shard sums to the stats row, and fold() moves them
+into it with the daily rollover. Event saves and deletes still update the
+stats row through bump_event(), which needs its as_of date.
+"""
+import random
+import threading
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from events.models import (
+    ArchivedEvent, ArchivedRSVP, Category, DashboardStats, DashboardStatsShard, Event, start_of_day,
+)
+
+STATS_PK = 1
+STATS_SHARDS = 16
+COUNTERS = ('total_events', 'upcoming_events', 'past_events', 'total_categories', 'total_rsvps')
+
+_local = threading.local()
+
+
+def _shard():
+    if not hasattr(_local, 'shard'):
+        _local.shard = random.randint(1, STATS_SHARDS)
+    return _local.shard
+
+
+def bump(**deltas):
+    """Add the given deltas to this thread's shard row, e.g. bump(total_rsvps=3)."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = DashboardStatsShard.objects.filter(pk=_shard())
+    updates = {name: F(name) + delta for name, delta in deltas.items()}
+    if not rows.update(**updates):
+        DashboardStatsShard.objects.bulk_create([DashboardStatsShard(pk=_shard())], ignore_conflicts=True)
+        rows.update(**updates)
+
+
+def _take_shards():
+    """Lock the shard rows, zero them and return their sums. The stats row must be locked first."""
+    shards = list(DashboardStatsShard.objects.select_for_update().order_by('pk'))
+    # A shard created since is left alone; its writer hasn't committed yet
+    DashboardStatsShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(**{name: 0 for name in COUNTERS})
+    return {name: sum(getattr(shard, name) for shard in shards) for name in COUNTERS}
+
+
+def fold():
+    """Move the shard sums into the stats row."""
+    with transaction.atomic():
+        # The stats row before the shards, the order event deletes take them in
+        if DashboardStats.objects.select_for_update().filter(pk=STATS_PK).first() is None:
+            return  # get_stats() builds the row from scratch
+        pending = _take_shards()
+        DashboardStats.objects.filter(pk=STATS_PK).update(**{name: F(name) + delta for name, delta in pending.items()})
+
+
+def bump_event(date, sign):
+    """Count an event in (sign=1) or out of (sign=-1) the totals, on the right side of as_of."""
+    upcoming = When(as_of__lte=date, then=Value(sign))
+    past = When(as_of__gt=date, then=Value(sign))
+    DashboardStats.objects.filter(pk=STATS_PK).update(
+        total_events=F('total_events') + sign,
+        upcoming_events=F('upcoming_events') + Case(upcoming, default=Value(0), output_field=IntegerField()),
+        past_events=F('past_events') + Case(past, default=Value(0), output_field=IntegerField()),
+    )
+
+
+def bump_events(dates):
+    """bump_event() for many new events at once, e.g. after a bulk import."""
+    if not dates:
+        return
+    with transaction.atomic():
+        as_of = DashboardStats.objects.select_for_update().filter(pk=STATS_PK).values_list('as_of', flat=True).first()
+        if as_of is None:
+            return  # get_stats() builds the row from scratch
+        upcoming = sum(1 for date in dates if date >= as_of)
+        DashboardStats.objects.filter(pk=STATS_PK).update(
+            total_events=F('total_events') + len(dates),
+            upcoming_events=F('upcoming_events') + upcoming,
+            past_events=F('past_events') + len(dates) - upcoming,
+        )
+
+
+def live_counts(today):
+    """The counters computed from scratch, as the dashboard used to."""
+    events = Event.objects.aggregate(
+        total_events=Count('id'),
+        upcoming_events=Count('id', filter=Q(starts_at__gte=start_of_day(today))),
+        past_events=Count('id', filter=Q(starts_at__lt=start_of_day(today))),
+    )
+    # Archived events all started before the archive horizon, long past
+    archived = ArchivedEvent.objects.count()
+    return {
+        'total_events': events['total_events'] + archived,
+        'upcoming_events': events['upcoming_events'],
+        'past_events': events['past_events'] + archived,
+        'total_categories': Category.objects.count(),
+        'total_rsvps': Event.participants.through.objects.count() + ArchivedRSVP.objects.count(),
+    }
+
+
+def rebuild(today=None):
+    """Recompute the stats row from the live tables. Returns (stats, drift) where drift maps counter -> (stored, actual)."""
+    today = today or timezone.now().date()
+    with transaction.atomic():
+        stats = DashboardStats.objects.select_for_update().filter(pk=STATS_PK).first()
+        pending = _take_shards()
+        actual = live_counts(today)
+        drift = {}
+        if stats is not None and stats.as_of == today:
+            drift = {
+                name: (getattr(stats, name) + pending[name], value)
+                for name, value in actual.items()
+                if getattr(stats, name) + pending[name] != value
+            }
+        stats, _ = DashboardStats.objects.update_or_create(pk=STATS_PK, defaults={**actual, 'as_of': today})
+    return stats, drift
+
+
+def rollover(today=None):
+    """
+    Move events whose day has passed from upcoming to past.
+
+    Only the events starting in [as_of, today) are counted, which is an
+    index range scan over a day's worth of rows.
+    """
+    today = today or timezone.now().date()
+    with transaction.atomic():
+        stats = DashboardStats.objects.select_for_update().filter(pk=STATS_PK).first()
+        if stats is None:
+            return rebuild(today)[0]
+        if stats.as_of >= today:
+            return stats
+        moved = Event.objects.filter(starts_at__gte=start_of_day(stats.as_of), starts_at__lt=start_of_day(today)).count()
+        DashboardStats.objects.filter(pk=STATS_PK).update(
+            upcoming_events=F('upcoming_events') - moved,
+            past_events=F('past_events') + moved,
+            as_of=today,
+        )
+        stats.refresh_from_db()
+    return stats
+
+
+def get_stats():
+    """
+    The current stats row with the shard deltas added (not saved), rolled
+    over to today if the daily job has not run yet.
+    """
+    today = timezone.now().date()
+    stats = DashboardStats.objects.filter(pk=STATS_PK).first()
+    if stats is None or stats.as_of < today:
+        stats = rollover(today)
+    pending = DashboardStatsShard.objects.aggregate(**{name: Sum(name) for name in COUNTERS})
+    for name, delta in pending.items():
+        setattr(stats, name, getattr(stats, name) + (delta or 0))
+    return stats
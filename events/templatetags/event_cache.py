@@ -0,0 +1,21 @@
+from django import template
+from django.db import DEFAULT_DB_ALIAS
+from django.template.loader import render_to_string
+
+from events.cache import CATEGORIES, cached_fragment, event_version
+
+register = template.Library()
+
+
+@register.simple_tag
+def event_card(event):
+    """Render one event card, cached until the event or any category changes."""
+    def render():
+        card = event
+        if card._state.db != DEFAULT_DB_ALIAS:
+            # Read from a replica, which may not have the change behind the new version yet
+            fresh = type(event)._default_manager.using(DEFAULT_DB_ALIAS).select_related('category')
+            card = fresh.filter(pk=event.pk).first() or event
+        return render_to_string('events/event_card.html', {'event': card})
+
+    return cached_fragment(f'event_card:{event.id}', [event_version(event.id), CATEGORIES], render)
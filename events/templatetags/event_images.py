@@ -0,0 +1,33 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from events.images import srcset
+
+register = template.Library()
+
+
+@register.inclusion_tag('events/event_picture.html')
+def event_picture(event, size='hero', sizes='100vw', css_class='', lazy=True):
+    """
+    A <picture> for the event's asset: WebP with a JPEG fallback, both as
+    srcset so the browser picks the width it needs. Falls back to the
+    original upload until the derivatives have been built.
+    """
+    src = event.asset.url if event.asset else ''
+    webp, jpeg = srcset(event, 'webp'), srcset(event, 'jpeg')
+    width = height = None
+    if jpeg:
+        entries = event.asset_derivatives['sizes']
+        entry = next((entry for entry in entries if entry['name'] == size), entries[-1])
+        src, width, height = default_storage.url(entry['jpeg']), entry['width'], entry['height']
+    return {
+        'event': event,
+        'src': src,
+        'webp_srcset': webp,
+        'jpeg_srcset': jpeg,
+        'sizes': sizes,
+        'width': width,
+        'height': height,
+        'css_class': css_class,
+        'lazy': lazy,
+    }
@@ -1,3 +1,1203 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, Permission, User
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from django.core.signals import request_started
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import Count
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from event_management_system.asgi import application
+from events import cache, export, geo, ical, images, metrics, stats
+from events.assets import ASGIAssets, WSGIAssets
+from events.cache import EVENTS, cache_stats, cached_public_page, cached_value
+from events.images import render_derivatives
+from events.importer import import_file
+from events.mail import SEND_LEASE_SECONDS, claim_due, deliver_pending, queue_mail
+from events.models import (
+    RSVP, ArchivedRSVP, Category, DashboardStats, DashboardStatsShard, Event, OutboundEmail, WaitlistEntry, start_of_day,
+)
+from events.pagination import KeysetPaginator
+from events.reminders import queue_due_reminders
+from events.routers import PIN_COOKIE, ReplicaMiddleware, ReplicaRouter, from_primary, routing
+from events.rsvp import RSVP_CONFIRMED, RSVP_WAITLISTED, bulk_rsvp, parse_identifiers, release_seat, reserve_seat
+from events.search import search_events
+from events.views import EVENT_ORDERING
+
+
+def make_event(**kwargs):
+    category = Category.objects.create(name='Tech', description='Tech talks')
+    defaults = {
+        'name': 'Meetup',
+        'description': 'Monthly meetup',
+        'date': datetime.date.today() + datetime.timedelta(days=7),
+        'time': datetime.time(18, 0),
+        'location': 'Dhaka',
+        'category': category,
+    }
+    defaults.update(kwargs)
+    return Event.objects.create(**defaults)
+
+
+def make_users(count, prefix='user'):
+    return [User.objects.create_user(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com') for i in range(count)]
+
+
+class CapacityTests(TestCase):
+    def test_overflow_goes_to_waitlist_and_is_promoted_in_order(self):
+        event = make_event(capacity=2)
+        first, second, third, fourth = make_users(4)
+
+        self.assertEqual(reserve_seat(event, first), RSVP_CONFIRMED)
+        self.assertEqual(reserve_seat(event, second), RSVP_CONFIRMED)
+        self.assertEqual(reserve_seat(event, third), RSVP_WAITLISTED)
+        self.assertEqual(reserve_seat(event, fourth), RSVP_WAITLISTED)
+
+        release_seat(event, first)
+
+        event.refresh_from_db()
+        self.assertEqual(event.rsvp_count, 2)
+        self.assertEqual(set(event.participants.all()), {second, third})
+        self.assertEqual(list(WaitlistEntry.objects.values_list('user', flat=True)), [fourth.pk])
+
+
+class ConcurrentRSVPTests(TransactionTestCase):
+    """Hammers one event from many threads, each with its own database connection."""
+
+    def test_no_overselling_under_concurrent_rsvps(self):
+        capacity, buyers = 5, 25
+        event = make_event(capacity=capacity)
+        users = make_users(buyers, prefix='buyer')
+
+        start = threading.Barrier(buyers)
+        results, errors = [], []
+
+        def buy(user):
+            try:
+                start.wait()
+                # sqlite reports "database is locked" instead of waiting on a row lock; clients retry
+                for _ in range(200):
+                    try:
+                        results.append(reserve_seat(Event.objects.get(pk=event.pk), user))
+                        break
+                    except OperationalError:
+                        continue
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), buyers)
+        event.refresh_from_db()
+        self.assertEqual(results.count(RSVP_CONFIRMED), capacity)
+        self.assertEqual(results.count(RSVP_WAITLISTED), buyers - capacity)
+        self.assertEqual(event.participants.count(), capacity)
+        self.assertEqual(event.rsvp_count, capacity)
+        self.assertEqual(WaitlistEntry.objects.filter(event=event).count(), buyers - capacity)
+
+
+class QueryPlanTests(TestCase):
+    """The hot date-range queries must be answered from the composite indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = make_event()
+        cls.user = make_users(1)[0]
+        cls.event.participants.add(cls.user)
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be read sequentially
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"{index_name} not used:\n{plan}")
+
+    def test_upcoming_events_in_category(self):
+        queryset = Event.objects.filter(
+            category=self.event.category, starts_at__gte=timezone.now()
+        ).order_by('starts_at')
+        self.assertUsesIndex(queryset, 'event_category_start_idx')
+
+    def test_my_upcoming_rsvps(self):
+        queryset = self.user.rsvped_events.filter(starts_at__gte=timezone.now())
+        self.assertUsesIndex(queryset, 'rsvp_user_event_idx')
+
+    def test_date_range_filter(self):
+        today = timezone.localdate()
+        queryset = Event.objects.filter(
+            starts_at__gte=start_of_day(today),
+            starts_at__lt=start_of_day(today + datetime.timedelta(days=30)),
+        ).order_by('starts_at', 'id')
+        self.assertUsesIndex(queryset, 'event_starts_at_idx')
+
+    def test_near_me_candidates(self):
+        cells = geo.cells_for_box(*geo.box_around(23.81, 90.41, 10))
+        queryset = Event.objects.filter(geo.cells_filter(cells), starts_at__gte=timezone.now())
+        self.assertUsesIndex(queryset, 'event_geohash_start_idx')
+
+    def test_starts_at_follows_date_and_time(self):
+        self.event.date = datetime.date(2031, 5, 4)
+        self.event.time = datetime.time(9, 15)
+        self.event.save(update_fields=['date', 'time'])
+        self.event.refresh_from_db()
+        self.assertEqual(timezone.localtime(self.event.starts_at).date(), datetime.date(2031, 5, 4))
+        self.assertEqual(timezone.localtime(self.event.starts_at).time(), datetime.time(9, 15))
+
+
+class SeedDataTests(TestCase):
+    def test_seeded_counters_match_the_tables(self):
+        call_command('seed_data', users=30, categories=3, events=40, rsvps=300, batch_size=7, stdout=io.StringIO())
+
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Event.objects.count(), 40)
+        # Duplicate picks are dropped, so the total can fall slightly short
+        self.assertTrue(250 <= RSVP.objects.count() <= 300)
+        self.assertFalse(Event.objects.filter(starts_at__isnull=True).exists())
+        for event in Event.objects.annotate(actual=Count('participants')):
+            self.assertEqual(event.rsvp_count, event.actual)
+        header = stats.get_stats()
+        for name, value in stats.live_counts(timezone.now().date()).items():
+            self.assertEqual(getattr(header, name), value, name)
+
+
+class ArchiveTests(TestCase):
+    def test_old_events_move_to_the_archive_and_stay_readable(self):
+        old = make_event(name='Old meetup', date=datetime.date.today() - datetime.timedelta(days=400))
+        older = make_event(name='Older meetup', date=old.date - datetime.timedelta(days=1), category=old.category)
+        live = make_event(name='Next meetup', category=old.category)
+        users = make_users(3)
+        old.participants.add(*users)
+        live.participants.add(users[0])
+        counters = {name: getattr(stats.get_stats(), name) for name in stats.COUNTERS}
+
+        out = io.StringIO()
+        call_command('archive_events', batch_size=1, stdout=out)
+        self.assertIn('Archived 2 event(s)', out.getvalue())
+        self.assertIn('and 3 RSVP(s)', out.getvalue())
+        self.assertEqual(list(Event.objects.values_list('name', flat=True)), ['Next meetup'])
+        self.assertEqual(RSVP.objects.count(), 1)
+        self.assertEqual(ArchivedRSVP.objects.filter(event_id=old.pk).count(), 3)
+        # The move itself changes none of the dashboard counters, and they still match the tables
+        header = stats.get_stats()
+        self.assertEqual({name: getattr(header, name) for name in stats.COUNTERS}, counters)
+        for name, value in stats.live_counts(timezone.now().date()).items():
+            self.assertEqual(getattr(header, name), value, name)
+
+        self.client.force_login(users[1])
+        response = self.client.get(f'/events/events/{old.pk}/')
+        self.assertContains(response, 'Old meetup')
+        self.assertContains(response, 'user2')
+        self.assertContains(response, 'This event is over.')
+        self.assertTrue(response.context['is_participant'])
+        self.assertContains(self.client.get('/events/my-events/'), 'Old meetup')
+
+        admin = User.objects.create_superuser('admin', password='x')
+        self.client.force_login(admin)
+        past = self.client.get('/events/dashboard/', {'type': 'past'})
+        self.assertEqual([event.name for event in past.context['data']], ['Older meetup', 'Old meetup'])
+        everything = self.client.get('/events/dashboard/')
+        self.assertEqual(
+            [event.name for event in everything.context['data']], ['Older meetup', 'Old meetup', 'Next meetup'],
+        )
+
+    def test_feeds_window_stays_hot(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_events', days=5, stdout=io.StringIO())
+
+
+class ReminderTests(TestCase):
+    def test_reminders_are_queued_once_per_rsvp(self):
+        soon = timezone.localtime() + datetime.timedelta(hours=3)
+        event = make_event(name='Soon', date=soon.date(), time=soon.time().replace(microsecond=0))
+        later = make_event(name='Later', category=event.category)
+        users = make_users(5)
+        event.participants.add(*users)
+        later.participants.add(*users)
+        OutboundEmail.objects.all().delete()  # the RSVP confirmations
+
+        with self.assertNumQueries(1):
+            self.assertEqual(queue_due_reminders(hours=0), (0, 0))
+        self.assertEqual(queue_due_reminders(hours=24, batch_size=2), (1, 5))
+        reminders = OutboundEmail.objects.order_by('id')
+        self.assertEqual(sorted(reminders.values_list('recipient', flat=True)), [user.email for user in users])
+        self.assertTrue(reminders[0].body.startswith('Hi user0,'))
+        self.assertIn('"Soon" is coming up', reminders[0].body)
+
+        # A rerun only picks up who RSVP'd since
+        with self.assertNumQueries(1):
+            self.assertEqual(queue_due_reminders(hours=24), (0, 0))
+        event.participants.add(User.objects.create_user('late', email='late@example.com'))
+        self.assertEqual(queue_due_reminders(hours=24), (1, 1))
+
+        # Moving the event announces it again
+        event = Event.objects.get(pk=event.pk)
+        moved = soon + datetime.timedelta(hours=1)
+        event.date, event.time = moved.date(), moved.time().replace(microsecond=0)
+        event.save(update_fields=['date', 'time'])
+        self.assertEqual(queue_due_reminders(hours=24), (1, 6))
+
+    def test_late_commits_and_re_rsvps(self):
+        soon = timezone.localtime() + datetime.timedelta(hours=3)
+        event = make_event(date=soon.date(), time=soon.time().replace(microsecond=0))
+        first, second, late = make_users(3)
+        RSVP.objects.bulk_create([RSVP(id=1000, event=event, user=first), RSVP(id=1001, event=event, user=second)])
+        self.assertEqual(queue_due_reminders(hours=24), (1, 2))
+
+        # An RSVP with a lower id whose transaction committed after the run
+        RSVP.objects.create(id=10, event=event, user=late)
+        self.assertEqual(queue_due_reminders(hours=24), (1, 1))
+
+        # Cancelling and RSVP'ing again gives a new RSVP id, but not a second reminder
+        call_command('reconcile_rsvp_counts', stdout=io.StringIO())  # the RSVPs above skipped the counter
+        event.participants.remove(first)
+        event.participants.add(first)
+        self.assertEqual(queue_due_reminders(hours=24), (0, 0))
+        self.assertEqual(
+            sorted(OutboundEmail.objects.filter(subject__startswith='Reminder').values_list('recipient', flat=True)),
+            [first.email, second.email, late.email],
+        )
+
+
+class ImportTests(TestCase):
+    def ndjson(self, *lines):
+        return io.StringIO(''.join(line + '\n' for line in lines))
+
+    def row(self, name, category='Tech'):
+        return json.dumps({
+            'name': name, 'description': 'Imported', 'date': '2031-05-04', 'time': '18:00',
+            'location': 'Dhaka', 'category': category,
+        })
+
+    def test_good_file(self):
+        result = import_file(self.ndjson(self.row('A'), self.row('B', category='Music')), 'ndjson')
+        self.assertEqual((result.created, result.errors, result.new_categories), (2, [], ['Tech', 'Music']))
+        event = Event.objects.get(name='B')
+        self.assertEqual(event.category.name, 'Music')
+        self.assertEqual(timezone.localtime(event.starts_at).date(), datetime.date(2031, 5, 4))
+        self.assertEqual(stats.get_stats().total_events, 2)
+
+    def test_bad_line_is_reported_and_the_rest_imported(self):
+        result = import_file(self.ndjson(self.row('A'), '{"name": "broken', self.row('C')), 'ndjson', batch_size=1)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([number for number, _message in result.errors], [2])
+        self.assertIn('invalid JSON', result.errors[0][1])
+        self.assertEqual(sorted(Event.objects.values_list('name', flat=True)), ['A', 'C'])
+
+    def test_dry_run_writes_nothing(self):
+        result = import_file(self.ndjson(self.row('A'), json.dumps({'name': 'No date'})), 'ndjson', dry_run=True)
+        self.assertEqual((result.created, result.valid, result.new_categories), (0, 1, ['Tech']))
+        self.assertEqual(len(result.errors), 1)
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def upload(self, name='photo.png'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 400), (200, 30, 30)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_pending_events_get_their_derivatives_without_holding_locks(self):
+        event = make_event(asset=self.upload())
+        self.assertIsNone(event.asset_derivatives)
+
+        outer_blocks = len(connection.atomic_blocks)  # the test case's own transactions
+
+        def render(asset):
+            # The claim has committed; no transaction (and so no row lock) is open while Pillow runs
+            self.assertEqual(len(connection.atomic_blocks), outer_blocks)
+            return render_derivatives(asset)
+
+        with mock.patch('events.images.render_derivatives', side_effect=render):
+            self.assertEqual(images.build_pending(), (1, 0))
+        event.refresh_from_db()
+        self.assertEqual(event.asset_derivatives['source'], event.asset.name)
+        self.assertEqual([entry['width'] for entry in event.asset_derivatives['sizes']], [320, 640, 800])
+        self.assertEqual(images.build_pending(), (0, 0))
+
+    def test_result_is_dropped_when_the_asset_changes_during_the_render(self):
+        event = make_event(asset=self.upload())
+
+        def render(asset):
+            replaced = Event.objects.get(pk=event.pk)
+            replaced.asset = self.upload('other.png')
+            replaced.save()
+            return render_derivatives(asset)
+
+        with mock.patch('events.images.render_derivatives', side_effect=render):
+            self.assertEqual(images.build_pending(), (0, 0))
+        event.refresh_from_db()
+        self.assertTrue(event.asset.name.startswith('event_asset/other'))
+        self.assertIsNone(event.asset_derivatives)  # pending again, for the new upload
+        self.assertEqual(images.build_pending(), (1, 0))
+
+    def test_expired_claims_are_picked_up_again(self):
+        event = make_event(asset=self.upload())
+        batch, _token = images.claim_pending()
+        self.assertEqual([claimed.pk for claimed in batch], [event.pk])
+        self.assertEqual(images.claim_pending()[0], [])
+        with mock.patch('events.images.time.time', return_value=time.time() + images.LEASE_SECONDS + 1):
+            self.assertEqual([claimed.pk for claimed in images.claim_pending()[0]], [event.pk])
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """The test outbox backend, refusing every message to a recipient at fail.example.com."""
+
+    def send_messages(self, messages):
+        if any(message.to[0].endswith('@fail.example.com') for message in messages):
+            raise ConnectionError('421 try again later')
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+    def test_batch_is_claimed_then_sent(self):
+        queue_mail('Hello', 'Body', ['a@example.com', 'b@example.com'])
+        outer_blocks = len(connection.atomic_blocks)
+        statuses = []
+
+        class WatchingBackend(FlakyEmailBackend):
+            def send_messages(backend, messages):
+                # Sent after the claim committed, with no transaction held open
+                self.assertEqual(len(connection.atomic_blocks), outer_blocks)
+                statuses.extend(OutboundEmail.objects.values_list('status', flat=True))
+                return super().send_messages(messages)
+
+        self.assertEqual(deliver_pending(connection=WatchingBackend()), (2, 0))
+        self.assertEqual(set(statuses), {OutboundEmail.SENDING})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['a@example.com', 'b@example.com'])
+        self.assertEqual(set(OutboundEmail.objects.values_list('status', flat=True)), {OutboundEmail.SENT})
+        self.assertEqual(deliver_pending(connection=FlakyEmailBackend()), (0, 0))
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        queue_mail('Hello', 'Body', ['a@fail.example.com'])
+        outgoing = OutboundEmail.objects.get()
+        self.assertEqual(deliver_pending(max_attempts=2, connection=FlakyEmailBackend()), (0, 1))
+        outgoing.refresh_from_db()
+        self.assertEqual((outgoing.status, outgoing.attempts), (OutboundEmail.PENDING, 1))
+        self.assertIn('421', outgoing.last_error)
+        self.assertGreater(outgoing.next_attempt_at, timezone.now())
+        # Not due yet
+        self.assertEqual(deliver_pending(max_attempts=2, connection=FlakyEmailBackend()), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(max_attempts=2, connection=FlakyEmailBackend()), (0, 1))
+        outgoing.refresh_from_db()
+        self.assertEqual((outgoing.status, outgoing.attempts), (OutboundEmail.FAILED, 2))
+        self.assertEqual(mail.outbox, [])
+
+    def test_claims_of_a_crashed_worker_expire(self):
+        queue_mail('Hello', 'Body', ['a@example.com'])
+        self.assertEqual(len(claim_due()), 1)
+        self.assertEqual(claim_due(), [])
+        later = timezone.now() + datetime.timedelta(seconds=SEND_LEASE_SECONDS + 1)
+        self.assertEqual(len(claim_due(now=later)), 1)
+
+
+class ApiConditionalTests(TestCase):
+    def get(self, url, etag=None):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag) if etag else self.client.get(url)
+
+    def test_list_answers_304_until_an_event_changes(self):
+        event, _other = make_event(), make_event()
+        url = '/events/api/events/'
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        latest = max(Category.objects.latest('updated_at').updated_at, Event.objects.latest('updated_at').updated_at)
+        self.assertEqual(response['Last-Modified'], http_date(latest.timestamp()))
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(url, etag).status_code, 304)
+
+        event.name = 'Renamed'
+        event.save()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['name'], 'Renamed')
+
+        # Writers that skip the signals and the cache, e.g. another process's command
+        etag = response['ETag']
+        Event.objects.filter(pk=event.pk).update(rsvp_count=5, updated_at=timezone.now())
+        response = self.get(url, etag)
+        self.assertEqual((response.status_code, response.json()['results'][0]['rsvp_count']), (200, 5))
+
+        etag = response['ETag']
+        event.delete()
+        response = self.get(url, etag)
+        self.assertEqual((response.status_code, len(response.json()['results'])), (200, 1))
+
+    def test_category_list_follows_event_changes(self):
+        event = make_event()
+        url = '/events/api/categories/'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        event.delete()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['event_count'], 0)
+        self.assertIn('Last-Modified', response)
+
+    def test_detail_answers_304_until_the_event_changes(self):
+        event = make_event()
+        url = f'/events/api/events/{event.pk}/'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        event.name = 'Renamed'
+        event.save()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        event.delete()
+        self.assertEqual(self.get(url, etag).status_code, 404)
+
+
+@override_settings(CACHE_SHARED=True)
+class CachedPageTests(TestCase):
+    def counts(self, name):
+        return cache_stats().get(name, {'hit': 0, 'miss': 0})
+
+    def test_hit_keeps_status_and_headers(self):
+        @cached_public_page('cached_page_test', depends_on=lambda: [EVENTS])
+        def view(request):
+            response = JsonResponse({'rendered': time.time_ns()})
+            response['Cache-Control'] = 'public, max-age=60'
+            response['Vary'] = 'Accept-Language'
+            return response
+
+        def get():
+            request = RequestFactory().get('/cached/')
+            request.user = AnonymousUser()
+            return view(request)
+
+        before = self.counts('cached_page_test')
+        first, second = get(), get()
+        after = self.counts('cached_page_test')
+        self.assertEqual((after['miss'] - before['miss'], after['hit'] - before['hit']), (1, 1))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.status_code, 200)
+        for header in ('Content-Type', 'Cache-Control', 'Vary'):
+            self.assertEqual(second[header], first[header])
+
+    def test_detail_page_is_cached_for_anonymous_users_until_the_event_changes(self):
+        event = make_event(name='Before')
+        url = f'/events/events/{event.pk}/'
+        before = self.counts('event_detail')
+        self.assertContains(self.client.get(url), 'Before')
+        response = self.client.get(url)
+        self.assertContains(response, 'Before')
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertEqual(self.counts('event_detail')['hit'] - before['hit'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            event.name = 'After'
+            event.save()
+        self.assertContains(self.client.get(url), 'After')
+        self.assertEqual(self.counts('event_detail')['miss'] - before['miss'], 2)
+
+    def test_nothing_is_cached_in_a_process_local_cache(self):
+        event = make_event()
+        url = f'/events/events/{event.pk}/'
+        before = self.counts('event_detail')
+        with self.settings(CACHE_SHARED=False):
+            self.client.get(url)
+            self.client.get(url)
+        self.assertEqual(self.counts('event_detail'), before)
+
+    def test_logged_in_users_bypass_the_cache(self):
+        event = make_event()
+        url = f'/events/events/{event.pk}/'
+        self.client.get(url)
+        before = self.counts('event_detail')
+        self.client.force_login(User.objects.create_user('member', password='x'))
+        self.client.get(url)
+        self.assertEqual(self.counts('event_detail'), before)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        day = datetime.date.today() + datetime.timedelta(days=3)
+        # Pairs of events at the same start time, so only the id keeps the order stable
+        self.events = [
+            make_event(name=f'Event {i}', date=day + datetime.timedelta(days=i // 2)) for i in range(7)
+        ]
+
+    def test_cursors_walk_every_row_once_in_both_directions(self):
+        paginator = KeysetPaginator(EVENT_ORDERING, per_page=3)
+        queryset = Event.objects.all()
+        pages = [paginator.paginate(queryset)]
+        while pages[-1].has_next():
+            pages.append(paginator.paginate(queryset, pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([event for page in pages for event in page], self.events)
+        self.assertFalse(pages[0].has_previous())
+
+        back = paginator.paginate(queryset, pages[-1].previous_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+        self.assertEqual(paginator.paginate(queryset, back.previous_cursor).object_list, pages[0].object_list)
+
+    def test_a_bad_cursor_gives_the_first_page(self):
+        paginator = KeysetPaginator(EVENT_ORDERING, per_page=3)
+        self.assertEqual(paginator.paginate(Event.objects.all(), 'not-a-cursor').object_list, self.events[:3])
+
+    def test_list_view_pages_with_the_filters_kept(self):
+        with self.settings(EVENTS_PAGE_SIZE=2):
+            response = self.client.get('/events/events/', {'search': 'Event'})
+            page = response.context['page']
+            self.assertTrue(page.has_next())
+            response = self.client.get('/events/events/', {'search': 'Event', 'cursor': page.next_cursor})
+        self.assertEqual(len(response.context['page']), 2)
+        self.assertFalse(set(response.context['page']) & set(page))
+
+
+class RSVPCountTests(TestCase):
+    def counts(self, *events):
+        return [Event.objects.get(pk=event.pk).rsvp_count for event in events]
+
+    def test_forward_add_remove_clear(self):
+        event = make_event()
+        first, second, third = make_users(3)
+        event.participants.add(first, second)
+        event.participants.add(second, third)  # second is already in
+        self.assertEqual(self.counts(event), [3])
+        event.participants.remove(first, first)
+        event.participants.remove(first)  # no longer in
+        self.assertEqual(self.counts(event), [2])
+        event.participants.clear()
+        self.assertEqual(self.counts(event), [0])
+        self.assertEqual(event.rsvp_count, 0)
+
+    def test_reverse_add_remove_clear(self):
+        first, second = make_event(), make_event()
+        user, other = make_users(2)
+        other.rsvped_events.add(first)
+        user.rsvped_events.add(first, second)
+        self.assertEqual(self.counts(first, second), [2, 1])
+        user.rsvped_events.remove(second, second)
+        self.assertEqual(self.counts(first, second), [2, 0])
+        user.rsvped_events.clear()
+        self.assertEqual(self.counts(first, second), [1, 0])
+
+    def test_deleting_a_user_releases_their_rsvps(self):
+        event = make_event()
+        user, other = make_users(2)
+        event.participants.add(user, other)
+        user.delete()
+        self.assertEqual(self.counts(event), [1])
+
+    def test_reconcile_fixes_drift(self):
+        event = make_event()
+        event.participants.add(*make_users(2))
+        Event.objects.filter(pk=event.pk).update(rsvp_count=7)
+        out = io.StringIO()
+        call_command('reconcile_rsvp_counts', stdout=out)
+        self.assertIn('Reconciled 1 event(s).', out.getvalue())
+        self.assertEqual(self.counts(event), [2])
+
+
+class SearchTests(TestCase):
+    def found(self, query):
+        return set(search_events(Event.objects.all(), query).values_list('name', flat=True))
+
+    def test_index_follows_saves_updates_and_deletes(self):
+        event = make_event(name='Python workshop')
+        self.assertEqual(self.found('pyth'), {'Python workshop'})
+
+        event.name = 'Rust workshop'
+        event.save()
+        self.assertEqual(self.found('python'), set())
+        self.assertEqual(self.found('rust'), {'Rust workshop'})
+
+        Event.objects.filter(pk=event.pk).update(location='Chittagong')
+        self.assertEqual(self.found('chittagong rust'), {'Rust workshop'})
+        self.assertEqual(self.found('dhaka'), set())
+
+        event.delete()
+        self.assertEqual(self.found('rust'), set())
+
+    def test_name_hits_rank_above_description_hits(self):
+        make_event(name='Monthly gathering', description='Talks about databases')
+        make_event(name='Databases night', description='Monthly gathering')
+        ranked = search_events(Event.objects.all(), 'databases').order_by('-search_rank')
+        self.assertEqual([event.name for event in ranked], ['Databases night', 'Monthly gathering'])
+
+
+class BulkRSVPTests(TestCase):
+    def test_mixed_list_with_capacity(self):
+        event = make_event(capacity=3)
+        users = make_users(5)
+        event.participants.add(users[0])
+        mail_before = OutboundEmail.objects.count()
+
+        result = bulk_rsvp(event, parse_identifiers([
+            'user0', 'user1@example.com', 'user1', 'user2,extra column', '# comment', 'user3', 'user4', 'nobody',
+        ]))
+
+        self.assertEqual(result.already_attending, 1)
+        self.assertEqual(result.added, users[1:3])
+        self.assertEqual(result.waitlisted, users[3:])
+        self.assertEqual(result.unknown, ['nobody'])
+        event.refresh_from_db()
+        self.assertEqual(event.rsvp_count, 3)
+        self.assertEqual(list(WaitlistEntry.objects.filter(event=event).values_list('user', flat=True)),
+                         [user.pk for user in users[3:]])
+        # Only the newly added users are emailed
+        self.assertEqual(OutboundEmail.objects.count() - mail_before, 2)
+
+    def test_seats_go_in_list_order_not_id_order(self):
+        event = make_event(capacity=2)
+        users = make_users(4)
+        result = bulk_rsvp(event, ['user3', 'user1@example.com', 'user0', 'user2'])
+        self.assertEqual(result.added, [users[3], users[1]])
+        self.assertEqual(result.waitlisted, [users[0], users[2]])
+        self.assertEqual(set(event.participants.all()), {users[3], users[1]})
+        waitlist = WaitlistEntry.objects.filter(event=event).order_by('id').values_list('user', flat=True)
+        self.assertEqual(list(waitlist), [users[0].pk, users[2].pk])
+
+    def test_query_count_does_not_grow_with_the_list(self):
+        small, large = make_event(), make_event()
+        users = make_users(60)
+        with CaptureQueriesContext(connection) as few:
+            bulk_rsvp(small, [user.username for user in users[:5]])
+        with CaptureQueriesContext(connection) as many:
+            bulk_rsvp(large, [user.username for user in users])
+        self.assertEqual(len(many), len(few))
+
+    def test_command_reads_a_file(self):
+        event = make_event()
+        make_users(2)
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('user0\nuser1@example.com\nghost\n')
+        self.addCleanup(os.remove, f.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('bulk_rsvp', event.pk, f.name, '--no-email', stdout=out, stderr=err)
+        self.assertIn('2 added', out.getvalue())
+        self.assertIn('Not found: ghost', err.getvalue())
+        self.assertEqual(Event.objects.get(pk=event.pk).rsvp_count, 2)
+
+    def test_endpoint_needs_change_permission(self):
+        event = make_event()
+        make_users(1)
+        url = f'/events/events/{event.pk}/bulk-rsvp/'
+        member = User.objects.create_user('member', password='x')
+        self.client.force_login(member)
+        self.assertEqual(self.client.post(url, {'attendees': 'user0'}).status_code, 302)
+        self.assertEqual(Event.objects.get(pk=event.pk).rsvp_count, 0)
+
+        member.user_permissions.add(Permission.objects.get(codename='change_event'))
+        response = self.client.post(url, {'attendees': 'user0'})
+        self.assertRedirects(response, f'/events/events/{event.pk}/', fetch_redirect_response=False)
+        self.assertEqual(Event.objects.get(pk=event.pk).rsvp_count, 1)
+
+
+class DashboardStatsTests(TestCase):
+    def assertMatchesLive(self):
+        header = stats.get_stats()
+        for name, value in stats.live_counts(timezone.now().date()).items():
+            self.assertEqual(getattr(header, name), value, name)
+
+    def test_counters_follow_saves_deletes_and_rsvps(self):
+        today = datetime.date.today()
+        upcoming = make_event(date=today + datetime.timedelta(days=3))
+        past = make_event(date=today - datetime.timedelta(days=3))
+        upcoming.participants.add(*make_users(3))
+        past.participants.add(*make_users(2, prefix='past'))
+        self.assertMatchesLive()
+
+        upcoming.date = today - datetime.timedelta(days=1)
+        upcoming.save()
+        self.assertMatchesLive()
+
+        past.delete()
+        self.assertMatchesLive()
+        self.assertEqual(stats.get_stats().total_rsvps, 3)
+
+        upcoming.category.delete()
+        self.assertMatchesLive()
+        self.assertEqual(stats.get_stats().total_events, 0)
+
+    def test_rollover_moves_yesterdays_events_to_past(self):
+        today = datetime.date.today()
+        make_event(date=today - datetime.timedelta(days=1))
+        stats.rebuild(today - datetime.timedelta(days=2))
+        self.assertEqual(stats.get_stats().as_of, today)
+        self.assertMatchesLive()
+
+    def test_rebuild_command_reports_drift(self):
+        make_event()
+        stats.get_stats()
+        stats.bump(total_events=5)
+        out = io.StringIO()
+        call_command('rebuild_dashboard_stats', stdout=out)
+        self.assertIn('total_events: stored 6, actual 1', out.getvalue())
+        self.assertMatchesLive()
+
+    def test_rsvps_land_in_shards_until_folded(self):
+        event = make_event()
+        stats.get_stats()
+        row = DashboardStats.objects.get(pk=stats.STATS_PK)
+        event.participants.add(*make_users(3))
+        self.assertEqual(DashboardStats.objects.get(pk=stats.STATS_PK).total_rsvps, row.total_rsvps)
+        self.assertMatchesLive()
+
+        call_command('rebuild_dashboard_stats', '--rollover-only', stdout=io.StringIO())
+        self.assertEqual(DashboardStats.objects.get(pk=stats.STATS_PK).total_rsvps, 3)
+        self.assertFalse(DashboardStatsShard.objects.exclude(total_rsvps=0).exists())
+        self.assertMatchesLive()
+
+    def test_dashboard_header_after_a_delete(self):
+        event, _other = make_event(), make_event()
+        event.participants.add(*make_users(2))
+        staff = User.objects.create_user('organizer', password='x')
+        staff.user_permissions.add(Permission.objects.get(codename='view_event'))
+        self.client.force_login(staff)
+        event.delete()
+        counts = self.client.get('/events/dashboard/').context['counts']
+        self.assertEqual(counts['events'], {'total': 1, 'upcoming': 1, 'past': 0})
+        self.assertEqual((counts['categories']['total'], counts['users']['total']), (2, 0))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user('organizer', password='x')
+        self.organizer.user_permissions.add(Permission.objects.get(codename='change_event'))
+
+    def test_events_csv_streams_the_filtered_events_in_blocks(self):
+        today = datetime.date.today()
+        events = [make_event(name=f'Event {i}', date=today + datetime.timedelta(days=i + 1)) for i in range(5)]
+        other = make_event(name='Elsewhere')
+        self.client.force_login(self.organizer)
+        with mock.patch.object(export, 'CHUNK_SIZE', 2):
+            response = self.client.get('/events/events/export/', {'format': 'csv', 'category': other.category_id})
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+            self.assertIn('filename="events.csv"', response['Content-Disposition'])
+            self.assertEqual(len(list(response.streaming_content)), 1)
+
+            response = self.client.get('/events/events/export/')
+            blocks = [block.decode() for block in response.streaming_content]
+        self.assertEqual(len(blocks), 3)
+        lines = ''.join(blocks).splitlines()
+        self.assertEqual(lines[0], 'id,name,description,category,date,time,location,capacity,rsvp_count')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], [event.name for event in events] + ['Elsewhere'])
+
+    def test_roster_ndjson(self):
+        event = make_event()
+        event.participants.add(*make_users(3))
+        self.client.force_login(self.organizer)
+        response = self.client.get(f'/events/events/{event.pk}/roster/', {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['user0', 'user1', 'user2'])
+        self.assertEqual(rows[0]['email'], 'user0@example.com')
+
+    def test_bad_format_and_permission(self):
+        event = make_event()
+        self.client.force_login(self.organizer)
+        self.assertEqual(self.client.get('/events/events/export/', {'format': 'xml'}).status_code, 400)
+        self.client.force_login(User.objects.create_user('member', password='x'))
+        self.assertEqual(self.client.get(f'/events/events/{event.pk}/roster/').status_code, 302)
+
+    def test_command_writes_a_file(self):
+        event = make_event()
+        users = make_users(2)
+        event.participants.add(*users)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'roster.csv')
+            call_command('export_events', '--roster', event.pk, '-o', path)
+            with open(path, encoding='utf-8') as f:
+                rows = f.read().splitlines()[1:]
+        self.assertEqual(rows, [f'{user.pk},{user.username},,,{user.email}' for user in users])
+        with self.assertRaises(CommandError):
+            call_command('export_events', '--roster', event.pk + 1)
+
+
+class MetricsTests(TestCase):
+    def test_requests_are_reported_by_url_name_with_their_queries(self):
+        event = make_event()
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        self.client.get(f'/events/api/events/{event.pk}/')
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('events_request_duration_seconds_count{view="api-event-detail",method="GET",status="200"}', body)
+        queries = next(line for line in body.splitlines() if line.startswith('events_request_queries_sum{view="api-event-detail"}'))
+        self.assertGreater(float(queries.split()[-1]), 0)
+
+    def test_only_staff_can_read_metrics(self):
+        User.objects.create_user('member', password='x')
+        self.client.login(username='member', password='x')
+        self.assertEqual(self.client.get('/metrics').status_code, 302)
+
+    def test_snapshots_of_dead_workers_are_dropped(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+        series = [['events_email_send_seconds', ['dead-worker'], [[1] + [0] * (len(metrics.SECONDS_BUCKETS) - 1), 0.001, 1]]]
+        with open(os.path.join(directory, f'{worker.stdout.strip()}.json'), 'w') as f:
+            json.dump(series, f)
+
+        with override_settings(METRICS_DIR=directory):
+            self.assertNotIn(['dead-worker'], [labels for _name, labels, _series in metrics.collect()])
+            self.assertEqual(os.listdir(directory), [f'{os.getpid()}.json'])
+            metrics._remove_snapshot()
+        self.assertEqual(os.listdir(directory), [])
+
+
+class RosterTests(TestCase):
+    def test_detail_page_cost_does_not_grow_with_participants(self):
+        from events.views import ROSTER_PAGE_SIZE
+
+        small, large = make_event(), make_event(name='Conference')
+        member = User.objects.create_user('member', password='x')
+        users = User.objects.bulk_create(User(username=f'guest{i}') for i in range(ROSTER_PAGE_SIZE * 2 + 5))
+        RSVP.objects.bulk_create(RSVP(event=small, user=user) for user in users[:3])
+        RSVP.objects.bulk_create(RSVP(event=large, user=user) for user in users)
+        RSVP.objects.bulk_create([RSVP(event=small, user=member), RSVP(event=large, user=member)])
+        self.client.force_login(member)
+
+        self.client.get(f'/events/events/{small.pk}/')  # session and user lookups warm up
+        with CaptureQueriesContext(connection) as small_queries:
+            self.client.get(f'/events/events/{small.pk}/')
+        with CaptureQueriesContext(connection) as large_queries:
+            response = self.client.get(f'/events/events/{large.pk}/')
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertTrue(response.context['is_participant'])
+        self.assertEqual(len(response.context['roster']), ROSTER_PAGE_SIZE)
+
+        seen = [rsvp.user.username for rsvp in response.context['roster']]
+        cursor = response.context['roster'].next_cursor
+        while cursor:
+            page = self.client.get(f'/events/events/{large.pk}/participants/', {'cursor': cursor}).context['roster']
+            seen += [rsvp.user.username for rsvp in page]
+            cursor = page.next_cursor
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), len(users) + 1)
+
+
+@override_settings(CACHE_SHARED=True)
+class CalendarFeedTests(TestCase):
+    def test_polling_is_query_free_and_rsvps_only_touch_the_users_feed(self):
+        event = make_event()
+        user = User.objects.create_user('member', password='x')
+        feeds = [
+            '/events/calendar.ics',
+            f'/events/categories/{event.category_id}/calendar.ics',
+            f'/events/calendar/{ical.user_token(user)}.ics',
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in feeds}
+        with self.assertNumQueries(0):
+            for url in feeds:
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            event.participants.add(user)
+        statuses = [self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code for url in feeds]
+        self.assertEqual(statuses, [304, 304, 200])
+        self.assertIn(b'SUMMARY:Meetup', self.client.get(feeds[2]).content)
+
+    def test_an_event_change_bumps_all_attendee_feeds_in_one_write(self):
+        event = make_event()
+        users = User.objects.bulk_create(User(username=f'guest{i}') for i in range(20))
+        RSVP.objects.bulk_create(RSVP(event=event, user=user) for user in users)
+        feeds = [f'/events/calendar/{ical.user_token(user)}.ics' for user in users]
+        etags = {url: self.client.get(url)['ETag'] for url in feeds}
+
+        backend = cache.get_cache()
+        with mock.patch.object(backend, 'set_many', wraps=backend.set_many) as set_many, \
+                mock.patch.object(backend, 'incr') as incr, self.captureOnCommitCallbacks(execute=True):
+            event.description = 'Moved upstairs'
+            event.save()
+        incr.assert_not_called()
+        # One write for the page versions, one for every feed showing the event
+        self.assertEqual(set_many.call_count, 2)
+        feed_keys = set(set_many.call_args.args[0])
+        self.assertTrue({f'version:{ical.user_feed(user.pk)}' for user in users} <= feed_keys)
+        for url in feeds:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200)
+
+
+class GeoSearchTests(TestCase):
+    def setUp(self):
+        gazetteer = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        self.addCleanup(os.remove, gazetteer.name)
+        with gazetteer:
+            gazetteer.write(
+                'name,latitude,longitude,alternate_names\n'
+                'Dhaka,23.8103,90.4125,Dacca\n'
+                'Gazipur,23.9999,90.4203,\n'
+                'Chittagong,22.3569,91.7832,Chattogram\n'
+            )
+        self.gazetteer = gazetteer.name
+
+    def test_geocoded_events_are_found_by_radius_and_box(self):
+        dhaka = make_event(name='Dhaka meetup', location='Bashundhara Hall, Dhaka')
+        gazipur = make_event(name='Gazipur meetup', location='Gazipur', category=dhaka.category)
+        make_event(name='Port meetup', location='Chattogram', category=dhaka.category)
+        nowhere = make_event(name='Online', location='Online', category=dhaka.category)
+        out = io.StringIO()
+        call_command('geocode_events', self.gazetteer, stdout=out)
+        self.assertIn('Geocoded 3 event(s); 1 event(s)', out.getvalue())
+        dhaka.refresh_from_db()
+        nowhere.refresh_from_db()
+        self.assertEqual(dhaka.geohash, geo.encode(23.8103, 90.4125))
+        self.assertEqual(nowhere.geohash, '')
+
+        def names(query):
+            response = self.client.get('/events/events/', query)
+            return sorted(event.name for event in response.context['events'])
+
+        # Gazipur is ~21 km north of Dhaka, Chittagong ~215 km away
+        self.assertEqual(names({'lat': 23.81, 'lon': 90.41, 'radius': 10}), ['Dhaka meetup'])
+        self.assertEqual(names({'lat': 23.81, 'lon': 90.41, 'radius': 25, 'days': 8}), ['Dhaka meetup', 'Gazipur meetup'])
+        self.assertEqual(names({'lat': 23.81, 'lon': 90.41, 'radius': 25, 'days': 3}), [])
+        self.assertEqual(names({'bbox': '22,91,23,92'}), ['Port meetup'])
+
+        gazipur.latitude = None
+        gazipur.save(update_fields=['latitude'])
+        self.assertEqual(Event.objects.get(pk=gazipur.pk).geohash, '')
+
+    def test_a_new_location_is_geocoded_again(self):
+        event = make_event(location='Dhaka')
+        call_command('geocode_events', self.gazetteer, stdout=io.StringIO())
+        event.refresh_from_db()
+
+        event.location = 'Chittagong'
+        event.save()
+        event.refresh_from_db()
+        self.assertEqual((event.latitude, event.longitude, event.geohash), (None, None, ''))
+        call_command('geocode_events', self.gazetteer, stdout=io.StringIO())
+        event.refresh_from_db()
+        self.assertEqual((event.latitude, event.longitude), (22.3569, 91.7832))
+
+        # Through update_fields too, and coordinates given with the new place are kept
+        event.location = 'Dhaka'
+        event.save(update_fields=['location'])
+        self.assertIsNone(Event.objects.get(pk=event.pk).latitude)
+        event.location, event.latitude, event.longitude = 'Gazipur', 23.9999, 90.4203
+        event.save()
+        self.assertEqual(Event.objects.get(pk=event.pk).geohash, geo.encode(23.9999, 90.4203))
+
+    def test_search_is_one_query_however_many_events_match(self):
+        category = Category.objects.create(name='Tech', description='')
+        start = timezone.now() + datetime.timedelta(days=1)
+        events = []
+        for i in range(1200):
+            event = Event(
+                name=f'Dense {i}', description='', date=start.date(), time=start.time(), starts_at=start,
+                location='Dhaka', category=category, latitude=23.81 + (i % 40) * 0.001, longitude=90.41 + (i // 40) * 0.001,
+            )
+            event.compute_geohash()
+            events.append(event)
+        Event.objects.bulk_create(events)
+
+        with CaptureQueriesContext(connection) as queries:
+            found = list(geo.within(Event.objects.all(), 23.81, 90.41, 10).order_by('starts_at', 'id')[:13])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(found), 13)
+        for event in found:
+            self.assertAlmostEqual(event.distance_km, geo.distance_km(23.81, 90.41, event.latitude, event.longitude), places=6)
+        self.assertEqual(geo.within(Event.objects.all(), 23.81, 90.41, 10).count(), 1200)
+        nearby = sum(1 for event in events if geo.distance_km(23.81, 90.41, event.latitude, event.longitude) <= 2)
+        self.assertLess(nearby, 1200)
+        self.assertEqual(geo.within(Event.objects.all(), 23.81, 90.41, 2).count(), nearby)
+
+    def test_cells_cover_the_box(self):
+        # Right on the equator and the prime meridian, where the top-level cells meet
+        cells = geo.cells_for_box(*geo.box_around(0.001, 0.001, 5))
+        self.assertLessEqual(len(cells), geo.MAX_CELLS)
+        for lat, lon in [(0.03, 0.03), (-0.03, 0.03), (0.03, -0.03), (-0.03, -0.03)]:
+            self.assertTrue(any(geo.encode(lat, lon).startswith(cell) for cell in cells), (lat, lon))
+        self.assertEqual(geo.next_prefix('u4pz'), 'u4q')
+        self.assertIsNone(geo.next_prefix('zz'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=10)
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_go_to_the_primary_after_a_write_until_the_pin_expires(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Event))  # outside a request
+
+        reads = []
+
+        def view(request):
+            reads.append(router.db_for_read(Event))
+            if request.GET.get('write'):
+                router.db_for_write(Event)
+            reads.append(router.db_for_read(Event))
+            return HttpResponse()
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        factory = RequestFactory()
+        response = middleware(factory.get('/', {'write': 1}))
+        self.assertEqual(reads, ['replica1', 'default'])
+
+        pin = response.cookies[PIN_COOKIE].value
+        middleware(factory.get('/', HTTP_COOKIE=f'{PIN_COOKIE}={pin}'))
+        self.assertEqual(reads[2:], ['default', 'default'])
+        middleware(factory.get('/', HTTP_COOKIE=f'{PIN_COOKIE}={float(pin) - 10}'))
+        self.assertEqual(reads[4:], ['replica1', 'replica1'])
+        middleware(factory.post('/'))
+        self.assertEqual(reads[6:], ['default', 'default'])
+
+    @override_settings(CACHE_SHARED=True)
+    def test_cache_fills_read_from_the_primary(self):
+        router = ReplicaRouter()
+        filled = []
+        with routing():
+            with from_primary():
+                self.assertEqual(router.db_for_read(Event), 'default')
+            self.assertEqual(router.db_for_read(Event), 'replica1')
+
+            compute = lambda: filled.append(router.db_for_read(Event)) or 'value'
+            name = f'router-test-{time.time_ns()}'
+            for _ in range(2):
+                self.assertEqual(cached_value('test', name, [name], compute, 60), 'value')
+            self.assertEqual(router.db_for_read(Event), 'replica1')
+        self.assertEqual(filled, ['default'])
+
+
+class BenchServersTests(SimpleTestCase):
+    def test_server_log_is_shown_when_it_fails_to_start(self):
+        failing = '{python} -c "import sys; sys.stderr.write(\'address in use\'); sys.exit(1)"'
+        with self.assertRaisesMessage(CommandError, 'Server exited early:\naddress in use'):
+            call_command('bench_servers', '--only', 'asgi', '--asgi-cmd', failing, '--requests', '1')
+
+
+class AssetsTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        os.makedirs(os.path.join(root, 'css'))
+        self.css = b'body { color: red; }\n' * 100
+        with open(os.path.join(root, 'css', 'site.0123456789ab.css'), 'wb') as f:
+            f.write(self.css)
+        with open(os.path.join(root, 'css', 'site.0123456789ab.css.gz'), 'wb') as f:
+            f.write(gzip.compress(self.css))
+        with open(os.path.join(root, 'staticfiles.json'), 'w') as f:
+            json.dump({'paths': {'css/site.css': 'css/site.0123456789ab.css'}}, f)
+        self.root = root
+        with override_settings(STATIC_ROOT=root):
+            self.app = WSGIAssets(lambda environ, start_response: self.fail("reached Django"))
+
+    def get(self, path, **headers):
+        response = {}
+
+        def start_response(status, response_headers):
+            response['status'], response['headers'] = int(status.split()[0]), dict(response_headers)
+
+        body = b''.join(self.app({'REQUEST_METHOD': 'GET', 'PATH_INFO': path, **headers}, start_response))
+        return response['status'], response['headers'], body
+
+    def test_negotiates_encoding_ranges_and_caching(self):
+        path = '/static/css/site.0123456789ab.css'
+        status, headers, body = self.get(path, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual((status, headers['Content-Encoding'], headers['Vary']), (200, 'gzip', 'Accept-Encoding'))
+        self.assertEqual(gzip.decompress(body), self.css)
+        self.assertIn('immutable', headers['Cache-Control'])
+
+        status, headers, body = self.get(path, HTTP_RANGE='bytes=10-19')
+        self.assertEqual((status, headers['Content-Range'], body), (206, f'bytes 10-19/{len(self.css)}', self.css[10:20]))
+        self.assertNotIn('Content-Encoding', headers)
+
+        etag = self.get(path)[1]['ETag']
+        self.assertEqual(self.get(path, HTTP_IF_NONE_MATCH=etag)[0], 304)
+        self.assertEqual(self.get('/static/css/missing.css')[0], 404)
+
+    async def test_asgi_serves_assets_and_passes_the_rest_on(self):
+        passed = []
+
+        async def django(scope, receive, send):
+            passed.append(scope['path'])
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'django'})
+
+        with override_settings(STATIC_ROOT=self.root):
+            app = ASGIAssets(django)
+        status, headers, body = await asgi_get(app, '/static/css/site.0123456789ab.css', accept_encoding='gzip')
+        self.assertEqual((status, headers['content-encoding']), (200, 'gzip'))
+        self.assertEqual(gzip.decompress(body), self.css)
+        self.assertEqual((await asgi_get(app, '/events/'))[2], b'django')
+        self.assertEqual(passed, ['/events/'])
+
+
+async def asgi_get(app, path, **headers):
+    """Run one GET through an ASGI app. Returns (status, {header: value}, body)."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+        'headers': [(b'host', b'testserver')] + [
+            (name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()
+        ],
+    }
+    messages = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected until the app is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    headers = {name.decode().lower(): value.decode() for name, value in start['headers']}
+    return start['status'], headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+
+class ASGIApplicationTests(TestCase):
+    def setUp(self):
+        # As the test client does: the handler must not close the test's connection
+        request_started.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+
+    async def test_project_application_serves_an_async_view(self):
+        await sync_to_async(make_event)(name='Served over ASGI')
+        status, headers, body = await asgi_get(application, '/events/events/')
+        self.assertEqual(status, 200)
+        self.assertTrue(headers['content-type'].startswith('text/html'))
+        self.assertIn(b'Served over ASGI', body)
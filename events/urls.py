@@ -1,5 +1,6 @@
 from django.urls import path
 from events.views import *
+from events import api, ical
 from django.conf.urls.static import static
 from django.conf import settings
 
@@ -16,12 +17,18 @@ urlpatterns = [
     # path('events/add/', event_create, name='event_create'),
     path('events/add/', EventCreateView.as_view(), name='event_create'),
     # path('events/<int:id>/edit/', event_update, name='event_update'),
+    path('events/<int:id>/participants/', event_participants, name='event_participants'),
     path('events/<int:id>/edit/', EventUpdateView.as_view(), name='event_update'),
     path('events/<int:id>/delete/', event_delete, name='event_delete'),
 
     # RSVP (based on User <-> Event M2M)
     path('events/<int:event_id>/rsvp/', rsvp_event, name='rsvp-event'),
     path('cancel-rsvp/<int:event_id>/', cancel_rsvp, name='cancel-rsvp'),
+    path('events/<int:id>/bulk-rsvp/', event_bulk_rsvp, name='event_bulk_rsvp'),
+
+    # Exports (?format=csv|ndjson)
+    path('events/export/', event_export, name='event_export'),
+    path('events/<int:id>/roster/', event_roster_export, name='event_roster_export'),
 
     # Category
     path('categories/', category_list, name='category_list'),
@@ -32,6 +39,19 @@ urlpatterns = [
 
     # Participant Dashboard (NEW: shows RSVP'd events for logged-in user)
     path('my-events/', my_rsvped_events, name='my-rsvped-events'),
+
+    path('cache-stats/', cache_stats_view, name='cache-stats'),
+
+    # Calendar feeds
+    path('calendar.ics', ical.all_events, name='ical-all'),
+    path('categories/<int:id>/calendar.ics', ical.category_events, name='ical-category'),
+    path('calendar/<str:token>.ics', ical.user_events, name='ical-user'),
+
+    # Read-only JSON API
+    path('api/events/', api.event_list, name='api-event-list'),
+    path('api/events/<int:id>/', api.event_detail, name='api-event-detail'),
+    path('api/categories/', api.category_list, name='api-category-list'),
+    path('api/categories/<int:id>/', api.category_detail, name='api-category-detail'),
 ]
 
 
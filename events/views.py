@@ -1,63 +1,189 @@
-from django.urls import reverse_lazy
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q, Count
+from django.utils.dateparse import parse_date
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.db.models import Count
 from django.contrib import messages
-from django.core.mail import send_mail
+from django.contrib.auth.decorators import login_required, permission_required, user_passes_test
 from django.conf import settings
-from django.contrib.auth.decorators import login_required, permission_required
-from events.models import Event, Category
-from .forms import EventForm, CategoryForm
-from django.views.generic import ListView,DetailView,CreateView,UpdateView
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views import View
+from events.models import RSVP, ArchivedEvent, ArchivedRSVP, Event, Category, start_of_day
+from users.roles import ADMIN, ORGANIZER, USER, get_roles, has_role
+from . import export, geo, ical, metrics
+from .cache import CATEGORIES, EVENTS, cache_stats, cached_public_page, event_version
+from .forms import EventForm, CategoryForm, BulkRSVPForm
+from .pagination import KeysetPaginator
+from .rsvp import (
+    RSVP_EXISTS, RSVP_WAITLISTED, bulk_rsvp, parse_identifiers, promote_waitlist, release_seat, reserve_seat,
+)
+from .search import search_events
+from .stats import get_stats
+from django.views.generic import CreateView,UpdateView
 from django.contrib.auth.mixins import PermissionRequiredMixin
 # Group checkers (for RBAC)
 def is_user(user):
-    return user.groups.filter(name='user').exists()
+    return has_role(user, USER)
 
 def is_organizer(user):
-    return user.groups.filter(name='organizer').exists()
+    return has_role(user, ORGANIZER)
+
+# Events are always listed in start order; id breaks ties so the cursor is unique
+EVENT_ORDERING = ('starts_at', 'id')
+# Participants shown per page of an event's roster, in RSVP order
+ROSTER_PAGE_SIZE = 50
+
+async def arender(request, template_name, context):
+    # Template rendering (and any lazy lookups in templates) stays synchronous
+    return await sync_to_async(render)(request, template_name, context)
+
 
 # Home page (latest events)
-def home(request):
-    events = Event.objects.select_related('category').prefetch_related('participants').all()[:9]
-    return render(request, 'events/home.html', {'events': events})
+@cached_public_page('home', depends_on=lambda: [EVENTS])
+async def home(request):
+    events = [event async for event in Event.objects.select_related('category').all()[:9]]
+    return await arender(request, 'events/home.html', {'events': events})
+
+
+def parse_date_param(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def parse_float_param(value, low, high):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if low <= number <= high else None
+
+
+def filter_near(queryset, params):
+    """
+    "Near me": lat/lon with a radius in km (default geo.DEFAULT_RADIUS_KM),
+    or a bbox of south,west,north,east. Unusable coordinates are ignored,
+    like the other filters.
+    """
+    bbox = params.get('bbox', '').split(',')
+    if len(bbox) == 4:
+        south, north = (parse_float_param(bbox[i], -90, 90) for i in (0, 2))
+        west, east = (parse_float_param(bbox[i], -180, 180) for i in (1, 3))
+        if None not in (south, west, north, east) and south <= north:
+            return geo.in_box(queryset, south, west, north, east)
+
+    latitude = parse_float_param(params.get('lat'), -90, 90)
+    longitude = parse_float_param(params.get('lon'), -180, 180)
+    if latitude is None or longitude is None:
+        return queryset
+    radius = parse_float_param(params.get('radius') or geo.DEFAULT_RADIUS_KM, 0, geo.MAX_RADIUS_KM)
+    return geo.within(queryset, latitude, longitude, radius or geo.DEFAULT_RADIUS_KM)
+
+
+def filter_events(params):
+    """
+    Apply the event list filters (category, start_date/end_date or days,
+    search, lat/lon/radius or bbox) from a QueryDict. Returns the queryset and
+    the keyset ordering to page it by.
+
+    The location filters run their candidate query straight away; call this
+    through sync_to_async from async views.
+    """
+    queryset = Event.objects.select_related('category').all()
+
+    category_id = params.get('category')
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+
+    start_date = parse_date_param(params.get('start_date'))
+    end_date = parse_date_param(params.get('end_date'))
+    if start_date and end_date:
+        # Whole days, as a range over the indexed starts_at column
+        queryset = queryset.filter(
+            starts_at__gte=start_of_day(start_date),
+            starts_at__lt=start_of_day(end_date + timedelta(days=1)),
+        )
 
+    # "In the next N days", from now
+    days = parse_float_param(params.get('days'), 0, 366)
+    if days:
+        now = timezone.now()
+        queryset = queryset.filter(starts_at__gte=now, starts_at__lt=now + timedelta(days=days))
 
-# Event list with search/filter
-class EventListView(ListView):
-    model = Event
-    template_name = 'events/event_list.html'
-    context_object_name = 'events'
+    # Before the search, so the candidate scan stays on the (geohash, starts_at) index
+    queryset = filter_near(queryset, params)
 
-    def get_queryset(self):
-        queryset = Event.objects.select_related('category').prefetch_related('participants').all()
+    # Searches are ranked by relevance, everything else by start time
+    ordering = EVENT_ORDERING
+    search_query = params.get('search', '')
+    if search_query:
+        queryset = search_events(queryset, search_query)
+        ordering = ('-search_rank',) + EVENT_ORDERING
+    return queryset, ordering
 
-        search_query = self.request.GET.get('search', '')
-        if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) | Q(location__icontains=search_query)
-            )
 
-        category_id = self.request.GET.get('category')
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
+# Event list with search/filter
+class EventListView(View):
+    template_name = 'events/event_list.html'
 
-        start_date = self.request.GET.get('start_date')
-        end_date = self.request.GET.get('end_date')
-        if start_date and end_date:
-            queryset = queryset.filter(date__range=[start_date, end_date])
+    def get_queryset(self):
+        return filter_events(self.request.GET)
 
-        return queryset
+    async def get(self, request):
+        queryset, ordering = await sync_to_async(self.get_queryset)()
+        page = await KeysetPaginator(ordering).apaginate(queryset, request.GET.get('cursor'))
+        return await arender(request, self.template_name, {'events': page.object_list, 'page': page})
 
 # Event detail
-class EventDetailView(DetailView):
-    model = Event
+@method_decorator(
+    cached_public_page('event_detail', depends_on=lambda id: [event_version(id), CATEGORIES]), name='get'
+)
+class EventDetailView(View):
     template_name = 'events/event_detail.html'
-    context_object_name = 'event'
-    pk_url_kwarg = 'id'
 
     def get_queryset(self):
-        return Event.objects.select_related('category').prefetch_related('participants')
+        return Event.objects.select_related('category')
+
+    async def get(self, request, id):
+        event = await self.get_queryset().filter(id=id).afirst()
+        if event is None:
+            event = await aget_object_or_404(ArchivedEvent.objects.select_related('category'), id=id)
+        user = await request.auser()
+        is_participant = await event.ahas_participant(user)
+        on_waitlist = (
+            not is_participant and not event.is_archived and user.is_authenticated
+            and await event.waitlist.filter(user=user).aexists()
+        )
+        roster = await aroster_page(event)
+        return await arender(request, self.template_name, {
+            'event': event, 'is_participant': is_participant, 'on_waitlist': on_waitlist, 'roster': roster,
+        })
+
+
+async def aroster_page(event, cursor=None):
+    model = ArchivedRSVP if event.is_archived else RSVP
+    queryset = model.objects.filter(event_id=event.pk).select_related('user').only(
+        'id', 'user__username', 'user__email',
+    )
+    return await KeysetPaginator(('id',), per_page=ROSTER_PAGE_SIZE).apaginate(queryset, cursor)
+
+
+# One page of an event's participants, fetched by the detail page's "Show more"
+@cached_public_page('event_participants', depends_on=lambda id: [event_version(id)])
+async def event_participants(request, id):
+    event = await Event.objects.only('id').filter(id=id).afirst()
+    if event is None:
+        event = await aget_object_or_404(ArchivedEvent.objects.only('id'), id=id)
+    roster = await aroster_page(event, request.GET.get('cursor'))
+    return await arender(request, 'events/participant_list.html', {'event': event, 'roster': roster})
 
 # Event create
 
@@ -86,7 +212,8 @@ class EventUpdateView(PermissionRequiredMixin, UpdateView):
     pk_url_kwarg = 'id'  # So it matches your URL param
 
     def form_valid(self, form):
-        form.save()  # Explicit save
+        event = form.save()  # Explicit save
+        promote_waitlist(event)  # capacity may have been raised
         return super().form_valid(form)
 # Event delete
 @permission_required('events.delete_event', login_url='no-permession')
@@ -100,38 +227,53 @@ def event_delete(request, id):
 
 # Dashboard
 @permission_required('events.view_event', login_url='no-permession')
-def dashboard(request):
-    today = timezone.now().date()
-    counts = {
-        'events': Event.objects.aggregate(
-            total=Count('id'),
-            upcoming=Count('id', filter=Q(date__gte=today)),
-            past=Count('id', filter=Q(date__lt=today)),
-        ),
-        'categories': Category.objects.aggregate(total=Count('id')),
-        'users': {
-            'total': Event.participants.through.objects.count()  # number of RSVP entries
-        }
-    }
-
-    data = Event.objects.select_related('category').prefetch_related('participants')
+async def dashboard(request):
+    today = start_of_day(timezone.now().date())
+    data = Event.objects.select_related('category')
+    # Archived events are all past ones, listed along with the live table
+    archived = [ArchivedEvent.objects.select_related('category')]
     type = request.GET.get('type', 'all')
     data_type = 'events'
 
     if type == 'upcoming':
-        data = data.filter(date__gte=today)
+        data = data.filter(starts_at__gte=today)
         data_type = 'upcoming_events'
+        archived = []
     elif type == 'past':
-        data = data.filter(date__lt=today)
+        data = data.filter(starts_at__lt=today)
         data_type = 'past_events'
     elif type == 'categories':
         data = Category.objects.annotate(event_count=Count('events'))
         data_type = 'categories'
 
-    return render(request, 'events/dashboard.html', {
+    # The header counts and the listing don't depend on each other
+    page = None
+    if data_type != 'categories':
+        header, page = await asyncio.gather(
+            sync_to_async(get_stats)(),  # the stats row and its shards, maintained by events.signals
+            KeysetPaginator(EVENT_ORDERING).apaginate_many([data, *archived], request.GET.get('cursor')),
+        )
+        data = page.object_list
+    else:
+        header, data = await asyncio.gather(sync_to_async(get_stats)(), sync_to_async(list)(data))
+
+    counts = {
+        'events': {
+            'total': header.total_events,
+            'upcoming': header.upcoming_events,
+            'past': header.past_events,
+        },
+        'categories': {'total': header.total_categories},
+        'users': {
+            'total': header.total_rsvps  # number of RSVP entries
+        }
+    }
+
+    return await arender(request, 'events/dashboard.html', {
         'counts': counts,
         'data': data,
         'data_type': data_type,
+        'page': page,
     })
 
 
@@ -140,41 +282,82 @@ def dashboard(request):
 def rsvp_event(request, event_id):
     event = get_object_or_404(Event, id=event_id)
 
-    if request.user in event.participants.all():
+    # The confirmation email is queued by the m2m_changed signal in the same transaction
+    status = reserve_seat(event, request.user)
+    if status == RSVP_EXISTS:
         messages.warning(request, "You have already RSVP’d to this event.")
+    elif status == RSVP_WAITLISTED:
+        messages.info(request, "This event is full. You are on the waitlist and will get a seat if one frees up.")
     else:
-        event.participants.add(request.user)
         messages.success(request, "RSVP successful. A confirmation email has been sent.")
 
-        # Send email
-        send_mail(
-            subject="RSVP Confirmation",
-            message=f"Hi {request.user.username},\n\nYou've successfully RSVP’d for '{event.name}'.",
-            from_email=settings.EMAIL_HOST_USER,
-            recipient_list=[request.user.email],
-            fail_silently=True
-        )
-
     return redirect('event_detail', id=event.id)
 
 
+# Bulk RSVP (organizers)
+@permission_required('events.change_event', login_url='no-permession')
+def event_bulk_rsvp(request, id):
+    event = get_object_or_404(Event, id=id)
+    form = BulkRSVPForm()
+    if request.method == 'POST':
+        form = BulkRSVPForm(request.POST, request.FILES)
+        if form.is_valid():
+            result = bulk_rsvp(event, parse_identifiers(form.cleaned_data['lines']))
+            messages.success(request, f"Bulk RSVP: {result}.")
+            if result.unknown:
+                preview = ', '.join(result.unknown[:20])
+                messages.warning(request, f"Not found: {preview}{' …' if len(result.unknown) > 20 else ''}")
+            return redirect('event_detail', id=event.id)
+    return render(request, 'events/bulk_rsvp.html', {'form': form, 'event': event})
+
+
+def export_format(request):
+    fmt = request.GET.get('format', 'csv')
+    return fmt if fmt in export.FORMATS else None
+
+
+# Exports (organizers)
+@permission_required('events.change_event', login_url='no-permession')
+def event_export(request):
+    fmt = export_format(request)
+    if fmt is None:
+        return HttpResponseBadRequest("format must be csv or ndjson")
+    queryset, _ordering = filter_events(request.GET)
+    header, rows = export.event_rows(queryset)
+    return export.stream_response(request, export.render(fmt, header, rows), fmt, 'events')
+
+
+@permission_required('events.change_event', login_url='no-permession')
+def event_roster_export(request, id):
+    fmt = export_format(request)
+    if fmt is None:
+        return HttpResponseBadRequest("format must be csv or ndjson")
+    event = get_object_or_404(Event, id=id)
+    header, rows = export.roster_rows(event)
+    return export.stream_response(request, export.render(fmt, header, rows), fmt, f'event-{event.id}-roster')
+
+
 # RSVP'd Events
 @login_required
 def my_rsvped_events(request):
-    rsvped_events = request.user.rsvped_events.all()
-    return render(request, 'events/my_events.html', {'events': rsvped_events})
+    rsvped_events = sorted(
+        [*request.user.rsvped_events.all(), *request.user.archived_rsvped_events.all()],
+        key=lambda event: (event.starts_at, event.id),
+    )
+    calendar_url = request.build_absolute_uri(reverse('ical-user', args=[ical.user_token(request.user)]))
+    return render(request, 'events/my_events.html', {'events': rsvped_events, 'calendar_url': calendar_url})
 
 @login_required
 def cancel_rsvp(request, event_id):
     event = get_object_or_404(Event, id=event_id)
-    if request.user in event.participants.all():
-        event.participants.remove(request.user)
+    release_seat(event, request.user)
     return redirect('participant-dashboard') 
 
 # Category list
-def category_list(request):
-    categories = Category.objects.annotate(event_count=Count('events'))
-    return render(request, 'events/category_list.html', {'categories': categories})
+@cached_public_page('category_list', depends_on=lambda: [CATEGORIES])
+async def category_list(request):
+    categories = [category async for category in Category.objects.annotate(event_count=Count('events'))]
+    return await arender(request, 'events/category_list.html', {'categories': categories})
 
 
 # Category create
@@ -216,27 +399,43 @@ def category_delete(request, id):
     return render(request, 'events/category_confirm_delete.html', {'category': category})
 
 
+# Cache hit/miss counters for this worker, to help size the cache
+@user_passes_test(lambda user: user.is_staff, login_url='no-permession')
+def cache_stats_view(request):
+    return JsonResponse(cache_stats())
+
+
+# Prometheus scrape target: staff only, or a scraper presenting METRICS_TOKEN
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    bearer = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not (request.user.is_staff or (token and constant_time_compare(bearer, token))):
+        return redirect('no-permession')
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # No permission page
 def no_permession(request):
     return render(request, 'no_permession.html')
 
 
 @login_required
-def participant_dashboard(request):
-    user = request.user
-    rsvped_events = user.rsvped_events.all()  #rsvped_events the related name m2m
-    return render(request, 'participant_dashboard.html', {'events': rsvped_events})
+async def participant_dashboard(request):
+    user = await request.auser()
+    rsvped_events = user.rsvped_events.select_related('category').order_by('starts_at')  #rsvped_events the related name m2m
+    events = [event async for event in rsvped_events]
+    return await arender(request, 'participant_dashboard.html', {'events': events})
 
 
 
 
 @login_required
 def dashboard_redirect(request):
-    user = request.user
+    roles = get_roles(request.user)  # one lookup, cached for the session
 
-    if user.groups.filter(name='admin').exists():
+    if ADMIN in roles:
         return redirect('admin-dashboard')
-    elif user.groups.filter(name='organizer').exists():
+    elif ORGANIZER in roles:
         return redirect('dashboard')
     else:
         return redirect('participant-dashboard')
@@ -0,0 +1,25 @@
+from django.contrib.auth.backends import ModelBackend
+
+from users.roles import cached
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose permission sets come from the shared cache.
+
+    The stock backend already memoizes permissions on the user object, but
+    it still runs two queries per request before the first
+    permission_required check. Entries are invalidated from users.signals.
+    """
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        perm_cache_name = '_%s_perm_cache' % from_name
+        if not hasattr(user_obj, perm_cache_name):
+            perms = cached(
+                user_obj, f'{from_name}_perms',
+                lambda: super(CachedModelBackend, self)._get_permissions(user_obj, obj, from_name),
+            )
+            setattr(user_obj, perm_cache_name, perms)
+        return getattr(user_obj, perm_cache_name)
@@ -55,6 +55,10 @@ class AssignRoleForm(forms.Form):
         label='Role'
     )
 
+class BulkRoleForm(forms.Form):
+    users = forms.ModelMultipleChoiceField(queryset=User.objects.all())
+    role = forms.ModelChoiceField(queryset=Group.objects.all())
+
 class CreateGroupForm(forms.ModelForm):
     permissions = forms.ModelMultipleChoiceField(
         queryset=Permission.objects.all(),
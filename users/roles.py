@@ -0,0 +1,107 @@
+"""
+Cached role and permission lookups for the RBAC gates.
+
+A user's group names (and, via users.backends, their permission sets) are
+loaded once, kept in the shared cache for RBAC_CACHE_TIMEOUT seconds and
+memoized on the user object for the rest of the request. The signal
+handlers in users.signals drop a user's entries when their groups or
+permissions change; changes to a group itself (rename, delete, permission
+edits) bump a global version that retires every entry at once. Both happen
+once the change commits, so a request running meanwhile can't put the old
+values back.
+
+A drop only reaches the processes reading the same cache, so with a
+process-local backend (settings.CACHE_SHARED off) every request loads the
+permissions from the database; the short timeout bounds how long a missed
+drop can matter otherwise.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from events.routers import from_primary
+
+ADMIN = 'admin'
+ORGANIZER = 'organizer'
+USER = 'user'
+
+_VERSION_KEY = 'rbac:version'
+
+
+def _version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        cache.add(_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def cache_key(user_id, kind, version=None):
+    return f'rbac:{version or _version()}:{kind}:{user_id}'
+
+
+def cached(user_obj, kind, load):
+    """Per-request memo on the user object, backed by the shared cache."""
+    attr = f'_rbac_{kind}'
+    if not hasattr(user_obj, attr):
+        if not settings.CACHE_SHARED:
+            value = load()
+        else:
+            key = cache_key(user_obj.pk, kind)
+            value = cache.get(key)
+            if value is None:
+                with from_primary():
+                    value = load()
+                cache.set(key, value, settings.RBAC_CACHE_TIMEOUT)
+        setattr(user_obj, attr, value)
+    return getattr(user_obj, attr)
+
+
+def get_roles(user):
+    """Names of the groups ``user`` belongs to, as a frozenset."""
+    if not user.is_authenticated:
+        return frozenset()
+    return cached(user, 'roles', lambda: frozenset(user.groups.values_list('name', flat=True)))
+
+
+def has_role(user, name):
+    return name in get_roles(user)
+
+
+def invalidate_users(*user_ids):
+    """Drop the users' entries once the current transaction commits."""
+    def apply():
+        version = _version()
+        cache.delete_many([
+            cache_key(user_id, kind, version)
+            for user_id in user_ids
+            for kind in ('roles', 'user_perms', 'group_perms')
+        ])
+    transaction.on_commit(apply)
+
+
+def invalidate_all():
+    """Retire every entry once the current transaction commits."""
+    def apply():
+        try:
+            cache.incr(_VERSION_KEY)
+        except ValueError:
+            cache.add(_VERSION_KEY, time.time_ns(), timeout=None)
+    transaction.on_commit(apply)
+
+
+def assign_role(user_ids, group):
+    """
+    Make ``group`` the only group of every user in ``user_ids``, with one
+    DELETE and one INSERT instead of groups.clear() and groups.add() per user.
+    """
+    user_ids = list(user_ids)
+    through = User.groups.through
+    with transaction.atomic():
+        through.objects.filter(user_id__in=user_ids).delete()
+        through.objects.bulk_create([through(user_id=user_id, group_id=group.id) for user_id in user_ids])
+        # The m2m_changed handlers in users.signals don't see bulk writes
+        invalidate_users(*user_ids)
@@ -1,9 +1,10 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.contrib.auth.models import User,Group 
+from users.roles import invalidate_all, invalidate_users
 from django.contrib.auth.tokens import default_token_generator
 from django.conf import settings
-from django.core.mail import send_mail 
+from events.mail import queue_mail
 
 
 @receiver(post_save,sender=User)
@@ -16,10 +17,8 @@ def send_activation_user(sender,instance,created,**kargs):
         subject='activate your Account'
         message = f"Hi {instance.username},\n\nplease acivate your account by checking the link below:\n\n{activation_url}\n\n Thank you!"
         recipient_list = [instance.email]
-        try:
-            send_mail(subject,message,settings.EMAIL_HOST_USER,recipient_list)
-        except Exception as e:
-            print(f"Failed to send email{instance.email}:{str(e)}")
+        # Delivered by the send_queued_mail worker, not on the sign-up request
+        queue_mail(subject,message,recipient_list,settings.EMAIL_HOST_USER)
 
 
 
@@ -29,4 +28,46 @@ def assign_role(sender,instance,created,**kargs):
     if created:
         user_group,created = Group.objects.get_or_create(name='User')
         instance.groups.add(user_group)
-        instance.save()
\ No newline at end of file
+        instance.save()
+
+
+
+@receiver(post_save,sender=User)
+@receiver(post_delete,sender=User)
+def invalidate_cached_user(sender,instance,**kwargs):
+    # is_superuser / is_active / is_staff decide the permission sets too
+    invalidate_users(instance.pk)
+
+
+@receiver(m2m_changed,sender=User.groups.through)
+def invalidate_cached_roles(sender,instance,action,reverse,pk_set,**kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_users(instance.pk)
+    elif pk_set:
+        invalidate_users(*pk_set)
+    else:
+        invalidate_all()  # group.user_set.clear(): members unknown by now
+
+
+@receiver(m2m_changed,sender=User.user_permissions.through)
+def invalidate_cached_user_permissions(sender,instance,action,reverse,pk_set,**kwargs):
+    if action.startswith('post_'):
+        if reverse:
+            invalidate_all()
+        else:
+            invalidate_users(instance.pk)
+
+
+@receiver(m2m_changed,sender=Group.permissions.through)
+def invalidate_cached_group_permissions(sender,action,**kwargs):
+    if action.startswith('post_'):
+        invalidate_all()
+
+
+@receiver(post_save,sender=Group)
+@receiver(post_delete,sender=Group)
+def invalidate_cached_group(sender,**kwargs):
+    invalidate_all()
+
@@ -1,3 +1,133 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from events.models import RSVP, Category, Event
+from users.roles import get_roles
+
+
+class UserDirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_group = Group.objects.create(name='admin')
+        cls.organizer = Group.objects.create(name='organizer')
+        cls.admin = User.objects.create_user('boss', password='x')
+        cls.admin.groups.set([cls.admin_group])
+        cls.users = User.objects.bulk_create(User(username=f'member{i:03}', email=f'm{i}@example.com') for i in range(120))
+        category = Category.objects.create(name='Tech', description='')
+        event = Event.objects.create(
+            name='Meetup', description='', date=datetime.date.today(), time=datetime.time(18), location='Dhaka',
+            category=category,
+        )
+        RSVP.objects.bulk_create(RSVP(event=event, user=user) for user in cls.users[:3])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_pages_take_a_fixed_number_of_queries(self):
+        self.client.get('/users/admin/dashboard/')  # warm up
+        with self.assertNumQueries(6):  # session, user, roles, page, groups of the page, role menu
+            response = self.client.get('/users/admin/dashboard/', {'sort': 'rsvps'})
+        users = response.context['users']
+        self.assertEqual(len(users), 50)
+        self.assertEqual([user.rsvp_total for user in users[:4]], [1, 1, 1, 0])
+
+    def test_filters(self):
+        response = self.client.get('/users/admin/dashboard/', {'q': 'member11', 'sort': 'username'})
+        self.assertEqual(
+            [user.username for user in response.context['users']],
+            ['member110', 'member111', 'member112', 'member113', 'member114', 'member115', 'member116', 'member117', 'member118', 'member119'],
+        )
+        response = self.client.get('/users/admin/dashboard/', {'role': self.admin_group.id})
+        self.assertEqual([user.username for user in response.context['users']], ['boss'])
+
+    def test_bulk_role_assignment_replaces_groups(self):
+        chosen = self.users[:30]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/users/admin/dashboard/', {
+                'users': [user.id for user in chosen], 'role': self.organizer.id,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.organizer.user_set.count(), 30)
+        self.assertEqual(get_roles(User.objects.get(pk=chosen[0].pk)), {'organizer'})
+        self.assertFalse(User.objects.filter(pk__in=[u.id for u in chosen], groups__name='User').exists())
+
+
+@override_settings(CACHE_SHARED=True)
+class PermissionCacheTests(TestCase):
+    """Cached permission sets (users.backends) must follow every change that affects them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.delete_event = Permission.objects.get(codename='delete_event')
+        cls.group = Group.objects.create(name='editors')
+
+    def setUp(self):
+        # Ids are reused after each test's rollback, whose invalidations never ran
+        cache.clear()
+
+    def fresh(self, user):
+        return User.objects.get(pk=user.pk)
+
+    def test_demoted_superuser_loses_permissions(self):
+        user = User.objects.create_superuser('root', password='x')
+        # has_perm() short-circuits for superusers; this is what fills the cache
+        self.assertIn('events.delete_event', self.fresh(user).get_all_permissions())
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_superuser = False
+            user.save()
+        self.assertFalse(self.fresh(user).has_perm('events.delete_event'))
+
+    def test_deactivated_user_loses_permissions(self):
+        user = User.objects.create_user('member', password='x')
+        user.user_permissions.add(self.delete_event)
+        self.assertTrue(self.fresh(user).has_perm('events.delete_event'))
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_active = False
+            user.save()
+        self.assertFalse(self.fresh(user).has_perm('events.delete_event'))
+
+    def test_group_membership_changes(self):
+        self.group.permissions.add(self.delete_event)
+        user = User.objects.create_user('member', password='x')
+        self.assertFalse(self.fresh(user).has_perm('events.delete_event'))
+        with self.captureOnCommitCallbacks(execute=True):
+            user.groups.add(self.group)
+        self.assertTrue(self.fresh(user).has_perm('events.delete_event'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.user_set.remove(user)
+        self.assertFalse(self.fresh(user).has_perm('events.delete_event'))
+
+    def test_group_permission_changes(self):
+        user = User.objects.create_user('member', password='x')
+        user.groups.add(self.group)
+        self.assertFalse(self.fresh(user).has_perm('events.delete_event'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.add(self.delete_event)
+        self.assertTrue(self.fresh(user).has_perm('events.delete_event'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.clear()
+        self.assertFalse(self.fresh(user).has_perm('events.delete_event'))
+
+    def test_entries_are_dropped_only_once_the_change_commits(self):
+        user = User.objects.create_user('member', password='x')
+        user.user_permissions.add(self.delete_event)
+        self.assertTrue(self.fresh(user).has_perm('events.delete_event'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.user_permissions.remove(self.delete_event)
+            # Until the commit other requests still see the committed permissions
+            self.assertTrue(self.fresh(user).has_perm('events.delete_event'))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(self.fresh(user).has_perm('events.delete_event'))
+
+    def test_process_local_cache_is_not_used(self):
+        user = User.objects.create_user('member', password='x')
+        user.user_permissions.add(self.delete_event)
+        with self.settings(CACHE_SHARED=False):
+            self.assertTrue(self.fresh(user).has_perm('events.delete_event'))
+            # A write no signal sees, as another process's change would be
+            User.user_permissions.through.objects.filter(user=user).delete()
+            self.assertFalse(self.fresh(user).has_perm('events.delete_event'))
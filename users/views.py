@@ -1,6 +1,8 @@
+from datetime import timedelta
+
 from django.shortcuts import render,redirect,HttpResponse
 from django.urls import reverse_lazy
-from users.forms import RegisterForm,LoginForm,AssignRoleForm,CreateGroupForm,EditProfileForm
+from users.forms import RegisterForm,LoginForm,AssignRoleForm,BulkRoleForm,CreateGroupForm,EditProfileForm
 from django.contrib.auth import login,logout
 from django.contrib import messages
 from django.contrib.auth.models import User,Group
@@ -9,12 +11,29 @@ from django.contrib.auth.decorators import login_required,user_passes_test
 from django.views.generic import TemplateView
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
+from django.db import transaction
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
+from events.models import RSVP, start_of_day
+from events.pagination import KeysetPaginator
+from events.views import parse_date_param
+from users.roles import ADMIN, assign_role as set_role, has_role
+
+USER_PAGE_SIZE = 50
+# ?sort= values of the user directory; ids stand in for the join date
+USER_SORTS = {
+    'newest': ('-id',),
+    'oldest': ('id',),
+    'username': ('username', 'id'),
+    '-username': ('-username', '-id'),
+    'rsvps': ('-rsvp_total', '-id'),
+}
 
 
 # Create your views here.
 
 def is_admin(user):
-    return user.groups.filter(name='admin').exists()
+    return has_role(user, ADMIN)
 
 def sign_up(request):
    form = RegisterForm()
@@ -24,7 +43,8 @@ def sign_up(request):
            user = form.save(commit=False)
            user.set_password(form.cleaned_data.get('password1'))
            user.is_active = False
-           user.save()
+           with transaction.atomic():  # activation mail is queued by the post_save signal
+               user.save()
            messages.success(request,'A confirmation mail sent. check your email')
            return redirect('sign-in')
           
@@ -61,10 +81,59 @@ def activate_user(request, user_id, token):
         return HttpResponse('user does not exist')
 
 
+def filter_users(params):
+    """
+    Apply the user directory filters (q, role, active, joined_from/joined_to)
+    from a QueryDict. Returns the queryset and the keyset ordering to page it by.
+    """
+    rsvps = RSVP.objects.filter(user_id=OuterRef('pk')).values('user_id').annotate(total=Count('*')).values('total')
+    queryset = User.objects.annotate(rsvp_total=Coalesce(Subquery(rsvps), 0)).prefetch_related(
+        Prefetch('groups', queryset=Group.objects.only('id', 'name'))
+    )
+
+    search = params.get('q', '').strip()
+    if search:
+        queryset = queryset.filter(
+            Q(username__icontains=search) | Q(email__icontains=search)
+            | Q(first_name__icontains=search) | Q(last_name__icontains=search)
+        )
+    role = params.get('role')
+    if role and role.isdigit():
+        queryset = queryset.filter(groups=role)
+    active = params.get('active')
+    if active in ('0', '1'):
+        queryset = queryset.filter(is_active=active == '1')
+    joined_from = parse_date_param(params.get('joined_from'))
+    if joined_from:
+        queryset = queryset.filter(date_joined__gte=start_of_day(joined_from))
+    joined_to = parse_date_param(params.get('joined_to'))
+    if joined_to:
+        queryset = queryset.filter(date_joined__lt=start_of_day(joined_to + timedelta(days=1)))
+
+    return queryset, USER_SORTS.get(params.get('sort'), USER_SORTS['newest'])
+
+
 @user_passes_test(is_admin,login_url='no-permession')
 def admin_dashboard(request):
-    users = User.objects.all()
-    return render(request,'admin/dashboard.html',{'users':users})
+    if request.method == 'POST':
+        form = BulkRoleForm(request.POST)
+        if form.is_valid():
+            users, role = form.cleaned_data['users'], form.cleaned_data['role']
+            set_role([user.id for user in users], role)
+            messages.success(request, f'{len(users)} user(s) assigned to {role.name}')
+        else:
+            messages.error(request, 'Select at least one user and a role.')
+        return redirect(request.get_full_path())
+
+    queryset, ordering = filter_users(request.GET)
+    page = KeysetPaginator(ordering, per_page=USER_PAGE_SIZE).paginate(queryset, request.GET.get('cursor'))
+    return render(request,'admin/dashboard.html',{
+        'users': page.object_list,
+        'page': page,
+        'groups': list(Group.objects.order_by('name')),  # for the filter and the bulk assign menus
+        'filters': request.GET,
+        'sorts': USER_SORTS,
+    })
 
 @user_passes_test(is_admin,login_url='no-permession')
 def assign_role(request, user_id):
@@ -75,8 +144,7 @@ def assign_role(request, user_id):
         form = AssignRoleForm(request.POST)
         if form.is_valid():
             role = form.cleaned_data.get('role')
-            user.groups.clear()
-            user.groups.add(role)
+            set_role([user.id], role)
             messages.success(request, f'{user.username} has been assigned to the {role.name}')
             return redirect('admin-dashboard')
 